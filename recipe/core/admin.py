@@ -1,5 +1,8 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db.models import Count
+from django.utils import timezone
 from core import models
+from core.purge import start_purge
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
 
@@ -26,6 +29,7 @@ class UserAdmin(BaseUserAdmin):
         )
     ]
     readonly_fields = ['last_login']
+    actions = ['purge_users']
     # for add user page
     add_fieldsets = [
         (
@@ -40,8 +44,84 @@ class UserAdmin(BaseUserAdmin):
         )
     ]
 
+    @admin.action(description='Purge selected users and their recipes')
+    def purge_users(self, request, queryset):
+        """Purge users in the background instead of the slow cascade."""
+        purged = 0
+        for user in queryset.exclude(pk=request.user.pk):
+            start_purge(user)
+            purged += 1
+        self.message_user(
+            request,
+            f'Purging {purged} users, see the user purges for progress.',
+            messages.SUCCESS
+        )
+
+
+class UserPurgeAdmin(admin.ModelAdmin):
+    """Define the admin listing of user purges and their progress."""
+    ordering = ['-created']
+    list_display = ['email', 'status', 'recipes_deleted', 'tags_deleted',
+                    'ingredients_deleted', 'images_deleted', 'updated']
+    list_filter = ['status']
+    readonly_fields = ['user_id', 'email', 'shard', 'status',
+                       'recipes_deleted', 'tags_deleted',
+                       'ingredients_deleted', 'images_deleted', 'error',
+                       'created', 'updated']
+
+    def has_add_permission(self, request):
+        return False
+
+
+class JobAdmin(admin.ModelAdmin):
+    """Define the admin listing of queued and failed jobs."""
+    ordering = ['-priority', 'run_at']
+    list_display = ['name', 'status', 'priority', 'attempts', 'run_at',
+                    'locked_by']
+    list_filter = ['status', 'name']
+    readonly_fields = ['name', 'args', 'kwargs', 'attempts', 'locked_by',
+                       'locked_until', 'last_error', 'created']
+    actions = ['retry_jobs']
+
+    def changelist_view(self, request, extra_context=None):
+        """Title the list with the depth of the queue by status."""
+        counts = dict(models.Job.objects.values_list('status').annotate(
+            jobs=Count('pk')
+        ))
+        summary = ', '.join(
+            f'{counts.get(status, 0)} {label.lower()}'
+            for status, label in models.Job.STATUS_CHOICES
+        )
+        extra_context = {**(extra_context or {}), 'title': f'Jobs: {summary}'}
+        return super().changelist_view(request, extra_context)
+
+    @admin.action(description='Retry selected jobs now')
+    def retry_jobs(self, request, queryset):
+        retried = queryset.exclude(status=models.Job.RUNNING).update(
+            status=models.Job.QUEUED, attempts=0, run_at=timezone.now(),
+            locked_until=None
+        )
+        self.message_user(request, f'{retried} jobs queued again.',
+                          messages.SUCCESS)
+
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Define the admin listing of captured request profiles."""
+    ordering = ['-created']
+    list_display = ['created', 'method', 'path', 'view', 'status_code',
+                    'duration_ms', 'user']
+    list_filter = ['view', 'method']
+    readonly_fields = ['created', 'method', 'path', 'view', 'status_code',
+                       'duration_ms', 'user', 'pstats_file', 'collapsed_file']
+
+    def has_add_permission(self, request):
+        return False
+
 
 admin.site.register(models.User, UserAdmin)
 admin.site.register(models.Recipe)
 admin.site.register(models.Tag)
 admin.site.register(models.Ingredient)
+admin.site.register(models.RequestProfile, RequestProfileAdmin)
+admin.site.register(models.UserPurge, UserPurgeAdmin)
+admin.site.register(models.Job, JobAdmin)
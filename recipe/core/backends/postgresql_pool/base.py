@@ -0,0 +1,108 @@
+"""
+PostgreSQL database backend that reuses connections from a pool.
+
+Configure it through an extra ``POOL`` key of the database settings:
+
+    'POOL': {
+        'MAX_SIZE': 10,         # connections opened at most
+        'IDLE_TIMEOUT': 300,    # seconds before an idle connection is closed
+        'TIMEOUT': 30,          # seconds to wait for a free connection
+        'MAX_WAITING': 0,       # callers allowed to wait, 0 is unlimited
+        'CHECK': True,          # run ``SELECT 1`` on checkout
+    }
+"""
+import threading
+
+import psycopg2
+import psycopg2.extras
+from django.db.backends.postgresql import base, creation
+from django.utils.asyncio import async_unsafe
+
+from core.pool import ConnectionPool
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_stats():
+    """Return the gauges of every pool keyed by database alias."""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {alias: pool.stats() for (alias, _), pool in pools}
+
+
+def close_pools():
+    """Close the idle connections of every pool."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.closeall()
+
+
+def _check(conn):
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def _reset(conn):
+    if conn.status != psycopg2.extensions.STATUS_READY:
+        conn.rollback()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Pooled connections would keep the test database in use.
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params):
+        """Return the pool shared by every thread for these parameters."""
+        key = (self.alias, repr(sorted(conn_params.items())))
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                options = self.settings_dict.get('POOL', {})
+                pool = ConnectionPool(
+                    connect=lambda: self._connect(conn_params),
+                    max_size=options.get('MAX_SIZE', 10),
+                    idle_timeout=options.get('IDLE_TIMEOUT', 300),
+                    timeout=options.get('TIMEOUT', 30),
+                    max_waiting=options.get('MAX_WAITING', 0),
+                    check=_check if options.get('CHECK', True) else None,
+                    reset=_reset,
+                )
+                _pools[key] = pool
+        return pool
+
+    def _connect(self, conn_params):
+        connection = base.Database.connect(**conn_params)
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        if isolation_level is not None:
+            connection.set_session(isolation_level=isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection,
+            loads=lambda x: x
+        )
+        return connection
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        connection = self.pool.getconn()
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level',
+            connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                return self.pool.putconn(self.connection)
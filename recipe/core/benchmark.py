@@ -0,0 +1,311 @@
+"""
+Synthetic data and load scenarios for benchmarking the API.
+"""
+import io
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connections
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import similarity
+from core.models import User, Recipe, Tag, Ingredient
+
+
+EMAIL_DOMAIN = 'bench.example.com'
+PASSWORD = 'benchpass123'
+
+
+def seed(users=10, recipes=50, tags=20, ingredients=40,
+         tags_per_recipe=3, ingredients_per_recipe=8, seed_value=0):
+    """
+    Bulk insert a synthetic dataset and return the ids needed by the
+    scenarios. Relations per recipe vary around the given means.
+    """
+    rng = random.Random(seed_value)
+    password = make_password(PASSWORD)
+    User.objects.bulk_create([
+        User(email=f'user{i}@{EMAIL_DOMAIN}', name=f'User {i}',
+             password=password)
+        for i in range(users)
+    ])
+    user_ids = list(User.objects.filter(
+        email__endswith='@' + EMAIL_DOMAIN
+    ).order_by('id').values_list('id', flat=True))
+    Token.objects.bulk_create([
+        Token(key=Token.generate_key(), user_id=user_id)
+        for user_id in user_ids
+    ])
+
+    for model, count, prefix in ((Tag, tags, 'Tag'),
+                                 (Ingredient, ingredients, 'Ingredient')):
+        model.objects.bulk_create([
+            model(user_id=user_id, name=f'{prefix} {i}')
+            for user_id in user_ids for i in range(count)
+        ])
+    Recipe.objects.bulk_create([
+        Recipe(
+            user_id=user_id,
+            title=f'Recipe {i}',
+            description='Step. ' * rng.randint(10, 200),
+            time_minutes=rng.randint(5, 180),
+            price=Decimal(rng.randint(100, 5000)) / 100,
+        )
+        for user_id in user_ids for i in range(recipes)
+    ])
+
+    data = {}
+    for user_id in user_ids:
+        user_tags = list(Tag.objects.filter(
+            user_id=user_id).values_list('id', flat=True))
+        user_ingredients = list(Ingredient.objects.filter(
+            user_id=user_id).values_list('id', flat=True))
+        user_recipes = list(Recipe.objects.filter(
+            user_id=user_id).values_list('id', flat=True))
+        tag_rows, ingredient_rows = [], []
+        for recipe_id in user_recipes:
+            fan_out = min(len(user_tags), rng.randint(0, 2 * tags_per_recipe))
+            tag_rows += [
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for tag_id in rng.sample(user_tags, fan_out)
+            ]
+            fan_out = min(len(user_ingredients),
+                          rng.randint(1, 2 * ingredients_per_recipe))
+            ingredient_rows += [
+                Recipe.ingredients.through(recipe_id=recipe_id,
+                                           ingredient_id=ingredient_id)
+                for ingredient_id in rng.sample(user_ingredients, fan_out)
+            ]
+        Recipe.tags.through.objects.bulk_create(tag_rows)
+        Recipe.ingredients.through.objects.bulk_create(ingredient_rows)
+        Recipe.objects.filter(pk__in=user_recipes).sync_related_ids()
+        data[user_id] = {
+            'token': Token.objects.get(user_id=user_id).key,
+            'email': f'user{user_ids.index(user_id)}@{EMAIL_DOMAIN}',
+            'tags': user_tags,
+            'ingredients': user_ingredients,
+            'recipes': user_recipes,
+        }
+    return data
+
+
+def _image_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def recipe_list(client, data, rng):
+    return client.get(reverse('recipe_app:recipe-list'))
+
+
+def recipe_list_msgpack(client, data, rng):
+    return client.get(reverse('recipe_app:recipe-list'),
+                      HTTP_ACCEPT='application/msgpack')
+
+
+def recipe_list_filtered(client, data, rng):
+    tags = rng.sample(data['tags'], min(2, len(data['tags'])))
+    ingredients = rng.sample(data['ingredients'],
+                             min(2, len(data['ingredients'])))
+    return client.get(reverse('recipe_app:recipe-list'), {
+        'tags': ','.join(map(str, tags)),
+        'ingredients': ','.join(map(str, ingredients)),
+    })
+
+
+def recipe_detail(client, data, rng):
+    recipe_id = rng.choice(data['recipes'])
+    return client.get(reverse('recipe_app:recipe-detail', args=[recipe_id]))
+
+
+def recipe_create(client, data, rng):
+    payload = {
+        'title': 'Benchmark recipe',
+        'time_minutes': rng.randint(5, 120),
+        'price': '9.99',
+        'tags': [{'name': f'Tag {rng.randint(0, 40)}'} for _ in range(3)],
+        'ingredients': [{'name': f'Ingredient {rng.randint(0, 80)}'}
+                        for _ in range(6)],
+    }
+    return client.post(reverse('recipe_app:recipe-list'), payload,
+                       format='json')
+
+
+def recipe_similar(client, data, rng):
+    recipe_id = rng.choice(data['recipes'])
+    return client.get(reverse('recipe_app:recipe-similar', args=[recipe_id]))
+
+
+def upload_image(client, data, rng):
+    recipe_id = rng.choice(data['recipes'])
+    image = io.BytesIO(data['image'])
+    image.name = 'bench.jpg'
+    return client.post(
+        reverse('recipe_app:recipe-upload-image', args=[recipe_id]),
+        {'image': image},
+        format='multipart'
+    )
+
+
+def token_login(client, data, rng):
+    return client.post(reverse('user:token'), {
+        'email': data['email'],
+        'password': PASSWORD,
+    })
+
+
+def tag_list_assigned(client, data, rng):
+    return client.get(reverse('recipe_app:tag-list'), {'assigned_only': 1})
+
+
+def ingredient_list_assigned(client, data, rng):
+    return client.get(reverse('recipe_app:ingredient-list'),
+                      {'assigned_only': 1})
+
+
+SCENARIOS = {
+    'recipe_list': recipe_list,
+    'recipe_list_msgpack': recipe_list_msgpack,
+    'recipe_list_filtered': recipe_list_filtered,
+    'recipe_detail': recipe_detail,
+    'recipe_similar': recipe_similar,
+    'recipe_create': recipe_create,
+    'upload_image': upload_image,
+    'token_login': token_login,
+    'tag_list_assigned': tag_list_assigned,
+    'ingredient_list_assigned': ingredient_list_assigned,
+}
+
+
+def percentile(values, pct):
+    """Return the nearest rank percentile of the values."""
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+def run_scenario(scenario, dataset, requests=100, concurrency=4,
+                 seed_value=0):
+    """
+    Drive a scenario through the test client from `concurrency` threads
+    and return its throughput and latency percentiles in milliseconds.
+    """
+    image = _image_bytes()
+    users = list(dataset.values())
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(seed_value * 1000 + index)
+        client = APIClient()
+        try:
+            for _ in range(index, requests, concurrency):
+                data = {**rng.choice(users), 'image': image}
+                client.credentials(HTTP_AUTHORIZATION='Token ' + data['token'])
+                start = time.perf_counter()
+                response = scenario(client, data, rng)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed * 1000)
+                    if response.status_code >= 400:
+                        errors[0] += 1
+        finally:
+            if concurrency > 1:
+                connections.close_all()
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        worker(0)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(worker, range(concurrency)))
+    wall = time.perf_counter() - start
+
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'throughput': round(len(latencies) / wall, 2),
+        'p50': round(percentile(latencies, 50), 3),
+        'p95': round(percentile(latencies, 95), 3),
+        'p99': round(percentile(latencies, 99), 3),
+    }
+
+
+def similarity_recall(dataset, limit=10, sample=100, seed_value=0):
+    """
+    Compare the similar recipes found through the LSH keys with the exact
+    top `limit` by Jaccard similarity over all recipes of the user, for
+    `sample` random recipes. Return the recall, counting recipes tied
+    with the last exact one as found, and the latency percentiles in
+    milliseconds of both.
+    """
+    rng = random.Random(seed_value)
+    recipe_ids = [pk for data in dataset.values() for pk in data['recipes']]
+    found = expected = 0
+    latencies = {'lsh': [], 'exact': []}
+    for recipe_id in rng.sample(recipe_ids, min(sample, len(recipe_ids))):
+        recipe = Recipe.objects.get(pk=recipe_id)
+
+        start = time.perf_counter()
+        similar = Recipe.objects.similar_to(recipe, limit)
+        latencies['lsh'].append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        exact = similarity.most_similar(
+            similarity.tokens(recipe.tag_ids, recipe.ingredient_ids),
+            ((pk, similarity.tokens(tag_ids, ingredient_ids))
+             for pk, tag_ids, ingredient_ids in Recipe.objects.filter(
+                 user_id=recipe.user_id
+             ).exclude(pk=recipe.pk).values_list(
+                 'pk', 'tag_ids', 'ingredient_ids'
+             )),
+            limit,
+        )
+        latencies['exact'].append((time.perf_counter() - start) * 1000)
+
+        if exact:
+            lowest = exact[-1][1]
+            found += sum(score >= lowest for _, score in similar)
+            expected += len(exact)
+
+    result = {'recipes': len(latencies['lsh']),
+              'recall': round(found / expected, 4) if expected else 1.0}
+    for name, values in latencies.items():
+        for pct in (50, 95):
+            result[f'{name}_p{pct}'] = round(percentile(values, pct), 3)
+    return result
+
+
+def compare(results, baseline, threshold):
+    """
+    Return the regressions of results against a baseline: a p95 above
+    baseline * threshold or a throughput below baseline / threshold.
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result['p95'] > expected['p95'] * threshold:
+            regressions.append(
+                f"{name}: p95 {result['p95']}ms > "
+                f"{expected['p95']}ms x {threshold}"
+            )
+        if result['throughput'] < expected['throughput'] / threshold:
+            regressions.append(
+                f"{name}: throughput {result['throughput']}/s < "
+                f"{expected['throughput']}/s / {threshold}"
+            )
+        if result['errors']:
+            regressions.append(f"{name}: {result['errors']} failed requests")
+    return regressions
@@ -0,0 +1,33 @@
+"""
+System checks of the deployment settings.
+"""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(deploy=True)
+def check_replica_pin_cache(app_configs, **kwargs):
+    """
+    Warn when clients are pinned to the primary in a cache other worker
+    processes cannot see, so a read after a write may hit a stale replica.
+    """
+    if not settings.DATABASE_REPLICAS:
+        return []
+    backend = settings.CACHES.get(settings.REPLICA_PIN_CACHE, {}).get(
+        'BACKEND'
+    )
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        f'REPLICA_PIN_CACHE "{settings.REPLICA_PIN_CACHE}" uses {backend}, '
+        'which is not shared between worker processes.',
+        hint='Point CACHE_BACKEND and CACHE_LOCATION, or REPLICA_PIN_CACHE, '
+             'at a cache shared by every worker, such as memcached or '
+             'the database cache.',
+        id='core.W001',
+    )]
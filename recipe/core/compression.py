@@ -0,0 +1,93 @@
+"""
+Negotiation and encoders for compressed responses.
+"""
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+
+import brotli
+
+
+ENCODINGS = ('br', 'gzip')
+
+
+def accepted_encoding(header):
+    """Return the preferred supported encoding of Accept-Encoding."""
+    qualities = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    wildcard = qualities.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        quality = qualities.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(content, encoding, level):
+    """Compress bytes at a level from 0 (fastest) to 11 (smallest)."""
+    if encoding == 'br':
+        return brotli.compress(content, quality=level)
+    return gzip.compress(content, compresslevel=min(max(level, 1), 9),
+                         mtime=0)
+
+
+def compress_sequence(sequence, encoding, level):
+    """Compress a stream, flushing every chunk so clients get it now."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        for chunk in sequence:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(min(max(level, 1), 9), zlib.DEFLATED,
+                                  16 + zlib.MAX_WBITS)
+    for chunk in sequence:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressedCache:
+    """A bounded LRU of compressed bodies keyed by ETag and encoding."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
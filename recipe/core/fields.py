@@ -0,0 +1,44 @@
+"""
+Model fields.
+"""
+import json
+
+from django.contrib.postgres.fields import ArrayField
+from django.db import models
+
+
+class IdArrayField(ArrayField):
+    """
+    Array of object ids, a native bigint[] on PostgreSQL. Other backends
+    store it as JSON text and do not support the array lookups.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('base_field', models.BigIntegerField())
+        super().__init__(**kwargs)
+
+    def db_type(self, connection):
+        if connection.vendor != 'postgresql':
+            return 'text'
+        return super().db_type(connection)
+
+    def cast_db_type(self, connection):
+        if connection.vendor != 'postgresql':
+            return 'text'
+        return super().cast_db_type(connection)
+
+    def get_placeholder(self, value, compiler, connection):
+        if connection.vendor != 'postgresql':
+            return '%s'
+        return super().get_placeholder(value, compiler, connection)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if connection.vendor != 'postgresql' and value is not None:
+            return json.dumps(value)
+        return value
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
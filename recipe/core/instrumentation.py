@@ -0,0 +1,197 @@
+"""
+Per request timing of views, serializers and SQL queries.
+"""
+import contextvars
+import os
+import re
+import time
+import traceback
+from contextlib import contextmanager, ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_TRANSACTION_CONTROL = ('BEGIN', 'SAVEPOINT', 'RELEASE', 'ROLLBACK')
+
+
+def current_metrics():
+    """Return the metrics of the request being handled, if sampled."""
+    return _current.get()
+
+
+@contextmanager
+def collect_metrics(metrics):
+    """Make the metrics current for the duration of the block."""
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def view_name(view_func, method):
+    """Name a view after its class and the viewset action if any."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__name__', 'unknown')
+
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower())
+    return f'{cls.__name__}.{action}' if action else cls.__name__
+
+
+class RequestMetrics:
+    """Costs accumulated while handling one request."""
+
+    def __init__(self):
+        self.view = None
+        self.view_started = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.view_time = 0.0
+        self.total_time = 0.0
+        self._serializer_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """Database execute wrapper counting queries and their time."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+    @contextmanager
+    def serializer_timer(self):
+        """Time serializer work, counting nested serializers once."""
+        self._serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._serializer_depth -= 1
+            if not self._serializer_depth:
+                self.serializer_time += time.perf_counter() - start
+
+    def server_timing(self):
+        """Format the metrics as a Server-Timing header value."""
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries"',
+            f'serializer;dur={self.serializer_time * 1000:.2f}',
+            f'view;dur={self.view_time * 1000:.2f}',
+            f'total;dur={self.total_time * 1000:.2f}',
+        ])
+
+    def as_dict(self):
+        return {
+            'view': self.view,
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'serializer_ms': round(self.serializer_time * 1000, 2),
+            'view_ms': round(self.view_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+        }
+
+
+class TimedSerializerMixin:
+    """Add the time spent serializing and validating to the request."""
+
+    def to_representation(self, instance):
+        metrics = _current.get()
+        if metrics is None:
+            return super().to_representation(instance)
+        with metrics.serializer_timer():
+            return super().to_representation(instance)
+
+    def run_validation(self, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return super().run_validation(*args, **kwargs)
+        with metrics.serializer_timer():
+            return super().run_validation(*args, **kwargs)
+
+
+class DuplicateQueryError(Exception):
+    """Raised when structurally identical queries repeat too often."""
+
+
+def fingerprint(sql):
+    """Reduce a query to its structure, ignoring values and list sizes."""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _LITERAL.sub('?', sql)
+
+
+def project_stack():
+    """Return the frames of the current stack that belong to the project."""
+    base_dir = str(settings.BASE_DIR) + os.sep
+    own_file = __file__
+    return [
+        frame for frame in traceback.extract_stack()[:-1]
+        if frame.filename.startswith(base_dir) and
+        frame.filename != own_file and
+        os.sep + 'tests' + os.sep not in frame.filename[len(base_dir):]
+    ] or traceback.extract_stack()[:-1]
+
+
+class DuplicateQueryRecorder:
+    """Group the queries of a block by fingerprint."""
+
+    def __init__(self):
+        self.counts = {}
+        self.stacks = {}
+
+    def execute(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(_TRANSACTION_CONTROL):
+            return execute(sql, params, many, context)
+        key = fingerprint(sql)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        if key not in self.stacks:
+            self.stacks[key] = project_stack()
+        return execute(sql, params, many, context)
+
+    def duplicates(self, threshold):
+        """Return (count, sql, stack) of queries repeated threshold times."""
+        return sorted(
+            (
+                (count, sql, self.stacks[sql])
+                for sql, count in self.counts.items() if count >= threshold
+            ),
+            key=lambda duplicate: -duplicate[0]
+        )
+
+    def report(self, threshold):
+        """Describe the repeated queries with the code issuing them."""
+        lines = []
+        for count, sql, stack in self.duplicates(threshold):
+            lines.append(f'{count} x {sql}')
+            lines.extend(
+                f'    {frame.filename}:{frame.lineno} in {frame.name}'
+                for frame in stack
+            )
+        return '\n'.join(lines)
+
+
+@contextmanager
+def detect_duplicate_queries(threshold=None, raise_error=True):
+    """
+    Record the queries made in the block on every connection and raise
+    DuplicateQueryError if one repeats `threshold` times or more.
+    """
+    if threshold is None:
+        threshold = settings.DUPLICATE_QUERY_THRESHOLD
+    recorder = DuplicateQueryRecorder()
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(recorder.execute))
+        yield recorder
+
+    if raise_error and recorder.duplicates(threshold):
+        raise DuplicateQueryError(
+            'Repeated queries detected:\n' + recorder.report(threshold)
+        )
@@ -0,0 +1,197 @@
+"""
+Background jobs queued in the database and run by `manage.py run_worker`.
+"""
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def job(max_attempts=None, priority=0, name=None):
+    """
+    Register a function as a job. The function gets an `enqueue` method
+    taking its JSON serializable arguments, plus `priority` and `delay`
+    in seconds, which queues a call in the current transaction.
+    """
+    def register(func):
+        func.job_name = name or f'{func.__module__}.{func.__qualname__}'
+
+        def enqueue(*args, priority=priority, delay=0, **kwargs):
+            return Job.objects.create(
+                name=func.job_name,
+                args=list(args),
+                kwargs=kwargs,
+                priority=priority,
+                max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+                run_at=timezone.now() + timedelta(seconds=delay),
+            )
+
+        func.enqueue = enqueue
+        return func
+    return register
+
+
+def retry_delay(attempts):
+    """Return the seconds to wait before retrying after `attempts`."""
+    delay = min(settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1),
+                settings.JOB_RETRY_BACKOFF_MAX)
+    return random.uniform(delay / 2, delay)
+
+
+def claim(worker_id, limit, visibility_timeout):
+    """
+    Lock up to `limit` due jobs for a worker, highest priority first.
+    Other workers skip the rows locked meanwhile on PostgreSQL. Jobs
+    whose worker held them past their visibility timeout are due again,
+    and failed once they ran out of attempts.
+    """
+    now = timezone.now()
+    db = router.db_for_write(Job)
+    skip_locked = connections[db].features.has_select_for_update_skip_locked
+    with transaction.atomic(using=db):
+        jobs = list(Job.objects.using(db).select_for_update(
+            skip_locked=skip_locked
+        ).filter(
+            Q(status=Job.QUEUED, run_at__lte=now) |
+            Q(status=Job.RUNNING, locked_until__lte=now)
+        ).order_by('-priority', 'run_at', 'pk')[:limit])
+
+        expired = [j.pk for j in jobs if j.attempts >= j.max_attempts]
+        if expired:
+            Job.objects.using(db).filter(pk__in=expired).update(
+                status=Job.FAILED, locked_until=None,
+                last_error='Visibility timeout expired.'
+            )
+        jobs = [j for j in jobs if j.pk not in expired]
+        Job.objects.using(db).filter(pk__in=[j.pk for j in jobs]).update(
+            status=Job.RUNNING,
+            attempts=F('attempts') + 1,
+            locked_by=worker_id,
+            locked_until=now + timedelta(seconds=visibility_timeout),
+        )
+    for j in jobs:
+        j.attempts += 1
+        j.locked_by = worker_id
+    return jobs
+
+
+def run(claimed):
+    """
+    Run a claimed job, deleting it when it succeeds and queueing it for a
+    retry with exponential backoff, or failing it, when it raises. The
+    job is only updated while its worker still holds it.
+    """
+    held = Job.objects.filter(pk=claimed.pk, locked_by=claimed.locked_by,
+                              attempts=claimed.attempts)
+    try:
+        func = import_string(claimed.name)
+        if not hasattr(func, 'job_name'):
+            raise ValueError(f'{claimed.name} is not a registered job.')
+        func(*claimed.args, **claimed.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Job %s failed: %s', claimed, error)
+        if claimed.attempts < claimed.max_attempts:
+            held.update(
+                status=Job.QUEUED, locked_until=None, last_error=error,
+                run_at=timezone.now() + timedelta(
+                    seconds=retry_delay(claimed.attempts)
+                ),
+            )
+        else:
+            held.update(status=Job.FAILED, locked_until=None,
+                        last_error=error)
+        return False
+    held.delete()
+    return True
+
+
+class Worker:
+    """
+    Run due jobs in up to `concurrency` threads until stopped, or until
+    nothing is running or due in `burst` mode.
+    """
+
+    def __init__(self, concurrency=None, poll_interval=None,
+                 visibility_timeout=None, burst=False):
+        self.concurrency = concurrency or settings.JOB_WORKER_CONCURRENCY
+        self.poll_interval = (settings.JOB_POLL_INTERVAL
+                              if poll_interval is None else poll_interval)
+        self.visibility_timeout = (visibility_timeout or
+                                   settings.JOB_VISIBILITY_TIMEOUT)
+        self.burst = burst
+        self.id = (f'{socket.gethostname()}:{os.getpid()}:'
+                   f'{uuid.uuid4().hex[:8]}')
+        self.processed = 0
+        self.failed = 0
+        self.running = 0
+        self._stopping = threading.Event()
+        self._changed = threading.Condition()
+
+    def stop(self, *args):
+        """Stop claiming jobs, letting the running ones finish."""
+        self._stopping.set()
+        with self._changed:
+            self._changed.notify_all()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def _run(self, claimed):
+        succeeded = False
+        try:
+            succeeded = run(claimed)
+        except Exception:
+            # The job is run again once its visibility timeout expires.
+            logger.exception('Could not record the outcome of job %s',
+                             claimed)
+        finally:
+            connections.close_all()
+            with self._changed:
+                self.running -= 1
+                self.processed += 1
+                self.failed += not succeeded
+                self._changed.notify_all()
+
+    def work(self):
+        """Claim and run jobs, returning once stopped."""
+        with ThreadPoolExecutor(max_workers=self.concurrency,
+                                thread_name_prefix='job') as executor:
+            while not self._stopping.is_set():
+                with self._changed:
+                    while (self.running >= self.concurrency and
+                           not self._stopping.is_set()):
+                        self._changed.wait(self.poll_interval)
+                    free = self.concurrency - self.running
+                if self._stopping.is_set():
+                    break
+
+                jobs = claim(self.id, free, self.visibility_timeout)
+                with self._changed:
+                    self.running += len(jobs)
+                    idle = not self.running
+                for claimed in jobs:
+                    executor.submit(self._run, claimed)
+
+                if not jobs:
+                    if self.burst and idle:
+                        break
+                    self._stopping.wait(self.poll_interval)
+        connections.close_all()
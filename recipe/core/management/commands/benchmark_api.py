@@ -0,0 +1,100 @@
+"""
+Django command to load test the API against a synthetic dataset.
+"""
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the main API endpoints"""
+    help = ('Seed a throwaway test database and report throughput and '
+            'latency percentiles of the main endpoints.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--recipes', type=int, default=50,
+                            help='Recipes per user.')
+        parser.add_argument('--tags', type=int, default=20,
+                            help='Tags per user.')
+        parser.add_argument('--ingredients', type=int, default=40,
+                            help='Ingredients per user.')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per scenario.')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Client threads. SQLite test databases '
+                                 'lock under concurrent writes, use 1.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--scenario', action='append',
+                            choices=sorted(benchmark.SCENARIOS),
+                            help='Scenario to run, repeatable. '
+                                 'Defaults to all of them.')
+        parser.add_argument('--output', default=None,
+                            help='Write the results as JSON to this path.')
+        parser.add_argument('--baseline', default=None,
+                            help='JSON results to compare against.')
+        parser.add_argument('--threshold', type=float, default=1.25,
+                            help='Allowed slowdown factor over the baseline.')
+
+    def handle(self, *args, **options):
+        """Entry Point for Command"""
+        names = options['scenario'] or list(benchmark.SCENARIOS)
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(MEDIA_ROOT=media_root,
+                                      DUPLICATE_QUERY_DETECTION=False,
+                                      THROTTLE_ENABLED=False):
+                dataset = benchmark.seed(
+                    users=options['users'],
+                    recipes=options['recipes'],
+                    tags=options['tags'],
+                    ingredients=options['ingredients'],
+                    seed_value=options['seed'],
+                )
+                results = {}
+                for name in names:
+                    results[name] = result = benchmark.run_scenario(
+                        benchmark.SCENARIOS[name],
+                        dataset,
+                        requests=options['requests'],
+                        concurrency=options['concurrency'],
+                        seed_value=options['seed'],
+                    )
+                    self.stdout.write(
+                        f"{name:<26} {result['throughput']:>9.2f} req/s  "
+                        f"p50 {result['p50']:>8.2f}ms  "
+                        f"p95 {result['p95']:>8.2f}ms  "
+                        f"p99 {result['p99']:>8.2f}ms  "
+                        f"errors {result['errors']}"
+                    )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                regressions = benchmark.compare(
+                    results, json.load(baseline), options['threshold']
+                )
+            if regressions:
+                raise CommandError(
+                    'Regressions against the baseline:\n' +
+                    '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('No regressions'))
@@ -0,0 +1,87 @@
+"""
+Django command to microbenchmark the serializers.
+"""
+import json
+import platform
+import subprocess
+
+from django.core.management.base import BaseCommand
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from core import microbenchmark
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    """Django command to time serializers and queryset construction"""
+    help = ('Measure per object serialize and deserialize time and '
+            'allocations of the API serializers at several payload sizes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=list(microbenchmark.SIZES),
+                            help='Nested objects per recipe, tag ids per '
+                                 'filter and text length multipliers.')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', default=None,
+                            help='Write the results as JSON to this path.')
+        parser.add_argument('--compare', default=None,
+                            help='JSON results of an earlier run to compare.')
+
+    def handle(self, *args, **options):
+        """Entry Point for Command"""
+        setup_test_environment(debug=False)
+        # UserSerializer checks the email is unique against the database.
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = microbenchmark.run(
+                sizes=options['sizes'], repeat=options['repeat']
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        for name, operations in results.items():
+            for operation, sizes in operations.items():
+                for size, measurement in sizes.items():
+                    self.stdout.write(
+                        f"{name:<28} {operation:<12} {size:>5} "
+                        f"{measurement['us']:>10.1f}us "
+                        f"{measurement['retained_bytes']:>8}B retained "
+                        f"{measurement['peak_bytes']:>9}B peak"
+                    )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({
+                    'commit': current_commit(),
+                    'python': platform.python_version(),
+                    'results': results,
+                }, output, indent=2, sort_keys=True)
+
+        if options['compare']:
+            with open(options['compare']) as previous:
+                previous = json.load(previous)
+            self.stdout.write(f"Compared with {previous.get('commit')}:")
+            for name, operation, size, old, new in microbenchmark.compare(
+                results, previous['results']
+            ):
+                change = (new - old) / old * 100 if old else 0
+                self.stdout.write(
+                    f'{name:<28} {operation:<12} {size:>5} '
+                    f'{old:>10.1f}us -> {new:>10.1f}us {change:+6.1f}%'
+                )
@@ -0,0 +1,82 @@
+"""
+Django command to measure the recall and latency of similar recipes.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    """
+    Django command comparing the similar recipes found through the LSH
+    index with an exact Jaccard ranking over a synthetic dataset.
+    """
+    help = ('Seed a throwaway test database and report the recall and '
+            'latency of similar recipes against exact Jaccard similarity.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2)
+        parser.add_argument('--recipes', type=int, default=1000,
+                            help='Recipes per user.')
+        parser.add_argument('--tags', type=int, default=20,
+                            help='Tags per user.')
+        parser.add_argument('--ingredients', type=int, default=40,
+                            help='Ingredients per user.')
+        parser.add_argument('--limit', type=int, default=10,
+                            help='Similar recipes per query.')
+        parser.add_argument('--sample', type=int, default=100,
+                            help='Recipes queried.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--min-recall', type=float, default=0.0,
+                            help='Fail when the recall is below this.')
+        parser.add_argument('--output', default=None,
+                            help='Write the results as JSON to this path.')
+
+    def handle(self, *args, **options):
+        """Entry Point for Command"""
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(DUPLICATE_QUERY_DETECTION=False):
+                dataset = benchmark.seed(
+                    users=options['users'],
+                    recipes=options['recipes'],
+                    tags=options['tags'],
+                    ingredients=options['ingredients'],
+                    seed_value=options['seed'],
+                )
+                result = benchmark.similarity_recall(
+                    dataset,
+                    limit=options['limit'],
+                    sample=options['sample'],
+                    seed_value=options['seed'],
+                )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(
+            f"recall@{options['limit']} {result['recall']:.4f} over "
+            f"{result['recipes']} recipes\n"
+            f"lsh    p50 {result['lsh_p50']:>8.2f}ms  "
+            f"p95 {result['lsh_p95']:>8.2f}ms\n"
+            f"exact  p50 {result['exact_p50']:>8.2f}ms  "
+            f"p95 {result['exact_p95']:>8.2f}ms"
+        )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(result, output, indent=2, sort_keys=True)
+
+        if result['recall'] < options['min_recall']:
+            raise CommandError(
+                f"Recall {result['recall']} below {options['min_recall']}"
+            )
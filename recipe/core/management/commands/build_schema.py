@@ -0,0 +1,23 @@
+"""
+Django command to build the OpenAPI schema artifact.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.schema import generate_schema, render_schema_json
+
+
+class Command(BaseCommand):
+    """Django command to write the schema served at /api/schema/"""
+    help = 'Generate the OpenAPI schema into SCHEMA_ARTIFACT.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=None,
+                            help='Path to write instead of SCHEMA_ARTIFACT.')
+
+    def handle(self, *args, **options):
+        """Entry Point for Command"""
+        path = options['file'] or settings.SCHEMA_ARTIFACT
+        with open(path, 'wb') as artifact:
+            artifact.write(render_schema_json(generate_schema()))
+        self.stdout.write(self.style.SUCCESS(f'Schema written to {path}'))
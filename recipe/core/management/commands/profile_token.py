@@ -0,0 +1,23 @@
+"""
+Django command to issue an X-Profile header value for a staff user.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import User
+from core.profiling import create_profile_token
+
+
+class Command(BaseCommand):
+    """Django command to print a request profiling token"""
+    help = 'Print an X-Profile header value for a staff user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+
+    def handle(self, *args, **options):
+        """Entry Point for Command"""
+        try:
+            user = User.objects.get(email=options['email'], is_staff=True)
+        except User.DoesNotExist:
+            raise CommandError(f"No staff user {options['email']!r}.")
+        self.stdout.write(create_profile_token(user))
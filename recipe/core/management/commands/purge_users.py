@@ -0,0 +1,45 @@
+"""
+Django command to delete users with all of their recipe data.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import User
+from core.purge import start_purge
+
+
+class Command(BaseCommand):
+    """
+    Django command purging users batch by batch with set based deletes,
+    much faster than the cascade of deleting a user for big accounts.
+    """
+    help = 'Delete users with their recipes, tags, ingredients and images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='users', required=True,
+                            help='Id of a user to purge.')
+        parser.add_argument('--batch-size', type=int,
+                            help='Rows deleted per statement.')
+
+    def report(self, purge):
+        self.stdout.write(
+            f'{purge.email}: {purge.recipes_deleted} recipes, '
+            f'{purge.tags_deleted} tags, '
+            f'{purge.ingredients_deleted} ingredients, '
+            f'{purge.images_deleted} images deleted'
+        )
+
+    def handle(self, *args, **options):
+        """Entry Point for Command"""
+        users = list(User.objects.filter(pk__in=options['users']))
+        missing = set(options['users']) - {user.pk for user in users}
+        if missing:
+            raise CommandError(
+                f'Unknown users: {", ".join(map(str, sorted(missing)))}'
+            )
+
+        for user in users:
+            start_purge(user, background=False,
+                        batch_size=options['batch_size'],
+                        progress=self.report)
+        self.stdout.write(self.style.SUCCESS(f'{len(users)} users purged'))
@@ -0,0 +1,101 @@
+"""
+Django command to move users' recipe data between database shards.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import User, Recipe, RecipeStats, Tag, Ingredient
+from core.routers import shard_for_user, shard_placement
+
+
+def copy_objects(objects, using):
+    """Insert copies of the objects keeping their ids."""
+    for obj in objects:
+        obj._state.adding = True
+    type(objects[0]).objects.using(using).bulk_create(objects)
+
+
+def copy_through(field, recipe_ids, source, target):
+    """Copy the M2M rows of a recipe field."""
+    through = field.remote_field.through
+    related_column = field.m2m_reverse_field_name() + '_id'
+    rows = through.objects.using(source).filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', related_column)
+    through.objects.using(target).bulk_create([
+        through(recipe_id=recipe_id, **{related_column: related_id})
+        for recipe_id, related_id in rows
+    ])
+
+
+def move_user(user, source, target):
+    """
+    Move the recipes, tags and ingredients of a user to a shard. Shards
+    hand out ids from separate ranges, so the objects keep their ids.
+    """
+    with transaction.atomic(using=target), transaction.atomic(using=source):
+        objects = {}
+        for model in (Tag, Ingredient, Recipe):
+            objects[model] = list(model.objects.using(source).filter(
+                user=user
+            ))
+            if objects[model]:
+                copy_objects(objects[model], target)
+
+        recipe_ids = [recipe.pk for recipe in objects[Recipe]]
+
+        if recipe_ids:
+            copy_through(Recipe.tags.field, recipe_ids, source, target)
+            copy_through(Recipe.ingredients.field, recipe_ids,
+                         source, target)
+
+        RecipeStats.objects.db_manager(target).rebuild(user.pk)
+        for model in (Recipe, Tag, Ingredient, RecipeStats):
+            model.objects.using(source).filter(user=user).delete()
+
+        user.shard = target
+        user.save(update_fields=['shard'])
+
+
+class Command(BaseCommand):
+    """
+    Django command to move users to the shard given by the hash placement
+    or to an explicit shard. Run it while the moved users are not
+    writing.
+    """
+    help = 'Move users and their recipe data between database shards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='users', help='Id of a user to move.')
+        parser.add_argument('--to', dest='target',
+                            help='Shard to move the users to.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the planned moves.')
+
+    def handle(self, *args, **options):
+        """Entry Point for Command"""
+        target = options['target']
+        if target is not None and target not in settings.DATABASE_SHARDS:
+            raise CommandError(f'Unknown shard {target!r}.')
+
+        users = User.objects.order_by('id')
+        if options['users']:
+            users = users.filter(id__in=options['users'])
+
+        moved = 0
+        for user in users.iterator():
+            source = shard_for_user(user)
+            destination = target or shard_placement(user.email)
+            if source == destination:
+                continue
+
+            self.stdout.write(f'User {user.pk}: {source} -> {destination}')
+            if not options['dry_run']:
+                move_user(user, source, destination)
+            moved += 1
+
+        self.stdout.write(self.style.SUCCESS(f'{moved} users to move'
+                                             if options['dry_run'] else
+                                             f'{moved} users moved'))
@@ -0,0 +1,56 @@
+"""
+Django command to recompute the recipe statistics of users.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Recipe, RecipeStats
+
+
+class Command(BaseCommand):
+    """
+    Django command recomputing the recipe statistics of users from their
+    recipes, or with --check only comparing them with the stored ones.
+    """
+    help = 'Recompute or check the recipe statistics of users.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report users whose statistics differ.')
+        parser.add_argument('--user', type=int, action='append',
+                            dest='users', help='Id of a user to rebuild.')
+        parser.add_argument('--database', default='default',
+                            help='Database alias to rebuild.')
+
+    def handle(self, *args, **options):
+        """Entry Point for Command"""
+        stats = RecipeStats.objects.db_manager(options['database'])
+        user_ids = options['users']
+        if not user_ids:
+            user_ids = sorted(set(
+                Recipe.objects.using(options['database']).values_list(
+                    'user_id', flat=True
+                ).distinct()
+            ).union(stats.values_list('user_id', flat=True)))
+
+        differing = []
+        for user_id in user_ids:
+            if options['check']:
+                # Missing statistics are built on first use.
+                expected = stats.compute(user_id)
+                stored = stats.filter(user_id=user_id).values(
+                    *expected
+                ).first()
+                if stored is not None and stored != expected:
+                    differing.append(user_id)
+            else:
+                stats.rebuild(user_id)
+
+        if differing:
+            raise CommandError(
+                f'{len(differing)} users with differing statistics: '
+                f'{", ".join(map(str, differing[:20]))}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(user_ids)} users checked' if options['check'] else
+            f'{len(user_ids)} users rebuilt'
+        ))
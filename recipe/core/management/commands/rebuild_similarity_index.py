@@ -0,0 +1,46 @@
+"""
+Django command to check or rebuild the LSH keys of similar recipes.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Django command recomputing the LSH keys of recipes from their tag and
+    ingredient ids, needed after changing the similarity settings.
+    """
+    help = 'Check or rebuild the LSH keys used to find similar recipes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report recipes that are out of date.')
+        parser.add_argument('--user', type=int, action='append',
+                            dest='users', help='Id of a user to rebuild.')
+        parser.add_argument('--database', default='default',
+                            help='Database alias to rebuild.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Recipes read per batch.')
+
+    def handle(self, *args, **options):
+        """Entry Point for Command"""
+        recipes = Recipe.objects.using(options['database'])
+        if options['users']:
+            recipes = recipes.filter(user_id__in=options['users'])
+
+        stale = recipes.sync_lsh_keys(check=options['check'],
+                                      batch_size=options['batch_size'])
+        if options['check']:
+            if stale:
+                raise CommandError(
+                    f'{len(stale)} recipes out of date: '
+                    f'{", ".join(map(str, stale[:20]))}'
+                )
+            self.stdout.write(self.style.SUCCESS(
+                'Similarity index up to date'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(stale)} recipes rebuilt'
+            ))
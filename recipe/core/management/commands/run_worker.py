@@ -0,0 +1,44 @@
+"""
+Django command to run the jobs queued in the database.
+"""
+from django.core.management.base import BaseCommand
+
+from core.jobs import Worker
+
+
+class Command(BaseCommand):
+    """
+    Django command running queued jobs in threads until SIGTERM or
+    SIGINT, after which the running jobs are finished. Start one per
+    host or container; on PostgreSQL workers never claim the same job.
+    """
+    help = 'Run the background jobs queued in the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int,
+                            help='Jobs run at the same time.')
+        parser.add_argument('--poll-interval', type=float,
+                            help='Seconds to wait when no job is due.')
+        parser.add_argument('--visibility-timeout', type=int,
+                            help='Seconds before a running job is taken '
+                                 'for lost and run again.')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no job is running or due.')
+
+    def handle(self, *args, **options):
+        """Entry Point for Command"""
+        worker = Worker(
+            concurrency=options['concurrency'],
+            poll_interval=options['poll_interval'],
+            visibility_timeout=options['visibility_timeout'],
+            burst=options['burst'],
+        )
+        if not options['burst']:
+            worker.install_signal_handlers()
+
+        self.stdout.write(f'Worker {worker.id} running '
+                          f'{worker.concurrency} jobs at a time')
+        worker.work()
+        self.stdout.write(self.style.SUCCESS(
+            f'{worker.processed} jobs run, {worker.failed} failed'
+        ))
@@ -2,24 +2,78 @@
 Django command to wait for the database to be availabale
 """
 
-from django.core.management.base import BaseCommand
+from concurrent.futures import ThreadPoolExecutor
+import random
 import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 from psycopg2 import OperationalError as psycopg2Error
 from django.db.utils import OperationalError
 
 
 class Command(BaseCommand):
     """Django command to wait for database"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help='Database alias to wait for, may be repeated.'
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Seconds to wait overall, 0 waits forever.'
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=5,
+            help='Longest pause between two attempts in seconds.'
+        )
+
+    def probe(self, alias):
+        """Open a connection to the database and close it again."""
+        connection = connections[alias]
+        try:
+            connection.ensure_connection()
+        finally:
+            connection.close()
+
+    def wait_for(self, alias, deadline, max_delay):
+        """Probe a database with jittered exponential backoff."""
+        attempt = 0
+        while True:
+            try:
+                self.probe(alias)
+                return True
+            except (psycopg2Error, OperationalError):
+                delay = random.uniform(0, min(max_delay, 0.1 * 2 ** attempt))
+                if (deadline is not None and
+                        time.monotonic() + delay > deadline):
+                    return False
+                self.stdout.write(f'Database {alias} unavailable, '
+                                  f'waiting {delay:.2f} seconds...')
+                time.sleep(delay)
+                attempt += 1
+
     def handle(self, *args, **options):
         """Entry Point for Command"""
+        aliases = options['databases'] or ['default']
+        deadline = None
+        if options['timeout']:
+            deadline = time.monotonic() + options['timeout']
+
         self.stdout.write('Waiting for database....')
-        db_up = False
-        while db_up is False:
-            try:
-                self.check(databases=['default'])
-                db_up = True
-            except (psycopg2Error, OperationalError):
-                self.stdout.write("Databse unavailable,"
-                                  "waiting for 1 second...")
-                time.sleep(1)
+        with ThreadPoolExecutor(max_workers=len(aliases)) as executor:
+            results = list(executor.map(
+                lambda alias: self.wait_for(
+                    alias, deadline, options['max_delay']
+                ),
+                aliases
+            ))
+
+        down = [alias for alias, up in zip(aliases, results) if not up]
+        if down:
+            raise CommandError(
+                f"Database unavailable after {options['timeout']} seconds: "
+                f"{', '.join(down)}"
+            )
         self.stdout.write(self.style.SUCCESS('Database available'))
@@ -0,0 +1,128 @@
+"""
+Prometheus metrics of the API.
+
+With several worker processes, point PROMETHEUS_MULTIPROC_DIR at an empty
+directory before the workers start. Each process then writes its values
+to mmap files there and /metrics aggregates all of them. The process
+manager has to report exited workers, see gunicorn.conf.py.
+"""
+import hmac
+import ipaddress
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+
+LABELS = ['route', 'method', 'status']
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Time spent handling a request.',
+    LABELS,
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUEST_SIZE = Histogram(
+    'http_request_size_bytes',
+    'Size of request bodies.',
+    LABELS,
+    buckets=SIZE_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes',
+    'Size of response bodies.',
+    LABELS,
+    buckets=SIZE_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    'http_request_db_queries',
+    'Number of SQL queries made by a request.',
+    LABELS,
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100),
+)
+IN_FLIGHT = Gauge(
+    'http_requests_in_flight',
+    'Requests currently being handled.',
+    multiprocess_mode='livesum',
+)
+DB_POOL = Gauge(
+    'db_pool_connections',
+    'Gauges of the database connection pools.',
+    ['alias', 'gauge'],
+    multiprocess_mode='livesum',
+)
+
+
+def route_name(request):
+    """Label a request with the name of its URL pattern."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unmatched>'
+    return match.view_name or match._func_path
+
+
+def observe_pools():
+    """Copy the connection pool gauges of this process into metrics."""
+    from core.backends.postgresql_pool.base import pool_stats
+
+    for alias, stats in pool_stats().items():
+        for gauge, value in stats.items():
+            DB_POOL.labels(alias, gauge).set(value)
+
+
+def render_metrics(multiproc_dir=None):
+    """Return metrics of every worker in the Prometheus text format."""
+    multiproc_dir = multiproc_dir or os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=multiproc_dir)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+def mark_process_dead(pid, multiproc_dir=None):
+    """Drop the live gauges of an exited worker process."""
+    multiproc_dir = multiproc_dir or os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        multiprocess.mark_process_dead(pid, multiproc_dir)
+
+
+def scrape_allowed(request):
+    """
+    Return whether a request may read the metrics: it comes from an
+    address in METRICS_ALLOWED_NETWORKS or bears METRICS_TOKEN.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        scheme, _, credentials = request.META.get(
+            'HTTP_AUTHORIZATION', ''
+        ).partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(
+            credentials.encode(), token.encode()
+        ):
+            return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network)
+               for network in settings.METRICS_ALLOWED_NETWORKS)
+
+
+def metrics_view(request):
+    """Expose metrics to Prometheus."""
+    if not scrape_allowed(request):
+        return HttpResponseForbidden()
+    observe_pools()
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
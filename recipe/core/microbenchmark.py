@@ -0,0 +1,218 @@
+"""
+Microbenchmarks of the serializers and queryset construction.
+
+Objects are built in memory with their relations in the prefetch cache,
+so serializing them measures the serializer alone and not the database.
+"""
+import io
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.models import User, Recipe, Tag, Ingredient
+from core.parsers import ORJSONParser, MessagePackParser
+from core.renderers import ORJSONRenderer, MessagePackRenderer
+from recipe_app.serializers import (
+    RecipeSerializer,
+    RecipeDetailSerializer,
+    TagSerializer,
+)
+from recipe_app.views import RecipeViewSet
+from user.serializers import UserSerializer
+
+
+SIZES = (1, 10, 100)
+
+
+def make_recipe(size, pk=1):
+    """Return an unsaved recipe with `size` tags and ingredients."""
+    recipe = Recipe(
+        pk=pk,
+        user_id=1,
+        title=f'Recipe {pk}',
+        description='Step. ' * 10 * size,
+        time_minutes=30,
+        price=Decimal('12.50'),
+        link='https://example.com/recipe',
+    )
+    recipe._prefetched_objects_cache = {
+        'tags': [Tag(pk=i, user_id=1, name=f'Tag {i}')
+                 for i in range(size)],
+        'ingredients': [Ingredient(pk=i, user_id=1, name=f'Ingredient {i}')
+                        for i in range(size)],
+    }
+    return recipe
+
+
+def _name(word, size):
+    """Repeat a word to grow with size within the 225 character limit."""
+    return (word * size)[:200]
+
+
+def recipe_payload(size):
+    return {
+        'title': 'Recipe',
+        'description': 'Step. ' * 10 * size,
+        'time_minutes': 30,
+        'price': '12.50',
+        'link': 'https://example.com/recipe',
+        'tags': [{'name': f'Tag {i}'} for i in range(size)],
+        'ingredients': [{'name': f'Ingredient {i}'} for i in range(size)],
+    }
+
+
+def measure(func, objects, repeat=5):
+    """
+    Time func over the objects `repeat` times after a warm up call and
+    trace its allocations in a separate pass, since tracing is slow.
+    """
+    func(objects[0])
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for obj in objects:
+            func(obj)
+        timings.append((time.perf_counter() - start) / len(objects))
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        for obj in objects:
+            func(obj)
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'us': round(statistics.median(timings) * 1e6, 3),
+        'min_us': round(min(timings) * 1e6, 3),
+        'retained_bytes': (after - before) // len(objects),
+        'peak_bytes': peak - before,
+    }
+
+
+def _serialize(serializer_class):
+    return lambda obj: serializer_class(obj).data
+
+
+def _deserialize(serializer_class):
+    def validate(data):
+        serializer = serializer_class(data=data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+    return validate
+
+
+def _recipe_view(tags):
+    factory = APIRequestFactory()
+    params = {'tags': ','.join(map(str, range(tags)))} if tags else {}
+    request = Request(factory.get('/api/recipe/recipes/', params))
+    request.user = User(pk=1, email='bench@example.com')
+    view = RecipeViewSet(request=request, action='list', format_kwarg=None)
+    return view
+
+
+def _queryset(view):
+    return view.get_queryset()
+
+
+def _queryset_sql(view):
+    return str(view.get_queryset().query)
+
+
+def _render(renderer_class):
+    return renderer_class().render
+
+
+def _parse(parser_class):
+    parser = parser_class()
+    return lambda body: parser.parse(io.BytesIO(body))
+
+
+def render_cases(size):
+    """Render and parse a list of `size` recipes with each format."""
+    data = RecipeSerializer(
+        [make_recipe(5, pk=i + 1) for i in range(size)], many=True
+    ).data
+    count = max(1, 100 // size)
+    formats = [
+        (JSONRenderer, JSONParser),
+        (ORJSONRenderer, ORJSONParser),
+        (MessagePackRenderer, MessagePackParser),
+    ]
+    result = []
+    for renderer_class, parser_class in formats:
+        body = renderer_class().render(data)
+        result += [
+            (renderer_class.__name__, 'render',
+             _render(renderer_class), [data] * count),
+            (parser_class.__name__, 'parse',
+             _parse(parser_class), [body] * count),
+        ]
+    return result
+
+
+def cases(size):
+    """Return (name, operation, func, objects) to measure at a size."""
+    count = max(1, 100 // size)
+    recipes = [make_recipe(size, pk=i + 1) for i in range(count)]
+    tags = [Tag(pk=i, user_id=1, name=_name('Tag ', size))
+            for i in range(count)]
+    users = [User(pk=i, email=f'user{i}@example.com',
+                  name=_name('Name ', size))
+             for i in range(count)]
+    views = [_recipe_view(size) for _ in range(count)]
+
+    return [
+        ('RecipeSerializer', 'serialize',
+         _serialize(RecipeSerializer), recipes),
+        ('RecipeSerializer', 'deserialize',
+         _deserialize(RecipeSerializer), [recipe_payload(size)] * count),
+        ('RecipeDetailSerializer', 'serialize',
+         _serialize(RecipeDetailSerializer), recipes),
+        ('RecipeDetailSerializer', 'deserialize',
+         _deserialize(RecipeDetailSerializer), [recipe_payload(size)] * count),
+        ('TagSerializer', 'serialize',
+         _serialize(TagSerializer), tags),
+        ('TagSerializer', 'deserialize',
+         _deserialize(TagSerializer),
+         [{'name': _name('Tag ', size)}] * count),
+        ('UserSerializer', 'serialize',
+         _serialize(UserSerializer), users),
+        ('UserSerializer', 'deserialize',
+         _deserialize(UserSerializer),
+         [{'email': 'new@example.com', 'password': 'testpass123',
+           'name': _name('Name ', size)}] * count),
+        ('RecipeViewSet.get_queryset', 'build', _queryset, views),
+        ('RecipeViewSet.get_queryset', 'compile', _queryset_sql, views),
+    ] + render_cases(size)
+
+
+def run(sizes=SIZES, repeat=5):
+    """
+    Measure every case at every size, returning
+    {name: {operation: {size: measurement}}}.
+    """
+    results = {}
+    for size in sizes:
+        for name, operation, func, objects in cases(size):
+            results.setdefault(name, {}).setdefault(operation, {})[
+                str(size)
+            ] = measure(func, objects, repeat=repeat)
+    return results
+
+
+def compare(results, previous):
+    """Yield (name, operation, size, old us, new us) present in both."""
+    for name, operations in results.items():
+        for operation, sizes in operations.items():
+            for size, measurement in sizes.items():
+                old = previous.get(name, {}).get(operation, {}).get(size)
+                if old is not None:
+                    yield name, operation, size, old['us'], measurement['us']
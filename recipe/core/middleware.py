@@ -0,0 +1,418 @@
+"""
+Middleware for the recipe project.
+"""
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, connections, DatabaseError
+from django.db.migrations.executor import MigrationExecutor
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from core.instrumentation import (
+    DuplicateQueryError,
+    RequestMetrics,
+    collect_metrics,
+    current_metrics,
+    detect_duplicate_queries,
+    view_name,
+)
+from core import compression, metrics
+from core.models import User, RequestProfile
+from core.profiling import RequestProfiler, profile_token_user_id
+from core.routers import read_from_replica
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+timing_logger = logging.getLogger('core.instrumentation')
+
+
+class HealthCheckMiddleware:
+    """
+    Answer liveness and readiness probes before sessions, authentication
+    and the URL resolver run.
+    """
+    LIVENESS_PATHS = ('/healthz', '/healthz/')
+    READINESS_PATHS = ('/readyz', '/readyz/')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.migrated = False
+
+    def _check_migrations(self):
+        """Return whether every migration is applied, caching success."""
+        if not self.migrated:
+            executor = MigrationExecutor(connection)
+            targets = executor.loader.graph.leaf_nodes()
+            self.migrated = not executor.migration_plan(targets)
+        return self.migrated
+
+    def readiness(self):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not self._check_migrations():
+                return JsonResponse(
+                    {'status': 'unavailable', 'reason': 'migrations'},
+                    status=503
+                )
+        except DatabaseError:
+            return JsonResponse(
+                {'status': 'unavailable', 'reason': 'database'},
+                status=503
+            )
+        return JsonResponse({'status': 'ok'})
+
+    def __call__(self, request):
+        if request.path in self.LIVENESS_PATHS:
+            return JsonResponse({'status': 'ok'})
+        if request.path in self.READINESS_PATHS:
+            return self.readiness()
+        return self.get_response(request)
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Shed load with 503 and Retry-After once CONCURRENCY_LIMIT requests
+    are in flight in this process, instead of queueing them.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        limit = settings.CONCURRENCY_LIMIT
+        if not limit or request.path in settings.CONCURRENCY_LIMIT_EXEMPT:
+            return self.get_response(request)
+
+        with self._lock:
+            admitted = self.in_flight < limit
+            if admitted:
+                self.in_flight += 1
+        if not admitted:
+            response = JsonResponse(
+                {'detail': 'Server is busy, retry later.'},
+                status=503
+            )
+            response['Retry-After'] = str(settings.CONCURRENCY_RETRY_AFTER)
+            return response
+
+        try:
+            return self.get_response(request)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serve safe requests from read replicas, keeping an authenticated
+    client on the primary for a short window after it writes. The pins
+    live in REPLICA_PIN_CACHE, which needs to be shared by every worker
+    serving the client, see core.checks.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _pin_key(self, request):
+        """
+        Return the cache key of the credentials of the request, or None
+        for anonymous requests, which are never pinned.
+        """
+        ident = (request.META.get('HTTP_AUTHORIZATION') or
+                 request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        if not ident:
+            return None
+        return 'replica-pin:' + hashlib.sha1(ident.encode()).hexdigest()
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        pins = caches[settings.REPLICA_PIN_CACHE]
+        key = self._pin_key(request)
+        if request.method in SAFE_METHODS:
+            if key is not None and pins.get(key):
+                return self.get_response(request)
+            with read_from_replica():
+                return self.get_response(request)
+
+        response = self.get_response(request)
+        if key is not None and response.status_code < 500:
+            pins.set(key, True, timeout=settings.REPLICA_PIN_SECONDS)
+        return response
+
+
+class RequestTimingMiddleware:
+    """
+    Report query count, database, serializer and view time of a sampled
+    share of requests in a Server-Timing header and a log line.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.REQUEST_TIMING_SAMPLE_RATE
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        start = time.perf_counter()
+        with collect_metrics(metrics), ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(metrics.execute))
+            response = self.get_response(request)
+
+        end = time.perf_counter()
+        metrics.total_time = end - start
+        if metrics.view_started is not None:
+            metrics.view_time = end - metrics.view_started
+
+        response['Server-Timing'] = metrics.server_timing()
+        if timing_logger.isEnabledFor(logging.INFO):
+            timing_logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                **metrics.as_dict(),
+            }))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.view = view_name(view_func, request.method)
+            metrics.view_started = time.perf_counter()
+
+
+class DuplicateQueryMiddleware:
+    """
+    Log, or raise in tests, when a request repeats a structurally
+    identical query, as N+1 access patterns do.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DUPLICATE_QUERY_DETECTION:
+            return self.get_response(request)
+
+        threshold = settings.DUPLICATE_QUERY_THRESHOLD
+        with detect_duplicate_queries(threshold, False) as recorder:
+            response = self.get_response(request)
+
+        if recorder.duplicates(threshold):
+            message = (f'Repeated queries in {request.method} '
+                       f'{request.path}:\n{recorder.report(threshold)}')
+            if settings.DUPLICATE_QUERY_RAISE:
+                raise DuplicateQueryError(message)
+            timing_logger.warning(message)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests carrying a staff X-Profile token, or a sampled
+    share of the requests of staff users, and record them for the admin.
+    PROFILING_SAMPLE_ALL_USERS extends sampling to every request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _profile_user(self, request):
+        """Return (profile, staff user id) for the request."""
+        token = request.META.get('HTTP_X_PROFILE')
+        if token:
+            user_id = profile_token_user_id(token)
+            if user_id is not None and User.objects.filter(
+                    pk=user_id, is_staff=True, is_active=True).exists():
+                return True, user_id
+            return False, None
+
+        rate = settings.PROFILING_SAMPLE_RATE
+        if not (rate > 0 and random.random() < rate):
+            return False, None
+        user_id = self._staff_user_id(request)
+        if user_id is None:
+            return settings.PROFILING_SAMPLE_ALL_USERS, None
+        return True, user_id
+
+    def _staff_user_id(self, request):
+        """Return the id of the active staff user of an API token, if any."""
+        keyword, _, key = request.META.get(
+            'HTTP_AUTHORIZATION', '').partition(' ')
+        if keyword != TokenAuthentication.keyword or not key:
+            return None
+        return Token.objects.filter(
+            key=key.strip(), user__is_staff=True, user__is_active=True
+        ).values_list('user_id', flat=True).first()
+
+    def __call__(self, request):
+        if (not settings.PROFILING_SAMPLE_RATE and
+                'HTTP_X_PROFILE' not in request.META):
+            return self.get_response(request)
+
+        profile, user_id = self._profile_user(request)
+        if not profile:
+            return self.get_response(request)
+
+        request.profile_view = ''
+        with RequestProfiler() as profiler:
+            response = self.get_response(request)
+
+        pstats_file, collapsed_file = profiler.save(
+            settings.PROFILING_DIR,
+            request.profile_view or 'request'
+        )
+        record = RequestProfile.objects.create(
+            method=request.method,
+            path=request.path[:RequestProfile._meta.get_field(
+                'path').max_length],
+            view=request.profile_view,
+            status_code=response.status_code,
+            duration_ms=profiler.duration * 1000,
+            user_id=user_id,
+            pstats_file=pstats_file,
+            collapsed_file=collapsed_file,
+        )
+        response['X-Profile-Id'] = str(record.pk)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, 'profile_view'):
+            request.profile_view = view_name(view_func, request.method)
+
+
+class MetricsMiddleware:
+    """Record Prometheus metrics of every request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        metrics.IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(count))
+                response = self.get_response(request)
+        finally:
+            metrics.IN_FLIGHT.dec()
+
+        labels = (
+            metrics.route_name(request),
+            request.method,
+            str(response.status_code),
+        )
+        metrics.REQUEST_LATENCY.labels(*labels).observe(
+            time.perf_counter() - start
+        )
+        try:
+            request_size = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            request_size = 0
+        metrics.REQUEST_SIZE.labels(*labels).observe(request_size)
+        if not response.streaming:
+            metrics.RESPONSE_SIZE.labels(*labels).observe(
+                len(response.content)
+            )
+        metrics.DB_QUERIES.labels(*labels).observe(queries[0])
+        metrics.observe_pools()
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with brotli or gzip. Responses with a strong ETag,
+    such as the schema and the recipe, tag and ingredient lists, are
+    compressed once and served from memory after.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cache = compression.CompressedCache(
+            settings.COMPRESSION_CACHE_SIZE
+        )
+
+    def _compressible(self, response):
+        content_type = response.get('Content-Type', '')
+        media_type = content_type.split(';')[0].strip().lower()
+        return (
+            media_type in settings.COMPRESSION_CONTENT_TYPES and
+            not response.has_header('Content-Encoding')
+        )
+
+    def _compress(self, response, encoding):
+        etag = response.get('ETag')
+        if etag is None or etag.startswith('W/'):
+            return compression.compress(
+                response.content, encoding, settings.COMPRESSION_LEVEL
+            )
+
+        key = (etag, encoding, len(response.content))
+        content = self.cache.get(key)
+        if content is None:
+            content = compression.compress(response.content, encoding,
+                                           settings.COMPRESSION_LEVEL)
+            self.cache.set(key, content)
+        return content
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self._compressible(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = compression.accepted_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compression.compress_sequence(
+                response.streaming_content,
+                encoding,
+                settings.COMPRESSION_LEVEL
+            )
+            if response.has_header('Content-Length'):
+                del response['Content-Length']
+        else:
+            if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+                return response
+            content = self._compress(response, encoding)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        # The compressed bytes differ, but they represent the same
+        # resource, so the ETag stays valid as a weak validator.
+        etag = response.get('ETag')
+        if etag and not etag.startswith('W/'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
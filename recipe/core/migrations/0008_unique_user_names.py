@@ -0,0 +1,63 @@
+from django.db import migrations
+from django.db.models.functions import Lower
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Keep the oldest tag or ingredient of each user and lowercase name,
+    pointing the recipes of its duplicates at it.
+    """
+    db = schema_editor.connection.alias
+    Recipe = apps.get_model('core', 'Recipe')
+    for field_name in ('tags', 'ingredients'):
+        field = Recipe._meta.get_field(field_name)
+        model = field.related_model
+        through = field.remote_field.through
+        column = field.m2m_reverse_field_name() + '_id'
+
+        keepers, duplicates = {}, {}
+        rows = model.objects.using(db).annotate(
+            name_key=Lower('name')
+        ).order_by('id').values_list('id', 'user_id', 'name_key')
+        for pk, user_id, name_key in rows:
+            keeper = keepers.setdefault((user_id, name_key), pk)
+            if keeper != pk:
+                duplicates[pk] = keeper
+        if not duplicates:
+            continue
+
+        links = set(through.objects.using(db).filter(**{
+            column + '__in': set(duplicates.values())
+        }).values_list('recipe_id', column))
+        moved = []
+        for recipe_id, duplicate in through.objects.using(db).filter(**{
+            column + '__in': list(duplicates)
+        }).values_list('recipe_id', column):
+            link = (recipe_id, duplicates[duplicate])
+            if link not in links:
+                links.add(link)
+                moved.append(through(recipe_id=recipe_id,
+                                     **{column: duplicates[duplicate]}))
+        through.objects.using(db).bulk_create(moved)
+        model.objects.using(db).filter(pk__in=list(duplicates)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_requestprofile'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_tag_user_name_ci_uniq '
+            'ON core_tag (user_id, lower(name))',
+            'DROP INDEX core_tag_user_name_ci_uniq',
+        ),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_ingredient_user_name_ci_uniq '
+            'ON core_ingredient (user_id, lower(name))',
+            'DROP INDEX core_ingredient_user_name_ci_uniq',
+        ),
+    ]
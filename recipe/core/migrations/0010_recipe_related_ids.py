@@ -0,0 +1,74 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:56
+
+import core.fields
+from django.db import migrations, models
+
+GIN_INDEXES = {
+    'core_recipe_tag_ids_gin': 'tag_ids',
+    'core_recipe_ingredient_ids_gin': 'ingredient_ids',
+}
+
+
+BATCH_SIZE = 1000
+
+
+def fill_related_ids(apps, schema_editor):
+    """Copy the existing M2M rows into the recipe id arrays."""
+    db = schema_editor.connection.alias
+    Recipe = apps.get_model('core', 'Recipe')
+    for field_name, attname in (('tags', 'tag_ids'),
+                                ('ingredients', 'ingredient_ids')):
+        field = Recipe._meta.get_field(field_name)
+        column = field.m2m_reverse_field_name() + '_id'
+        rows = field.remote_field.through.objects.using(db).order_by(
+            'recipe_id', column
+        ).values_list('recipe_id', column).iterator(chunk_size=BATCH_SIZE)
+        batch = []
+        for recipe_id, related_id in rows:
+            if not batch or batch[-1].pk != recipe_id:
+                if len(batch) == BATCH_SIZE:
+                    Recipe.objects.using(db).bulk_update(batch, [attname])
+                    batch = []
+                batch.append(Recipe(pk=recipe_id, **{attname: []}))
+            getattr(batch[-1], attname).append(related_id)
+        if batch:
+            Recipe.objects.using(db).bulk_update(batch, [attname])
+
+
+def create_gin_indexes(apps, schema_editor):
+    """Index the id arrays for containment and overlap lookups."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in GIN_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX {name} ON core_recipe USING gin ({column})'
+        )
+
+
+def drop_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in GIN_INDEXES:
+        schema_editor.execute(f'DROP INDEX {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipe_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_ids',
+            field=core.fields.IdArrayField(base_field=models.BigIntegerField(), blank=True, default=list, editable=False, size=None),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_ids',
+            field=core.fields.IdArrayField(base_field=models.BigIntegerField(), blank=True, default=list, editable=False, size=None),
+        ),
+        migrations.RunPython(fill_related_ids, migrations.RunPython.noop),
+        migrations.RunPython(create_gin_indexes, drop_gin_indexes),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 3.2.25 on 2026-10-19 11:12
+
+import hashlib
+import random
+
+import core.fields
+from django.db import migrations, models
+
+# Frozen copy of core.similarity as of this migration, so later changes
+# to the module or to SIMILARITY_* settings do not alter the backfill.
+PERMUTATIONS = 64
+BANDS = 32
+PRIME = (1 << 61) - 1
+BATCH_SIZE = 1000
+
+
+def hash_parameters():
+    """Return the fixed (a, b) of each hash function a * x + b mod PRIME."""
+    rng = random.Random(PERMUTATIONS)
+    return [(rng.randrange(1, PRIME), rng.randrange(PRIME))
+            for _ in range(PERMUTATIONS)]
+
+
+def band_keys(tag_ids, ingredient_ids, parameters):
+    """Return the LSH band keys of the tags and ingredients of a recipe."""
+    values = ({2 * pk for pk in tag_ids} |
+              {2 * pk + 1 for pk in ingredient_ids})
+    if not values:
+        return []
+    minhash = [min((a * value + b) % PRIME for value in values)
+               for a, b in parameters]
+    rows = PERMUTATIONS // BANDS
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(
+            repr((band, minhash[band * rows:(band + 1) * rows])).encode(),
+            digest_size=8,
+        ).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def fill_lsh_keys(apps, schema_editor):
+    """Compute the LSH keys of the existing recipes."""
+    db = schema_editor.connection.alias
+    Recipe = apps.get_model('core', 'Recipe')
+    parameters = hash_parameters()
+    recipes = Recipe.objects.using(db).order_by('pk').only(
+        'tag_ids', 'ingredient_ids'
+    ).iterator(chunk_size=BATCH_SIZE)
+    batch = []
+    for recipe in recipes:
+        recipe.lsh_keys = band_keys(recipe.tag_ids, recipe.ingredient_ids,
+                                    parameters)
+        batch.append(recipe)
+        if len(batch) == BATCH_SIZE:
+            Recipe.objects.using(db).bulk_update(batch, ['lsh_keys'])
+            batch = []
+    if batch:
+        Recipe.objects.using(db).bulk_update(batch, ['lsh_keys'])
+
+
+def create_gin_index(apps, schema_editor):
+    """Index the LSH keys for overlap lookups."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX core_recipe_lsh_keys_gin ON core_recipe '
+        'USING gin (lsh_keys)'
+    )
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX core_recipe_lsh_keys_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='lsh_keys',
+            field=core.fields.IdArrayField(base_field=models.BigIntegerField(), blank=True, default=list, editable=False, size=None),
+        ),
+        migrations.RunPython(fill_lsh_keys, migrations.RunPython.noop),
+        migrations.RunPython(create_gin_index, drop_gin_index),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:05
+
+import re
+
+from django.db import migrations
+
+# Shard N hands out the ids from N << ID_RANGE_BITS on, so the ids of
+# recipes, tags and ingredients stay unique across shards and moving a
+# user between shards keeps them.
+ID_RANGE_BITS = 48
+TABLES = ['core_recipe', 'core_tag', 'core_ingredient']
+
+
+def shard_number(alias):
+    """Return the number of a shard alias, 0 for default."""
+    match = re.fullmatch(r'shard(\d+)', alias)
+    return int(match.group(1)) if match else 0
+
+
+def offset_sequences(apps, schema_editor):
+    """Start the id sequences of the shard in its own range."""
+    connection = schema_editor.connection
+    start = shard_number(connection.alias) << ID_RANGE_BITS
+    if not start:
+        return
+    with connection.cursor() as cursor:
+        for table in TABLES:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"GREATEST(%s, (SELECT COALESCE(MAX(id), 0) + 1 "
+                    f"FROM {table})), false)",
+                    [start]
+                )
+            elif connection.vendor == 'sqlite':
+                cursor.execute(
+                    'SELECT seq FROM sqlite_sequence WHERE name = %s',
+                    [table]
+                )
+                row = cursor.fetchone()
+                cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s',
+                               [table])
+                cursor.execute(
+                    'INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)',
+                    [table, max(start - 1, row[0] if row else 0)]
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipe_lsh_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(offset_sequences, migrations.RunPython.noop),
+    ]
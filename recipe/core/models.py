@@ -1,16 +1,32 @@
 """
 Database Models.
 """
+import contextvars
 import uuid
 import os
+from collections import Counter
+from contextlib import contextmanager
+from decimal import Decimal
 
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Lower
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin
 )
 from django.conf import settings
+from django.utils import timezone
+
+from core import routers, similarity
+from core.fields import IdArrayField
+
+
+# Lower bounds of the price ranges counted by the recipe statistics.
+PRICE_BUCKETS = [0, 5, 10, 20, 50, 100]
+
+_pending_stats = contextvars.ContextVar('pending_stats', default=None)
 
 
 def recipe_image_file_path(instance, filename):
@@ -29,6 +45,8 @@ class UserManager(BaseUserManager):
             raise ValueError('Email field is required')
 
         user = self.model(email=self.normalize_email(email), **extra_fields)
+        if not user.shard and routers.sharding_enabled():
+            user.shard = routers.shard_placement(user.email)
         user.set_password(password)
         user.save(using=self._db)
 
@@ -42,12 +60,187 @@ class UserManager(BaseUserManager):
         return user
 
 
+class NamedByUserManager(models.Manager):
+    """
+    Manager for objects whose names are unique per user ignoring case,
+    as enforced by a unique index on (user_id, lower(name)).
+    """
+
+    def upsert(self, user, names):
+        """
+        Return the objects of the user with the given names, creating the
+        missing ones. Names match existing objects case-insensitively.
+        """
+        names_by_key = {}
+        for name in names:
+            names_by_key.setdefault(name.lower(), name)
+        if not names_by_key:
+            return []
+
+        db = self._db or router.db_for_write(self.model)
+        connection = connections[db]
+        if connection.vendor != 'postgresql':
+            self.db_manager(db).bulk_create(
+                [self.model(user=user, name=name)
+                 for name in names_by_key.values()],
+                ignore_conflicts=True
+            )
+            return list(self.db_manager(db).annotate(
+                name_key=Lower('name')
+            ).filter(user=user, name_key__in=list(names_by_key)))
+
+        # A single statement, safe against concurrent inserts: a no-op
+        # update of conflicting rows makes RETURNING include them.
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        values = ', '.join(['(%s, %s)'] * len(names_by_key))
+        params = []
+        for name in names_by_key.values():
+            params += [user.pk, name]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, name) VALUES {values} '
+                f'ON CONFLICT (user_id, lower(name)) '
+                f'DO UPDATE SET name = {table}.name '
+                f'RETURNING id, user_id, name',
+                params
+            )
+            return [
+                self.model.from_db(db, ['id', 'user_id', 'name'], row)
+                for row in cursor.fetchall()
+            ]
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Queries on recipes."""
+    # Denormalized copies of the M2M relations, by relation name.
+    related_id_fields = {'tags': 'tag_ids', 'ingredients': 'ingredient_ids'}
+
+    def related_ids(self, relation, recipe_ids):
+        """Return the sorted related ids of each recipe from the M2M rows."""
+        field = self.model._meta.get_field(relation)
+        column = field.m2m_reverse_field_name() + '_id'
+        ids = {recipe_id: [] for recipe_id in recipe_ids}
+        rows = field.remote_field.through.objects.using(self.db).filter(
+            recipe_id__in=list(ids)
+        ).order_by('recipe_id', column).values_list('recipe_id', column)
+        for recipe_id, related_id in rows:
+            ids[recipe_id].append(related_id)
+        return ids
+
+    def sync_related_ids(self, relations=None, check=False, batch_size=1000):
+        """
+        Copy the M2M rows of the recipes into their id arrays, or only
+        compare them when `check` is set, in batches. Return the ids of
+        the recipes whose arrays were out of date.
+        """
+        relations = relations or list(self.related_id_fields)
+        attnames = [self.related_id_fields[name] for name in relations]
+        recipes = self.only(
+            'pk', 'user_id', 'lsh_keys', *self.related_id_fields.values()
+        ).order_by('pk')
+        stale, last = [], None
+        while True:
+            batch = recipes if last is None else recipes.filter(pk__gt=last)
+            batch = list(batch[:batch_size])
+            if not batch:
+                return stale
+            last = batch[-1].pk
+
+            changed, deltas = {}, {}
+            for relation, attname in zip(relations, attnames):
+                ids = self.related_ids(relation, [r.pk for r in batch])
+                stats_field = RecipeStats.count_fields[relation]
+                for recipe in batch:
+                    old = getattr(recipe, attname)
+                    if old != ids[recipe.pk]:
+                        setattr(recipe, attname, ids[recipe.pk])
+                        changed[recipe.pk] = recipe
+                        counts = deltas.setdefault(
+                            recipe.user_id, {}
+                        ).setdefault(stats_field, Counter())
+                        counts.update(map(str, ids[recipe.pk]))
+                        counts.subtract(map(str, old))
+            stale += list(changed)
+            if changed and not check:
+                for recipe in changed.values():
+                    recipe.lsh_keys = recipe.similarity_keys()
+                with transaction.atomic(using=self.db):
+                    self.model.objects.using(self.db).bulk_update(
+                        changed.values(), attnames + ['lsh_keys']
+                    )
+                    for user_id, delta in deltas.items():
+                        RecipeStats.objects.db_manager(self.db).apply(
+                            user_id, delta
+                        )
+            if len(batch) < batch_size:
+                return stale
+
+    def sync_lsh_keys(self, check=False, batch_size=1000):
+        """
+        Recompute the LSH keys of the recipes from their id arrays, or only
+        compare them when `check` is set, in batches. Return the ids of
+        the recipes whose keys were out of date.
+        """
+        recipes = self.only(
+            'pk', 'lsh_keys', *self.related_id_fields.values()
+        ).order_by('pk')
+        stale, last = [], None
+        while True:
+            batch = recipes if last is None else recipes.filter(pk__gt=last)
+            batch = list(batch[:batch_size])
+            if not batch:
+                return stale
+            last = batch[-1].pk
+
+            changed = []
+            for recipe in batch:
+                keys = recipe.similarity_keys()
+                if recipe.lsh_keys != keys:
+                    recipe.lsh_keys = keys
+                    changed.append(recipe)
+            stale += [recipe.pk for recipe in changed]
+            if changed and not check:
+                self.model.objects.using(self.db).bulk_update(changed,
+                                                              ['lsh_keys'])
+            if len(batch) < batch_size:
+                return stale
+
+    def similar_to(self, recipe, limit=10):
+        """
+        Return up to `limit` (id, similarity) of the other recipes of the
+        same user sharing an LSH key with `recipe`, ranked by the Jaccard
+        similarity of their tags and ingredients. PostgreSQL looks the keys
+        up in their GIN index, other backends scan the user's recipes.
+        """
+        if not recipe.lsh_keys:
+            return []
+        candidates = self.filter(user_id=recipe.user_id).exclude(pk=recipe.pk)
+        fields = ('pk', 'tag_ids', 'ingredient_ids')
+        if connections[self.db].vendor == 'postgresql':
+            rows = candidates.filter(
+                lsh_keys__overlap=recipe.lsh_keys
+            ).values_list(*fields)
+        else:
+            keys = set(recipe.lsh_keys)
+            rows = [row[:3] for row in candidates.values_list(
+                *fields, 'lsh_keys'
+            ) if keys.intersection(row[3])]
+        return similarity.most_similar(
+            similarity.tokens(recipe.tag_ids, recipe.ingredient_ids),
+            ((pk, similarity.tokens(tag_ids, ingredient_ids))
+             for pk, tag_ids, ingredient_ids in rows),
+            limit,
+        )
+
+
 class User(AbstractBaseUser, PermissionsMixin):
     """User in the system."""
     email = models.EmailField(max_length=225, unique=True)
     name = models.CharField(max_length=225)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Database holding the recipes, tags and ingredients of the user.
+    shard = models.CharField(max_length=64, blank=True)
 
     objects = UserManager()
 
@@ -58,7 +251,8 @@ class Recipe(models.Model):
     """Recipe Object"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_constraint=False
     )
     title = models.CharField(max_length=225)
     description = models.TextField(blank=True)
@@ -68,17 +262,75 @@ class Recipe(models.Model):
     tags = models.ManyToManyField(to='Tag')
     ingredients = models.ManyToManyField('Ingredient')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # Ids of the tags and ingredients, kept in sync with the M2M rows by
+    # core.signals and GIN indexed on PostgreSQL for containment lookups.
+    tag_ids = IdArrayField(default=list, blank=True, editable=False)
+    ingredient_ids = IdArrayField(default=list, blank=True, editable=False)
+    # LSH band keys of the MinHash signature of the tag and ingredient
+    # ids, see core.similarity, kept in sync with the arrays.
+    lsh_keys = IdArrayField(default=list, blank=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        # Serve each ordering of a user's recipes, including keyset pages.
+        indexes = [
+            models.Index(fields=['user', 'id'],
+                         name='recipe_user_id_idx'),
+            models.Index(fields=['user', 'time_minutes', 'id'],
+                         name='recipe_user_time_idx'),
+            models.Index(fields=['user', 'price', 'id'],
+                         name='recipe_user_price_idx'),
+            models.Index(fields=['user', 'title', 'id'],
+                         name='recipe_user_title_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the stored time and price, unless deferred."""
+        recipe = super().from_db(db, field_names, values)
+        recipe._stored_totals = recipe.loaded_totals()
+        return recipe
+
+    def loaded_totals(self):
+        """Return the time and price of the recipe, or None if deferred."""
+        if {'time_minutes', 'price'}.intersection(self.get_deferred_fields()):
+            return None
+        price = self._meta.get_field('price').to_python(self.price)
+        return self.time_minutes, price
+
+    def save(self, *args, **kwargs):
+        """Save the recipe without overwriting its id arrays."""
+        if (not self._state.adding and not kwargs.get('force_insert') and
+                kwargs.get('update_fields') is None):
+            skipped = self.get_deferred_fields().union(
+                RecipeQuerySet.related_id_fields.values(), ['lsh_keys']
+            )
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+    def similarity_keys(self):
+        """Return the LSH keys of the tags and ingredients of the recipe."""
+        return similarity.band_keys(
+            similarity.tokens(self.tag_ids, self.ingredient_ids)
+        )
+
 
 class Tag(models.Model):
     """Tag for filtering recipes."""
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
-                             on_delete=models.CASCADE)
+                             on_delete=models.CASCADE,
+                             db_constraint=False)
     name = models.CharField(max_length=225)
 
+    objects = NamedByUserManager()
+
     def __str__(self):
         return self.name
 
@@ -88,8 +340,297 @@ class Ingredient(models.Model):
     name = models.CharField(max_length=225)
     user = models.ForeignKey(
            settings.AUTH_USER_MODEL,
-           on_delete=models.CASCADE
+           on_delete=models.CASCADE,
+           db_constraint=False
         )
 
+    objects = NamedByUserManager()
+
     def __str__(self):
         return self.name
+
+
+def price_bucket(price):
+    """
+    Return the label of the price range holding a price. Prices below
+    the first bound count in the first range.
+    """
+    lower = max((bound for bound in PRICE_BUCKETS if bound <= price),
+                default=PRICE_BUCKETS[0])
+    index = PRICE_BUCKETS.index(lower)
+    if index + 1 < len(PRICE_BUCKETS):
+        return f'{lower}-{PRICE_BUCKETS[index + 1]}'
+    return f'{lower}+'
+
+
+def recipe_stats_delta(recipe, sign=1):
+    """Return the contribution of a recipe to the statistics of its user."""
+    price = recipe._meta.get_field('price').to_python(recipe.price)
+    return {
+        'recipe_count': sign,
+        'time_minutes_total': sign * recipe.time_minutes,
+        'price_total': sign * price,
+        'price_histogram': {price_bucket(price): sign},
+        'tag_counts': {str(pk): sign for pk in recipe.tag_ids},
+        'ingredient_counts': {str(pk): sign for pk in recipe.ingredient_ids},
+    }
+
+
+def add_stats_deltas(first, second):
+    """Return the sum of two statistics changes."""
+    total = dict(first)
+    for name, change in second.items():
+        if isinstance(change, dict):
+            counts = Counter(total.get(name, {}))
+            counts.update(change)
+            total[name] = dict(counts)
+        else:
+            total[name] = total.get(name, 0) + change
+    return total
+
+
+class RecipeStatsManager(models.Manager):
+    """Manager computing and updating recipe statistics."""
+
+    def compute(self, user_id):
+        """Return the statistics of a user computed from scratch."""
+        db = self._db or router.db_for_write(self.model)
+        recipes = Recipe.objects.using(db).filter(user_id=user_id)
+        buckets = {}
+        for lower, upper in zip(PRICE_BUCKETS, PRICE_BUCKETS[1:] + [None]):
+            condition = Q()
+            if lower != PRICE_BUCKETS[0]:
+                condition &= Q(price__gte=lower)
+            if upper is not None:
+                condition &= Q(price__lt=upper)
+            buckets[price_bucket(lower)] = Count('pk', filter=condition)
+        totals = recipes.aggregate(
+            recipe_count=Count('pk'),
+            time_minutes_total=Sum('time_minutes'),
+            price_total=Sum('price'),
+            **buckets
+        )
+
+        values = {
+            'recipe_count': totals['recipe_count'],
+            'time_minutes_total': totals['time_minutes_total'] or 0,
+            'price_total': totals['price_total'] or Decimal(0),
+            'price_histogram': {
+                label: totals[label] for label in buckets if totals[label]
+            },
+        }
+        for relation, field_name in self.model.count_fields.items():
+            field = Recipe._meta.get_field(relation)
+            column = field.m2m_reverse_field_name() + '_id'
+            rows = field.remote_field.through.objects.using(db).filter(
+                recipe__user_id=user_id
+            ).values(column).annotate(
+                recipes=Count('pk')
+            ).values_list(column, 'recipes')
+            values[field_name] = {str(pk): count for pk, count in rows}
+        return values
+
+    def rebuild(self, user_id):
+        """Recompute and store the statistics of a user."""
+        stats, _ = self.update_or_create(user_id=user_id,
+                                         defaults=self.compute(user_id))
+        return stats
+
+    @contextmanager
+    def batched(self):
+        """
+        Collect the changes applied inside the block and write them once
+        per user when it exits without error.
+        """
+        if _pending_stats.get() is not None:
+            yield
+            return
+
+        pending = {}
+        token = _pending_stats.set(pending)
+        try:
+            yield
+        finally:
+            _pending_stats.reset(token)
+        for (db, user_id), (delta, create) in pending.items():
+            self.db_manager(db).apply(user_id, delta, create)
+
+    def apply(self, user_id, delta, create=True):
+        """
+        Add changes to the statistics of a user. Counts by key are dicts
+        and other fields numbers. A user without statistics yet is
+        rebuilt from scratch when `create` is set and skipped otherwise.
+        Changes adding up to nothing write nothing.
+        """
+        delta = {
+            name: {key: n for key, n in value.items() if n}
+            if isinstance(value, dict) else value
+            for name, value in delta.items()
+        }
+        delta = {name: value for name, value in delta.items() if value}
+        if not delta:
+            return
+
+        db = self._db or router.db_for_write(self.model)
+        pending = _pending_stats.get()
+        if pending is not None:
+            merged, merged_create = pending.get((db, user_id), ({}, False))
+            pending[(db, user_id)] = (
+                add_stats_deltas(merged, delta), merged_create or create
+            )
+            return
+
+        with transaction.atomic(using=db):
+            try:
+                stats = self.db_manager(db).select_for_update().get(
+                    user_id=user_id
+                )
+            except self.model.DoesNotExist:
+                if create:
+                    self.db_manager(db).rebuild(user_id)
+                return
+
+            merged = add_stats_deltas(
+                {name: getattr(stats, name) for name in delta}, delta
+            )
+            for name, value in merged.items():
+                if isinstance(value, dict):
+                    value = {key: n for key, n in value.items() if n > 0}
+                setattr(stats, name, value)
+            stats.save(update_fields=list(delta))
+
+
+class RecipeStats(models.Model):
+    """Summary of the recipes of a user, maintained incrementally."""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name='recipe_stats'
+    )
+    recipe_count = models.PositiveIntegerField(default=0)
+    time_minutes_total = models.BigIntegerField(default=0)
+    price_total = models.DecimalField(max_digits=14, decimal_places=2,
+                                      default=0)
+    # Recipes by price range label, and by tag and ingredient id.
+    price_histogram = models.JSONField(default=dict)
+    tag_counts = models.JSONField(default=dict)
+    ingredient_counts = models.JSONField(default=dict)
+
+    objects = RecipeStatsManager()
+
+    # Field counting the recipes per related object, by relation name.
+    count_fields = {'tags': 'tag_counts', 'ingredients': 'ingredient_counts'}
+
+    def __str__(self):
+        return f'Recipe statistics of user {self.user_id}'
+
+    @property
+    def average_time_minutes(self):
+        if not self.recipe_count:
+            return None
+        return self.time_minutes_total / self.recipe_count
+
+    @property
+    def average_price(self):
+        if not self.recipe_count:
+            return None
+        return (Decimal(self.price_total) / self.recipe_count).quantize(
+            Decimal('0.01')
+        )
+
+    def top(self, relation, limit=10):
+        """Return the most used (id, recipe count) pairs of a relation."""
+        counts = getattr(self, self.count_fields[relation])
+        return sorted(
+            ((int(pk), n) for pk, n in counts.items()),
+            key=lambda item: (-item[1], item[0])
+        )[:limit]
+
+
+class UserPurge(models.Model):
+    """Progress of deleting a user and all of their recipe data."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    # Not a foreign key, the user is gone once the purge is done.
+    user_id = models.BigIntegerField()
+    email = models.EmailField(max_length=225)
+    shard = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=PENDING)
+    recipes_deleted = models.PositiveIntegerField(default=0)
+    tags_deleted = models.PositiveIntegerField(default=0)
+    ingredients_deleted = models.PositiveIntegerField(default=0)
+    images_deleted = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Purge of {self.email}'
+
+
+class Job(models.Model):
+    """Call of a function registered with core.jobs.job, run by a worker."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=225)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    # Jobs of higher priority run first.
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    # A running job is claimed again after its worker held it this long.
+    locked_until = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=225, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at'],
+                         name='job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+
+class RequestProfile(models.Model):
+    """CPU profile captured for one request."""
+    created = models.DateTimeField(auto_now_add=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2048)
+    view = models.CharField(max_length=225, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        on_delete=models.SET_NULL
+    )
+    pstats_file = models.CharField(max_length=1024)
+    collapsed_file = models.CharField(max_length=1024)
+
+    def __str__(self):
+        return f'{self.method} {self.path}'
@@ -0,0 +1,24 @@
+"""
+Migration operations.
+"""
+from django.db import DEFAULT_DB_ALIAS, migrations
+
+
+class AlterFieldOnShards(migrations.AlterField):
+    """
+    AlterField changing the schema of the shard databases only. Used to
+    drop the user foreign key constraints of recipe data: users live on
+    the default database alone, where the constraints still hold.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.alias != DEFAULT_DB_ALIAS:
+            super().database_forwards(app_label, schema_editor,
+                                      from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.alias != DEFAULT_DB_ALIAS:
+            super().database_backwards(app_label, schema_editor,
+                                       from_state, to_state)
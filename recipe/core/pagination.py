@@ -0,0 +1,131 @@
+"""
+Keyset pagination for ordered list views.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Page through a list when `page_size` or `cursor` is given, using the
+    ordering values of the last row as cursor. The next page is a range
+    scan on the index of the ordering instead of an OFFSET, and rows
+    inserted meanwhile do not shift it.
+
+    The view's `get_ordering()` must end with a unique field such as id.
+    """
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    page_size = 20
+    max_page_size = 100
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def encode_cursor(self, instance):
+        values = [
+            self.model._meta.get_field(name).value_to_string(instance)
+            for name, _ in self.ordering
+        ]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                self.model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.ordering, values)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            raise NotFound('Invalid cursor.')
+
+    def after(self, values):
+        """Filter rows ordered after the given ordering values."""
+        condition = None
+        for (name, descending), value in reversed(
+                list(zip(self.ordering, values))):
+            lookup = f'{name}__lt' if descending else f'{name}__gt'
+            following = Q(**{lookup: value})
+            if condition is not None:
+                following |= Q(**{name: value}) & condition
+            condition = following
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if (self.cursor_query_param not in params and
+                self.page_size_query_param not in params):
+            return None
+
+        self.request = request
+        self.model = queryset.model
+        self.ordering = [
+            (name.lstrip('-'), name.startswith('-'))
+            for name in view.get_ordering()
+        ]
+        size = self.get_page_size(request)
+        cursor = params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode_cursor(cursor)))
+
+        rows = list(queryset[:size + 1])
+        self.page = rows[:size]
+        self.has_next = len(rows) > size
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True,
+                         'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Cursor of the next page.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Page through results of this size.',
+                'schema': {'type': 'integer'},
+            },
+        ]
@@ -0,0 +1,159 @@
+"""
+In-process database connection pool.
+"""
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    """No connection became available before the checkout timeout."""
+
+
+class PoolExhausted(OperationalError):
+    """Too many callers are already waiting for a connection."""
+
+
+class ConnectionPool:
+    """Thread safe pool of DB-API connections."""
+
+    def __init__(self, connect, max_size=10, idle_timeout=300,
+                 timeout=30, max_waiting=0, check=None, reset=None):
+        self.connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.max_waiting = max_waiting
+        self.check = check
+        self.reset = reset
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._in_use = 0
+        self._waiting = 0
+        self._wait_time = 0.0
+        self._checkouts = 0
+        self._checkout_failures = 0
+
+    def stats(self):
+        """Return the current gauges of the pool."""
+        with self._cond:
+            return {
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'wait_time_seconds': self._wait_time,
+                'checkout_failures': self._checkout_failures,
+            }
+
+    def getconn(self):
+        """Check out a healthy connection, waiting for a free slot."""
+        start = time.monotonic()
+        with self._cond:
+            if not self._idle and self._in_use >= self.max_size:
+                self._wait_for_slot(start)
+            self._in_use += 1
+            conn, expired = self._pop_idle()
+
+        self._close_all(expired)
+        try:
+            while conn is not None and not self._is_healthy(conn):
+                self._close_all([conn])
+                with self._cond:
+                    conn, expired = self._pop_idle()
+                self._close_all(expired)
+            if conn is None:
+                conn = self.connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._checkout_failures += 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._checkouts += 1
+            self._wait_time += time.monotonic() - start
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool, closing it if unusable."""
+        if not discard and not getattr(conn, 'closed', False):
+            try:
+                if self.reset is not None:
+                    self.reset(conn)
+            except Exception:
+                discard = True
+        else:
+            discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if not discard:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+        if discard:
+            self._close_all([conn])
+
+    def closeall(self):
+        """Close every idle connection held by the pool."""
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        self._close_all(idle)
+
+    def _wait_for_slot(self, start):
+        """Block until a connection is idle or a new one may be opened."""
+        if self.max_waiting and self._waiting >= self.max_waiting:
+            self._checkout_failures += 1
+            raise PoolExhausted(
+                f'Connection pool wait queue is full ({self.max_waiting}).'
+            )
+
+        deadline = start + self.timeout
+        self._waiting += 1
+        try:
+            while not self._idle and self._in_use >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._checkout_failures += 1
+                    raise PoolTimeout(
+                        'Timed out waiting for a database connection '
+                        f'after {self.timeout} seconds.'
+                    )
+                self._cond.wait(remaining)
+        finally:
+            self._waiting -= 1
+
+    def _pop_idle(self):
+        """Pop the most recently used idle connection and expired ones."""
+        expired = []
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._idle and self._idle[0][1] < cutoff:
+            expired.append(self._idle.popleft()[0])
+
+        conn = self._idle.pop()[0] if self._idle else None
+        return conn, expired
+
+    def _is_healthy(self, conn):
+        if getattr(conn, 'closed', False):
+            return False
+        if self.check is None:
+            return True
+        try:
+            self.check(conn)
+        except Exception:
+            return False
+        return True
+
+    def _close_all(self, conns):
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
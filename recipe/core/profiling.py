@@ -0,0 +1,101 @@
+"""
+On demand CPU profiling of single requests.
+"""
+import cProfile
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+
+
+SALT = 'core.profiling'
+
+
+def create_profile_token(user):
+    """Return an X-Profile header value letting a staff user profile."""
+    return signing.dumps({'user': user.pk}, salt=SALT)
+
+
+def profile_token_user_id(token):
+    """Return the user id of a valid profile token, or None."""
+    try:
+        payload = signing.loads(
+            token,
+            salt=SALT,
+            max_age=settings.PROFILING_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
+    return payload.get('user')
+
+
+class StackSampler(threading.Thread):
+    """Sample the stack of another thread at a fixed interval."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self.collapse(frame)] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    @staticmethod
+    def collapse(frame):
+        """Format a stack root first, as flamegraph tools expect."""
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            filename = os.path.basename(code.co_filename)
+            names.append(f'{code.co_name} ({filename})'.replace(';', ':'))
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+
+class RequestProfiler:
+    """Profile a call with cProfile and a stack sampler."""
+
+    def __init__(self, interval=None):
+        self.interval = interval or settings.PROFILING_INTERVAL
+        self.profile = cProfile.Profile()
+        self.sampler = None
+        self.duration = 0.0
+
+    def __enter__(self):
+        self.sampler = StackSampler(threading.get_ident(), self.interval)
+        self.sampler.start()
+        self.start = time.perf_counter()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.disable()
+        self.duration = time.perf_counter() - self.start
+        self.sampler.stop()
+
+    def save(self, directory, name):
+        """Write pstats and collapsed stacks, returning their paths."""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(
+            directory,
+            f'{time.strftime("%Y%m%dT%H%M%S")}-{name}-{uuid.uuid4().hex[:8]}'
+        )
+        self.profile.dump_stats(base + '.prof')
+        with open(base + '.collapsed', 'w') as collapsed:
+            for stack, count in self.sampler.stacks.most_common():
+                collapsed.write(f'{stack} {count}\n')
+        return base + '.prof', base + '.collapsed'
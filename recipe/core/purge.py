@@ -0,0 +1,130 @@
+"""
+Deleting users with their recipe data in bounded batches.
+"""
+from django.conf import settings
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from core.jobs import job
+from core.models import (
+    User,
+    Recipe,
+    RecipeStats,
+    Tag,
+    Ingredient,
+    UserPurge,
+)
+from core.routers import shard_for_user
+
+
+def start_purge(user, background=None, batch_size=None, progress=None):
+    """
+    Deactivate a user and purge them, in a job when `background` or else
+    PURGE_BACKGROUND is set, deleting `batch_size` rows per statement.
+    Return the UserPurge reporting the progress.
+    """
+    if background is None:
+        background = settings.PURGE_BACKGROUND
+
+    with transaction.atomic():
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        Token.objects.filter(user=user).delete()
+        purge = UserPurge.objects.create(user_id=user.pk, email=user.email,
+                                         shard=shard_for_user(user))
+        if background:
+            purge_job.enqueue(purge.pk, batch_size=batch_size)
+
+    if not background:
+        run_purge(purge, batch_size=batch_size, progress=progress)
+    return purge
+
+
+@job(max_attempts=3)
+def purge_job(purge_id, batch_size=None):
+    """Run a purge, resuming where a failed attempt stopped."""
+    run_purge(UserPurge.objects.get(pk=purge_id), batch_size=batch_size)
+
+
+def run_purge(purge, batch_size=None, progress=None):
+    """
+    Delete the recipe data of the user of a purge batch by batch, then
+    the user, saving the counts after each batch and passing the purge
+    to `progress`.
+    """
+    purge.status = UserPurge.RUNNING
+    purge.save(update_fields=['status', 'updated'])
+    try:
+        for counts in delete_recipe_data(purge.user_id,
+                                         purge.shard,
+                                         batch_size):
+            for name, count in counts.items():
+                setattr(purge, name, getattr(purge, name) + count)
+            purge.save(update_fields=[*counts, 'updated'])
+            if progress is not None:
+                progress(purge)
+
+        # Little is left for the deletion collector: tokens, log entries
+        # and the profiles of the user.
+        User.objects.filter(pk=purge.user_id).delete()
+    except Exception as exc:
+        purge.status = UserPurge.FAILED
+        purge.error = repr(exc)
+        purge.save(update_fields=['status', 'error', 'updated'])
+        raise
+
+    purge.status = UserPurge.DONE
+    purge.save(update_fields=['status', 'updated'])
+    return purge
+
+
+def delete_recipe_data(user_id, using, batch_size=None):
+    """
+    Delete the recipes, tags and ingredients of a user with set based
+    DELETE statements of at most `batch_size` rows, skipping the model
+    signals. Yield the counts deleted by each batch.
+    """
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    fields = [Recipe._meta.get_field(name) for name in ('tags', 'ingredients')]
+    storage = Recipe._meta.get_field('image').storage
+
+    while True:
+        with transaction.atomic(using=using):
+            rows = list(Recipe.objects.using(using).filter(
+                user_id=user_id
+            ).order_by('pk').values_list('pk', 'image')[:batch_size])
+            if not rows:
+                break
+            ids = [pk for pk, _ in rows]
+            for field in fields:
+                field.remote_field.through.objects.using(using).filter(
+                    recipe_id__in=ids
+                )._raw_delete(using)
+            Recipe.objects.using(using).filter(pk__in=ids)._raw_delete(using)
+
+        images = [name for _, name in rows if name]
+        for name in images:
+            storage.delete(name)
+        yield {'recipes_deleted': len(ids), 'images_deleted': len(images)}
+
+    for model, field in ((Tag, fields[0]), (Ingredient, fields[1])):
+        column = field.m2m_reverse_field_name()
+        counter = f'{model._meta.model_name}s_deleted'
+        while True:
+            with transaction.atomic(using=using):
+                ids = list(model.objects.using(using).filter(
+                    user_id=user_id
+                ).order_by('pk').values_list('pk', flat=True)[:batch_size])
+                if not ids:
+                    break
+                field.remote_field.through.objects.using(using).filter(**{
+                    f'{column}__in': ids
+                })._raw_delete(using)
+                model.objects.using(using).filter(pk__in=ids)._raw_delete(
+                    using
+                )
+            yield {counter: len(ids)}
+
+    RecipeStats.objects.using(using).filter(user_id=user_id)._raw_delete(
+        using
+    )
@@ -0,0 +1,240 @@
+"""
+Database routers.
+"""
+import contextvars
+import hashlib
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.utils import DatabaseError
+
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+_active_shard = contextvars.ContextVar('active_shard', default=None)
+
+# Models holding per user data, including the auto created through tables.
+SHARDED_MODELS = {
+    'recipe', 'tag', 'ingredient', 'recipe_tags', 'recipe_ingredients',
+    'recipestats',
+}
+
+LAG_SQL = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() '
+    'THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) '
+    'END'
+)
+
+
+@contextmanager
+def read_from_replica():
+    """Send reads made inside the block to a healthy replica."""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def sharding_enabled():
+    return len(settings.DATABASE_SHARDS) > 1
+
+
+def shard_placement(email):
+    """
+    Pick the shard of a user by rendezvous hashing of its email, which is
+    known before the user is first saved.
+    """
+    return max(
+        settings.DATABASE_SHARDS,
+        key=lambda alias: hashlib.md5(f'{alias}:{email}'.encode()).digest()
+    )
+
+
+def shard_for_user(user):
+    """Return the database alias holding the data of a user."""
+    return getattr(user, 'shard', '') or DEFAULT_DB_ALIAS
+
+
+def shard_for_user_id(user_id):
+    """Return the database alias holding the data of a user by id."""
+    shard = get_user_model().objects.using(DEFAULT_DB_ALIAS).filter(
+        pk=user_id
+    ).values_list('shard', flat=True).first()
+    return shard or DEFAULT_DB_ALIAS
+
+
+class ShardRoutingError(Exception):
+    """No shard is known for a query on recipe data."""
+
+
+def activate_shard(alias):
+    """Route sharded queries without an instance hint to the alias."""
+    return _active_shard.set(alias)
+
+
+def deactivate_shard(token):
+    _active_shard.reset(token)
+
+
+def is_sharded(model):
+    return (model._meta.app_label == 'core' and
+            model._meta.model_name in SHARDED_MODELS)
+
+
+def replica_lag(alias):
+    """Return the replication lag of a replica in seconds."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        connection.ensure_connection()
+        return 0.0
+
+    with connection.cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        lag = cursor.fetchone()[0]
+    return float(lag or 0)
+
+
+class ReplicaMonitor:
+    """Track which replicas are reachable and caught up."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = {}
+        self._healthy = {}
+
+    def healthy_replicas(self, primary=DEFAULT_DB_ALIAS):
+        """Return the replicas of a primary currently fit to serve reads."""
+        now = time.monotonic()
+        replicas = [alias for alias in settings.DATABASE_REPLICAS
+                    if primary_of(alias) == primary]
+        for alias in replicas:
+            with self._lock:
+                checked_at = self._checked_at.get(alias)
+                if (checked_at is not None and
+                        now - checked_at < settings.REPLICA_CHECK_INTERVAL):
+                    continue
+                self._checked_at[alias] = now
+            self._healthy[alias] = self.check(alias)
+
+        return [alias for alias in replicas if self._healthy.get(alias)]
+
+    def check(self, alias):
+        """Return whether a replica answers with an acceptable lag."""
+        try:
+            lag = replica_lag(alias)
+        except DatabaseError:
+            return False
+        return lag <= settings.REPLICA_MAX_LAG
+
+    def reset(self):
+        with self._lock:
+            self._checked_at.clear()
+            self._healthy.clear()
+
+
+monitor = ReplicaMonitor()
+
+
+def primary_of(alias):
+    """Return the primary database of a replica, or the alias itself."""
+    if alias in settings.DATABASE_REPLICAS:
+        return settings.REPLICA_PRIMARIES.get(alias, DEFAULT_DB_ALIAS)
+    return alias
+
+
+def replica_for(alias):
+    """
+    Return a healthy replica of a database inside `read_from_replica`,
+    or else the database itself.
+    """
+    if not _use_replica.get() or not settings.DATABASE_REPLICAS:
+        return alias
+    replicas = monitor.healthy_replicas(alias)
+    return random.choice(replicas) if replicas else alias
+
+
+class ReplicaRouter:
+    """
+    Route reads inside `read_from_replica` to a healthy replica of the
+    default database. ShardRouter picks replicas of the shards itself.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = replica_for(DEFAULT_DB_ALIAS)
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def db_for_write(self, model, **hints):
+        # Objects read from a replica are saved to the primary.
+        instance = hints.get('instance')
+        if (instance is not None and
+                instance._state.db in settings.DATABASE_REPLICAS):
+            return primary_of(instance._state.db)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        replicas = set(settings.DATABASE_REPLICAS)
+        if obj1._state.db in replicas or obj2._state.db in replicas:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ShardRouter:
+    """
+    Route recipe data to the shard of the user owning it, given by the
+    `instance` or `user_id` hint or else the active shard. Queries with
+    none of them raise ShardRoutingError rather than guess a shard. Reads
+    inside `read_from_replica` go to a healthy replica of the shard.
+    """
+
+    def _db_for_model(self, model, instance=None, user_id=None):
+        if not sharding_enabled():
+            return None
+
+        if not is_sharded(model):
+            # Users of sharded data only live on the default database.
+            if instance is not None and is_sharded(instance):
+                return DEFAULT_DB_ALIAS
+            return None
+
+        if instance is not None:
+            if instance._meta.label == settings.AUTH_USER_MODEL:
+                return shard_for_user(instance)
+            if is_sharded(instance):
+                if instance._state.db:
+                    return primary_of(instance._state.db)
+                if getattr(instance, 'user_id', None) is not None:
+                    return shard_for_user(instance.user)
+        if user_id is not None:
+            return shard_for_user_id(user_id)
+
+        alias = _active_shard.get()
+        if alias is None:
+            raise ShardRoutingError(
+                f'No shard for a query on {model._meta.label}: pass an '
+                f'instance or user_id hint, use() a shard or activate one.'
+            )
+        return alias
+
+    def db_for_read(self, model, **hints):
+        alias = self._db_for_model(model, hints.get('instance'),
+                                   hints.get('user_id'))
+        return None if alias is None else replica_for(alias)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for_model(model, hints.get('instance'),
+                                  hints.get('user_id'))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if sharding_enabled() and (is_sharded(obj1) or is_sharded(obj2)):
+            return True
+        return None
@@ -0,0 +1,95 @@
+"""
+OpenAPI schema served from a build time artifact or an in-memory cache.
+"""
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils import translation
+from django.utils.cache import quote_etag
+from django.utils.http import parse_etags
+from drf_spectacular.renderers import OpenApiJsonRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.views import SpectacularAPIView
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def generate_schema(api_version=None):
+    """Generate the OpenAPI schema of the project."""
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(
+        api_version=api_version
+    )
+    return generator.get_schema(request=None, public=True)
+
+
+def render_schema_json(schema):
+    """Render the schema the way the JSON artifact stores it."""
+    return OpenApiJsonRenderer().render(schema, renderer_context={})
+
+
+def load_artifact():
+    """Return the schema stored by `build_schema`, if there is one."""
+    try:
+        with open(settings.SCHEMA_ARTIFACT, 'rb') as artifact:
+            return json.load(artifact)
+    except FileNotFoundError:
+        return None
+
+
+def clear_schema_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+class CachedSchemaView(SpectacularAPIView):
+    """
+    Serve the schema rendered once per version, language and format,
+    with an ETag so clients can revalidate without a download.
+    """
+
+    def _build(self, version, renderer):
+        schema = load_artifact() if version is None else None
+        if schema is None:
+            schema = generate_schema(api_version=version)
+
+        body = renderer.render(schema, renderer_context={})
+        etag = quote_etag(hashlib.sha256(body).hexdigest())
+        return body, etag
+
+    def _get_schema_response(self, request):
+        version = (self.api_version or request.version or
+                   self._get_version_parameter(request))
+        renderer = request.accepted_renderer
+        key = (spectacular_settings.VERSION, version,
+               translation.get_language(), renderer.media_type)
+
+        entry = _cache.get(key)
+        if entry is None:
+            with _cache_lock:
+                entry = _cache.get(key)
+                if entry is None:
+                    entry = _cache[key] = self._build(version, renderer)
+        body, etag = entry
+
+        # Compared weakly, as CompressionMiddleware weakens the ETag.
+        if_none_match = [
+            tag[2:] if tag.startswith('W/') else tag
+            for tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        ]
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponse(status=304)
+        else:
+            content_type = renderer.media_type
+            if renderer.charset:
+                content_type += f'; charset={renderer.charset}'
+            response = HttpResponse(body, content_type=content_type)
+            response['Content-Disposition'] = (
+                f'inline; filename="{self._get_filename(request, version)}"'
+            )
+        response['ETag'] = etag
+        return response
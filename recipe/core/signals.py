@@ -0,0 +1,184 @@
+"""
+Signal handlers for the core models.
+"""
+from collections import Counter
+
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from core.models import (
+    User,
+    Recipe,
+    RecipeQuerySet,
+    RecipeStats,
+    Tag,
+    Ingredient,
+    price_bucket,
+    recipe_stats_delta,
+)
+from core.routers import shard_for_user
+
+
+@receiver(pre_delete, sender=User)
+def delete_shard_data(sender, instance, using, **kwargs):
+    """Delete recipe data the cascade cannot reach on another shard."""
+    shard = shard_for_user(instance)
+    if shard == using:
+        return
+
+    for model in (Recipe, Tag, Ingredient, RecipeStats):
+        model.objects.using(shard).filter(user_id=instance.pk).delete()
+
+
+def change_related_ids(recipe, relation, action, pk_set, using):
+    """
+    Apply an M2M change of a recipe to its id array, LSH keys and the
+    statistics of its user from the changed ids alone. Return False when
+    the arrays of the instance are not loaded, so cannot be changed.
+    """
+    attname = RecipeQuerySet.related_id_fields[relation]
+    if recipe.get_deferred_fields().intersection(
+        [*RecipeQuerySet.related_id_fields.values(), 'lsh_keys']
+    ):
+        return False
+
+    old = getattr(recipe, attname)
+    if action == 'post_add':
+        new = sorted(set(old).union(pk_set))
+    elif action == 'post_remove':
+        new = sorted(set(old).difference(pk_set))
+    else:
+        new = []
+    if new == old:
+        return True
+
+    setattr(recipe, attname, new)
+    recipe.lsh_keys = recipe.similarity_keys()
+    Recipe.objects.using(using).filter(pk=recipe.pk).update(**{
+        attname: new, 'lsh_keys': recipe.lsh_keys,
+    })
+    counts = Counter(map(str, new))
+    counts.subtract(map(str, old))
+    RecipeStats.objects.db_manager(using).apply(recipe.user_id, {
+        RecipeStats.count_fields[relation]: dict(counts),
+    })
+    return True
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def sync_related_ids(sender, instance, action, reverse, pk_set, using,
+                     **kwargs):
+    """Copy changed tags and ingredients into the recipe id arrays."""
+    relation = 'tags' if sender is Recipe.tags.through else 'ingredients'
+    recipes = Recipe.objects.using(using)
+
+    if not reverse:
+        if action not in ('post_add', 'post_remove', 'post_clear'):
+            return
+        if not change_related_ids(instance, relation, action, pk_set, using):
+            recipes.filter(pk=instance.pk).sync_related_ids([relation])
+    elif action == 'pre_clear':
+        instance._cleared_recipe_ids = list(
+            instance.recipe_set.values_list('pk', flat=True)
+        )
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if action == 'post_clear':
+            pk_set = instance.__dict__.pop('_cleared_recipe_ids', [])
+        recipes.filter(pk__in=list(pk_set)).sync_related_ids([relation])
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def collect_recipes_of_deleted(sender, instance, using, **kwargs):
+    """Remember the recipes of a tag or ingredient before its rows go."""
+    instance._deleted_recipe_ids = list(
+        instance.recipe_set.using(using).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def sync_recipes_of_deleted(sender, instance, using, **kwargs):
+    """Drop a deleted tag or ingredient from the recipe id arrays."""
+    recipe_ids = instance.__dict__.pop('_deleted_recipe_ids', [])
+    if recipe_ids:
+        relation = 'tags' if sender is Tag else 'ingredients'
+        Recipe.objects.using(using).filter(
+            pk__in=recipe_ids
+        ).sync_related_ids([relation])
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_totals(sender, instance, raw, using, update_fields,
+                           **kwargs):
+    """
+    Remember the time and price a saved recipe had before, as loaded from
+    the database or else read back.
+    """
+    if raw or instance._state.adding:
+        return
+    totals = {'time_minutes', 'price'}
+    if update_fields is not None and not totals.intersection(update_fields):
+        return
+    before = getattr(instance, '_stored_totals', None)
+    if before is None:
+        before = Recipe.objects.using(using).filter(
+            pk=instance.pk
+        ).values_list('time_minutes', 'price').first()
+    instance._stats_before = before
+
+
+@receiver(post_save, sender=Recipe)
+def count_saved_recipe(sender, instance, created, raw, using, **kwargs):
+    """Add a new or changed recipe to the statistics of its user."""
+    if raw:
+        return
+    stats = RecipeStats.objects.db_manager(using)
+    before = instance.__dict__.pop('_stats_before', None)
+    after = instance._stored_totals = instance.loaded_totals()
+    if created:
+        stats.apply(instance.user_id, recipe_stats_delta(instance))
+        return
+
+    if before is None:
+        return
+    if after is None:
+        after = Recipe.objects.using(using).filter(
+            pk=instance.pk
+        ).values_list('time_minutes', 'price').first()
+    if tuple(before) == tuple(after):
+        return
+    (time_before, price_before), (time_after, price_after) = before, after
+    histogram = Counter({price_bucket(price_after): 1})
+    histogram.subtract({price_bucket(price_before): 1})
+    stats.apply(instance.user_id, {
+        'time_minutes_total': time_after - time_before,
+        'price_total': price_after - price_before,
+        'price_histogram': dict(histogram),
+    })
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_recipe_delta(sender, instance, using, **kwargs):
+    """Take the stored contribution of a recipe before it is deleted."""
+    stored = Recipe.objects.using(using).only(
+        'user_id', 'time_minutes', 'price', 'tag_ids', 'ingredient_ids'
+    ).filter(pk=instance.pk).first()
+    if stored is not None:
+        instance._stats_delta = recipe_stats_delta(stored, -1)
+
+
+@receiver(post_delete, sender=Recipe)
+def uncount_deleted_recipe(sender, instance, using, **kwargs):
+    """Remove a deleted recipe from the statistics of its user."""
+    delta = instance.__dict__.pop('_stats_delta', None)
+    if delta is not None:
+        RecipeStats.objects.db_manager(using).apply(instance.user_id, delta,
+                                                    create=False)
@@ -0,0 +1,78 @@
+"""
+MinHash signatures and LSH band keys for finding similar recipes.
+
+A recipe is the set of its tag and ingredient ids. The MinHash signature
+keeps, for each of SIMILARITY_PERMUTATIONS hash functions, the smallest
+hash of the set; two sets agree on a signature row with a probability
+equal to their Jaccard similarity. The signature is cut into
+SIMILARITY_BANDS bands and each band hashed into a key, so recipes
+sharing a key are likely similar and only those need comparing.
+"""
+import functools
+import hashlib
+import heapq
+import random
+
+from django.conf import settings
+
+# Mersenne prime modulus of the universal hash functions.
+PRIME = (1 << 61) - 1
+
+
+@functools.lru_cache(maxsize=None)
+def hash_parameters(permutations):
+    """Return the fixed (a, b) of each hash function a * x + b mod PRIME."""
+    rng = random.Random(permutations)
+    return tuple((rng.randrange(1, PRIME), rng.randrange(PRIME))
+                 for _ in range(permutations))
+
+
+def tokens(tag_ids, ingredient_ids):
+    """Return the tags and ingredients of a recipe as one set of ints."""
+    return ({2 * pk for pk in tag_ids} |
+            {2 * pk + 1 for pk in ingredient_ids})
+
+
+def signature(values, permutations=None):
+    """Return the MinHash signature of a non empty set of ints."""
+    permutations = permutations or settings.SIMILARITY_PERMUTATIONS
+    return [min((a * value + b) % PRIME for value in values)
+            for a, b in hash_parameters(permutations)]
+
+
+def band_keys(values, permutations=None, bands=None):
+    """
+    Return one signed 64 bit key per band of the signature of a set, or
+    no keys for an empty set. Keys differ between bands, so any shared
+    key means equal rows in the same band.
+    """
+    if not values:
+        return []
+    permutations = permutations or settings.SIMILARITY_PERMUTATIONS
+    bands = bands or settings.SIMILARITY_BANDS
+    rows = permutations // bands
+    minhash = signature(values, permutations)
+    keys = []
+    for band in range(bands):
+        digest = hashlib.blake2b(
+            repr((band, minhash[band * rows:(band + 1) * rows])).encode(),
+            digest_size=8,
+        ).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def jaccard(first, second):
+    """Return the Jaccard similarity of two sets."""
+    union = len(first | second)
+    return len(first & second) / union if union else 0.0
+
+
+def most_similar(target, candidates, limit):
+    """
+    Return up to `limit` (id, similarity) of the `candidates`, pairs of an
+    id and a token set, sharing tokens with `target`, most similar first.
+    """
+    scored = ((-jaccard(target, values), pk) for pk, values in candidates)
+    return [(pk, -score) for score, pk in heapq.nsmallest(limit, scored)
+            if score < 0]
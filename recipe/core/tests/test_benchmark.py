@@ -0,0 +1,113 @@
+"""
+Tests for the API benchmark harness.
+"""
+import tempfile
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core import benchmark, microbenchmark
+from core.models import User, Recipe, Tag, Ingredient
+
+
+class BenchmarkHelperTests(SimpleTestCase):
+    """Test the statistics of the benchmark."""
+
+    def test_percentile_nearest_rank(self):
+        """Test percentiles pick the nearest ranked value."""
+        values = list(range(1, 101))
+
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 95), 95)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 99), 7)
+
+    def test_compare_reports_regressions(self):
+        """Test results beyond the threshold are reported."""
+        baseline = {
+            'recipe_list': {'p95': 10.0, 'throughput': 100.0, 'errors': 0},
+            'recipe_detail': {'p95': 10.0, 'throughput': 100.0, 'errors': 0},
+        }
+        results = {
+            'recipe_list': {'p95': 12.0, 'throughput': 90.0, 'errors': 0},
+            'recipe_detail': {'p95': 20.0, 'throughput': 50.0, 'errors': 1},
+            'token_login': {'p95': 99.0, 'throughput': 1.0, 'errors': 0},
+        }
+
+        regressions = benchmark.compare(results, baseline, 1.25)
+
+        self.assertEqual(len(regressions), 3)
+        self.assertTrue(all(r.startswith('recipe_detail')
+                            for r in regressions))
+
+
+@override_settings(DUPLICATE_QUERY_DETECTION=False, THROTTLE_ENABLED=False)
+class BenchmarkRunTests(TestCase):
+    """Test seeding and running scenarios."""
+
+    def test_seed_creates_dataset(self):
+        """Test seeding bulk inserts the requested counts."""
+        dataset = benchmark.seed(users=2, recipes=3, tags=4, ingredients=5)
+
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Recipe.objects.count(), 6)
+        self.assertEqual(Tag.objects.count(), 8)
+        self.assertEqual(Ingredient.objects.count(), 10)
+        for data in dataset.values():
+            self.assertEqual(len(data['recipes']), 3)
+            self.assertTrue(data['token'])
+
+    def test_run_scenarios(self):
+        """Test every scenario succeeds when run inline."""
+        dataset = benchmark.seed(users=2, recipes=3, tags=4, ingredients=5)
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            for name, scenario in benchmark.SCENARIOS.items():
+                result = benchmark.run_scenario(
+                    scenario, dataset, requests=4, concurrency=1
+                )
+                self.assertEqual(result['requests'], 4, name)
+                self.assertEqual(result['errors'], 0, name)
+                self.assertLessEqual(result['p50'], result['p99'])
+
+    def test_similarity_recall(self):
+        """Test similar recipes are measured against exact Jaccard."""
+        dataset = benchmark.seed(users=1, recipes=30, tags=4, ingredients=5)
+
+        result = benchmark.similarity_recall(dataset, limit=5, sample=10)
+
+        self.assertEqual(result['recipes'], 10)
+        self.assertGreater(result['recall'], 0.5)
+        self.assertLessEqual(result['recall'], 1)
+        self.assertLessEqual(result['lsh_p50'], result['lsh_p95'])
+
+
+class MicrobenchmarkTests(TestCase):
+    """Test the serializer microbenchmarks."""
+
+    def test_serializing_needs_no_queries(self):
+        """Test recipes built in memory serialize without the database."""
+        recipe = microbenchmark.make_recipe(3)
+
+        with self.assertNumQueries(0):
+            data = microbenchmark.RecipeDetailSerializer(recipe).data
+
+        self.assertEqual(len(data['tags']), 3)
+        self.assertEqual(len(data['ingredients']), 3)
+
+    def test_run_measures_every_case(self):
+        """Test every case is measured at every size."""
+        results = microbenchmark.run(sizes=(1, 2), repeat=1)
+
+        self.assertEqual(set(results), {
+            'RecipeSerializer', 'RecipeDetailSerializer', 'TagSerializer',
+            'UserSerializer', 'RecipeViewSet.get_queryset',
+            'JSONRenderer', 'JSONParser', 'ORJSONRenderer', 'ORJSONParser',
+            'MessagePackRenderer', 'MessagePackParser',
+        })
+        measurement = results['RecipeSerializer']['serialize']['2']
+        self.assertGreater(measurement['us'], 0)
+        self.assertGreater(measurement['peak_bytes'], 0)
+
+        changes = list(microbenchmark.compare(results, results))
+        self.assertEqual(len(changes), 32)
@@ -1,23 +1,119 @@
+from decimal import Decimal
+from io import StringIO
 from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2Error
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
 
+from core.models import Recipe, Tag
 
-@patch('core.management.commands.wait_for_db.Command.check')
+
+@patch('core.management.commands.wait_for_db.Command.probe')
 class CommandTests(SimpleTestCase):
     """Test Commands"""
-    def test_wait_for_db_ready(self, patched_check):
-        patched_check.return_value = True
-        call_command('wait_for_db')
-        patched_check.assert_called_once_with(databases=['default'])
+    def test_wait_for_db_ready(self, patched_probe):
+        patched_probe.return_value = None
+        out = StringIO()
+        call_command('wait_for_db', stdout=out)
+        patched_probe.assert_called_once_with('default')
+        self.assertIn('Database available', out.getvalue())
+        self.assertNotIn('unavailable', out.getvalue())
 
     @patch('time.sleep')
-    def test_wait_for_db_delay(self, patched_sleep, patched_check):
+    def test_wait_for_db_delay(self, patched_sleep, patched_probe):
         """Test waiting for database when getting OperationalError."""
-        patched_check.side_effect = [Psycopg2Error] * 2 + \
-            [OperationalError] * 3 + [True]
-        call_command('wait_for_db')
-        self.assertEqual(patched_check.call_count, 6)
-        patched_check.assert_called_with(databases=['default'])
+        patched_probe.side_effect = [Psycopg2Error] * 2 + \
+            [OperationalError] * 3 + [None]
+        out = StringIO()
+        call_command('wait_for_db', stdout=out)
+        self.assertEqual(patched_probe.call_count, 6)
+        patched_probe.assert_called_with('default')
+        self.assertEqual(
+            out.getvalue().count('Database default unavailable'), 5
+        )
+        self.assertIn('Database available', out.getvalue())
+
+    @patch('time.sleep')
+    def test_wait_for_db_backoff(self, patched_sleep, patched_probe):
+        """Test the pauses between attempts grow up to the maximum."""
+        patched_probe.side_effect = [OperationalError] * 8 + [None]
+        out = StringIO()
+        with patch('random.uniform', side_effect=lambda low, high: high):
+            call_command('wait_for_db', '--max-delay', '1', stdout=out)
+
+        delays = [c.args[0] for c in patched_sleep.call_args_list]
+        self.assertEqual(delays, [0.1, 0.2, 0.4, 0.8, 1, 1, 1, 1])
+        self.assertIn('waiting 0.80 seconds', out.getvalue())
+
+    @patch('time.sleep')
+    def test_wait_for_db_timeout(self, patched_sleep, patched_probe):
+        """Test the command gives up once the deadline has passed."""
+        patched_probe.side_effect = OperationalError
+        out = StringIO()
+        with patch('time.monotonic', side_effect=[0, 0.5, 2]):
+            with self.assertRaises(CommandError):
+                call_command('wait_for_db', '--timeout', '1', stdout=out)
+        self.assertNotIn('Database available', out.getvalue())
+
+    def test_wait_for_several_databases(self, patched_probe):
+        """Test every given alias is probed."""
+        out = StringIO()
+        call_command('wait_for_db', '--database', 'default',
+                     '--database', 'replica0', stdout=out)
+
+        probed = sorted(c.args[0] for c in patched_probe.call_args_list)
+        self.assertEqual(probed, ['default', 'replica0'])
+        self.assertIn('Database available', out.getvalue())
+
+
+class SyncRecipeIdsCommandTests(TestCase):
+    """Test checking and rebuilding the recipe id arrays."""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user('user@example.com',
+                                                    'password123')
+        self.recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=Decimal('1.00')
+        )
+        self.tag = Tag.objects.create(user=user, name='Vegan')
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe=self.recipe, tag=self.tag)
+        ])
+
+    def test_check_then_rebuild(self):
+        """Test the check fails on stale arrays until they are rebuilt."""
+        with self.assertRaises(CommandError):
+            call_command('sync_recipe_ids', '--check', stdout=StringIO())
+
+        call_command('sync_recipe_ids', stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.tag_ids, [self.tag.id])
+        call_command('sync_recipe_ids', '--check', stdout=StringIO())
+
+
+class RebuildSimilarityIndexCommandTests(TestCase):
+    """Test checking and rebuilding the LSH keys of recipes."""
+
+    def test_check_then_rebuild(self):
+        """Test the check fails on stale keys until they are rebuilt."""
+        user = get_user_model().objects.create_user('user@example.com',
+                                                    'password123')
+        recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=Decimal('1.00')
+        )
+        recipe.tags.add(Tag.objects.create(user=user, name='Vegan'))
+        keys = Recipe.objects.get(pk=recipe.pk).lsh_keys
+        Recipe.objects.filter(pk=recipe.pk).update(lsh_keys=[])
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_similarity_index', '--check',
+                         stdout=StringIO())
+
+        call_command('rebuild_similarity_index', stdout=StringIO())
+
+        self.assertEqual(Recipe.objects.get(pk=recipe.pk).lsh_keys, keys)
+        call_command('rebuild_similarity_index', '--check', stdout=StringIO())
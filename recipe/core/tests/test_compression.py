@@ -0,0 +1,177 @@
+"""
+Tests for response compression.
+"""
+import gzip
+import json
+from unittest.mock import patch
+
+import brotli
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import compression, schema
+from core.middleware import CompressionMiddleware
+from core.models import Ingredient
+
+SCHEMA_URL = reverse('api-schema')
+INGREDIENTS_URL = reverse('recipe_app:ingredient-list')
+BODY = json.dumps([{'id': i, 'name': 'Ingredient'} for i in range(200)])
+
+
+class AcceptEncodingTests(SimpleTestCase):
+    """Test negotiating the content encoding."""
+
+    def test_accepted_encoding(self):
+        """Test brotli is preferred and q-values are honoured."""
+        cases = {
+            '': None,
+            'identity': None,
+            'gzip, deflate': 'gzip',
+            'gzip, deflate, br': 'br',
+            'br;q=0.5, gzip': 'gzip',
+            'br;q=0, gzip;q=0': None,
+            '*': 'br',
+            '*, br;q=0': 'gzip',
+        }
+        for header, expected in cases.items():
+            self.assertEqual(compression.accepted_encoding(header), expected,
+                             header)
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    """Test compressing responses."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def run_middleware(self, response, accept='gzip, br'):
+        middleware = CompressionMiddleware(lambda request: response)
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING=accept)
+        return middleware, middleware(request)
+
+    def test_brotli_and_gzip(self):
+        """Test large JSON is compressed with the accepted encoding."""
+        _, res = self.run_middleware(
+            HttpResponse(BODY, content_type='application/json')
+        )
+        self.assertEqual(res['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(res.content).decode(), BODY)
+        self.assertEqual(res['Vary'], 'Accept-Encoding')
+
+        _, res = self.run_middleware(
+            HttpResponse(BODY, content_type='application/json'),
+            accept='gzip'
+        )
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.content).decode(), BODY)
+        self.assertEqual(res['Content-Length'], str(len(res.content)))
+
+    @override_settings(COMPRESSION_MIN_SIZE=1024)
+    def test_small_and_other_types_untouched(self):
+        """Test small bodies and types not allowed are not compressed."""
+        _, res = self.run_middleware(
+            HttpResponse('{"id": 1}', content_type='application/json')
+        )
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+        _, res = self.run_middleware(
+            HttpResponse(b'\xff' * 2048, content_type='image/jpeg')
+        )
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertFalse(res.has_header('Vary'))
+
+    def test_streaming(self):
+        """Test streaming responses are compressed chunk by chunk."""
+        chunks = [BODY[:100], BODY[100:]]
+        response = StreamingHttpResponse(iter(chunks),
+                                         content_type='text/plain')
+
+        _, res = self.run_middleware(response)
+
+        streamed = list(res.streaming_content)
+        self.assertGreater(len(streamed), 1)
+        self.assertEqual(brotli.decompress(b''.join(streamed)).decode(), BODY)
+
+    def test_etag_responses_compressed_once(self):
+        """Test the compressed bytes of an ETag are reused."""
+        def get_response(request):
+            response = HttpResponse(BODY, content_type='application/json')
+            response['ETag'] = '"abc"'
+            return response
+
+        middleware = CompressionMiddleware(get_response)
+        with patch('core.compression.compress',
+                   wraps=compression.compress) as patched_compress:
+            for _ in range(2):
+                res = middleware(self.factory.get(
+                    '/', HTTP_ACCEPT_ENCODING='br'
+                ))
+                self.assertEqual(brotli.decompress(res.content).decode(),
+                                 BODY)
+
+        self.assertEqual(patched_compress.call_count, 1)
+        self.assertEqual(res['ETag'], 'W/"abc"')
+
+
+@override_settings(SCHEMA_ARTIFACT='/nonexistent/openapi.json')
+class CompressedSchemaTests(SimpleTestCase):
+    """Test compressing the schema."""
+
+    def setUp(self):
+        self.client = APIClient()
+        schema.clear_schema_cache()
+
+    def test_schema_compressed_and_revalidated(self):
+        """Test the schema is compressed and its weak ETag revalidates."""
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='br')
+
+        self.assertEqual(res['Content-Encoding'], 'br')
+        self.assertIn(b'/api/recipe/recipes/', brotli.decompress(res.content))
+
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='br',
+                              HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, 304)
+
+
+class CompressedListTests(TestCase):
+    """Test compressing and revalidating list responses."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        for i in range(50):
+            Ingredient.objects.create(user=self.user, name=f'Ingredient {i}')
+
+    def test_list_compressed_once_and_revalidated(self):
+        """Test list responses get an ETag, reuse and revalidate it."""
+        with patch('core.compression.compress',
+                   wraps=compression.compress) as patched_compress:
+            for _ in range(2):
+                res = self.client.get(INGREDIENTS_URL,
+                                      HTTP_ACCEPT_ENCODING='br')
+                self.assertEqual(res['Content-Encoding'], 'br')
+
+        self.assertEqual(patched_compress.call_count, 1)
+        self.assertTrue(res['ETag'].startswith('W/"'))
+
+        res = self.client.get(INGREDIENTS_URL, HTTP_ACCEPT_ENCODING='br',
+                              HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, 304)
+
+        Ingredient.objects.create(user=self.user, name='Salt')
+        res = self.client.get(INGREDIENTS_URL, HTTP_ACCEPT_ENCODING='br',
+                              HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, 200)
@@ -0,0 +1,55 @@
+"""
+Tests for the liveness and readiness probes.
+"""
+from unittest.mock import patch
+
+from django.db.utils import OperationalError
+from django.test import TestCase, Client
+
+
+class HealthCheckTests(TestCase):
+    """Test the health check endpoints."""
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_liveness(self):
+        """Test liveness answers without touching the database."""
+        with self.assertNumQueries(0):
+            res = self.client.get('/healthz')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'status': 'ok'})
+
+    def test_readiness(self):
+        """Test readiness succeeds with a migrated database."""
+        res = self.client.get('/readyz')
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_readiness_does_not_touch_session(self):
+        """Test probes do not set session or CSRF cookies."""
+        res = self.client.get('/readyz')
+
+        self.assertFalse(res.cookies)
+        self.assertNotIn('Vary', res)
+
+    @patch('django.db.migrations.executor.MigrationExecutor.migration_plan')
+    def test_readiness_pending_migrations(self, patched_plan):
+        """Test readiness fails while migrations are pending."""
+        patched_plan.return_value = [('core', False)]
+
+        res = self.client.get('/readyz')
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['reason'], 'migrations')
+
+    @patch('core.middleware.connection.cursor')
+    def test_readiness_database_down(self, patched_cursor):
+        """Test readiness fails when the database is unreachable."""
+        patched_cursor.side_effect = OperationalError
+
+        res = self.client.get('/readyz')
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['reason'], 'database')
@@ -0,0 +1,88 @@
+"""
+Tests for per request timing instrumentation.
+"""
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe_app:recipe-list')
+
+
+class RequestTimingTests(TestCase):
+    """Test the request timing middleware."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=Decimal('5.00')
+        )
+
+    def get_logged(self, url, method='get', **params):
+        """Make a request and return its response and timing log entry."""
+        with self.assertLogs('core.instrumentation', 'INFO') as logs:
+            res = getattr(self.client, method)(url, **params)
+        return res, json.loads(logs.records[-1].getMessage())
+
+    def test_server_timing_header(self):
+        """Test the response reports its costs in Server-Timing."""
+        res, entry = self.get_logged(RECIPES_URL)
+
+        timing = res['Server-Timing']
+        for metric in ('db;', 'serializer;', 'view;', 'total;'):
+            self.assertIn(metric, timing)
+        self.assertIn(f'desc="{entry["queries"]} queries"', timing)
+        self.assertGreater(entry['queries'], 0)
+
+    def test_log_names_viewset_action(self):
+        """Test the log line names the viewset and action."""
+        res, entry = self.get_logged(RECIPES_URL)
+
+        self.assertEqual(entry['view'], 'RecipeViewSet.list')
+        self.assertEqual(entry['status'], 200)
+        self.assertGreater(entry['serializer_ms'], 0)
+        self.assertLessEqual(entry['view_ms'], entry['total_ms'])
+
+    def test_log_names_extra_action(self):
+        """Test custom actions are named after their method."""
+        recipe = Recipe.objects.get()
+        url = reverse('recipe_app:recipe-upload-image', args=[recipe.id])
+
+        res, entry = self.get_logged(url, method='post',
+                                     data={'image': 'notanimage'},
+                                     format='multipart')
+
+        self.assertEqual(entry['view'], 'RecipeViewSet.upload_image')
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request(self):
+        """Test requests outside the sample are not timed."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('Server-Timing', res)
+
+    def test_disabled_logger_skips_log_line(self):
+        """Test no log line is built while the logger is disabled."""
+        with patch('core.middleware.timing_logger') as logger, \
+                patch('core.middleware.RequestMetrics.as_dict') as as_dict:
+            logger.isEnabledFor.return_value = False
+            res = self.client.get(RECIPES_URL)
+
+        self.assertIn('Server-Timing', res)
+        as_dict.assert_not_called()
+        logger.info.assert_not_called()
@@ -0,0 +1,134 @@
+"""
+Tests for the database job queue.
+"""
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+RECORDED = []
+
+
+@jobs.job()
+def record(value):
+    RECORDED.append(value)
+
+
+@jobs.job(max_attempts=2)
+def fail():
+    raise ValueError('broken')
+
+
+class JobQueueTests(TestCase):
+    """Test claiming and running jobs."""
+
+    def setUp(self):
+        RECORDED.clear()
+
+    def test_enqueue_and_run(self):
+        """Test a job runs with its arguments and is removed."""
+        record.enqueue('soup')
+
+        claimed, = jobs.claim('worker', 10, 60)
+
+        self.assertEqual(claimed.status, Job.QUEUED)
+        self.assertEqual(Job.objects.get().status, Job.RUNNING)
+        self.assertTrue(jobs.run(claimed))
+        self.assertEqual(RECORDED, ['soup'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_priority_and_delay(self):
+        """Test higher priorities are claimed first and delays wait."""
+        record.enqueue('low')
+        record.enqueue('high', priority=5)
+        record.enqueue('later', priority=9, delay=60)
+
+        claimed = jobs.claim('worker', 1, 60)
+        self.assertEqual([j.args for j in claimed], [['high']])
+        claimed = jobs.claim('worker', 10, 60)
+        self.assertEqual([j.args for j in claimed], [['low']])
+        self.assertEqual(jobs.claim('worker', 10, 60), [])
+
+    def test_retry_with_backoff_then_fail(self):
+        """Test failing jobs wait before retrying until out of attempts."""
+        fail.enqueue()
+
+        claimed, = jobs.claim('worker', 10, 60)
+        with self.assertLogs('core.jobs', 'WARNING'):
+            self.assertFalse(jobs.run(claimed))
+        queued = Job.objects.get()
+        self.assertEqual(queued.status, Job.QUEUED)
+        self.assertGreater(queued.run_at, timezone.now())
+        self.assertIn('broken', queued.last_error)
+        self.assertEqual(jobs.claim('worker', 10, 60), [])
+
+        Job.objects.update(run_at=timezone.now())
+        claimed, = jobs.claim('worker', 10, 60)
+        with self.assertLogs('core.jobs', 'WARNING'):
+            self.assertFalse(jobs.run(claimed))
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+    def test_visibility_timeout(self):
+        """Test a job held too long is claimed again by another worker."""
+        record.enqueue('soup')
+        lost, = jobs.claim('lost', 10, 60)
+        self.assertEqual(jobs.claim('other', 10, 60), [])
+
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        claimed, = jobs.claim('other', 10, 60)
+        self.assertEqual(claimed.attempts, 2)
+
+        jobs.run(lost)
+        self.assertEqual(Job.objects.get().locked_by, 'other')
+
+    def test_unregistered_function_refused(self):
+        """Test only functions registered as jobs are run."""
+        Job.objects.create(name='os.getcwd', max_attempts=1)
+
+        claimed, = jobs.claim('worker', 10, 60)
+
+        with self.assertLogs('core.jobs', 'WARNING'):
+            self.assertFalse(jobs.run(claimed))
+        self.assertIn('not a registered job', Job.objects.get().last_error)
+
+    def test_admin_lists_queue_depth(self):
+        """Test the admin titles the job list with counts by status."""
+        record.enqueue('soup')
+        admin = get_user_model().objects.create_superuser(
+            'admin@example.com', 'testpass123'
+        )
+        self.client.force_login(admin)
+
+        res = self.client.get(reverse('admin:core_job_changelist'))
+
+        self.assertContains(res, 'Jobs: 1 queued, 0 running, 0 failed')
+
+
+class WorkerTests(TransactionTestCase):
+    """
+    Test running jobs from a worker thread. SQLite test databases lock
+    tables written from several threads, so one job runs at a time.
+    """
+
+    def setUp(self):
+        RECORDED.clear()
+
+    def test_burst(self):
+        """Test a burst worker runs every due job and exits."""
+        for i in range(5):
+            record.enqueue(i)
+        out = StringIO()
+
+        call_command('run_worker', '--burst', '--concurrency', '1',
+                     '--poll-interval', '0.01', stdout=out)
+
+        self.assertEqual(sorted(RECORDED), list(range(5)))
+        self.assertIn('5 jobs run, 0 failed', out.getvalue())
+        self.assertFalse(Job.objects.exists())
@@ -0,0 +1,150 @@
+"""
+Tests for the Prometheus metrics.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.urls import reverse
+
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+
+from core import throttling
+from core.metrics import mark_process_dead, render_metrics
+
+RECIPES_URL = reverse('recipe_app:recipe-list')
+TOKEN_URL = reverse('user:token')
+
+
+def sample(name, **labels):
+    """Return the current value of a sample, 0 when never observed."""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTests(TestCase):
+    """Test recording request metrics."""
+
+    def setUp(self):
+        throttling.bucket_store().clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    def test_latency_labelled_by_route(self):
+        """Test requests are counted per route, method and status."""
+        labels = {'route': 'recipe_app:recipe-list', 'method': 'GET',
+                  'status': '200'}
+        before = sample('http_request_duration_seconds_count', **labels)
+        self.client.force_authenticate(self.user)
+
+        self.client.get(RECIPES_URL)
+
+        self.assertEqual(
+            sample('http_request_duration_seconds_count', **labels),
+            before + 1
+        )
+        self.assertGreater(sample('http_request_db_queries_sum', **labels), 0)
+
+    def test_sizes_recorded(self):
+        """Test request and response sizes are observed."""
+        labels = {'route': 'user:token', 'method': 'POST', 'status': '400'}
+        before = sample('http_request_size_bytes_sum', **labels)
+
+        self.client.post(TOKEN_URL, {'email': 'x@example.com',
+                                     'password': 'wrong'})
+
+        self.assertGreater(sample('http_request_size_bytes_sum', **labels),
+                           before)
+        self.assertGreater(sample('http_response_size_bytes_sum', **labels),
+                           0)
+
+    def test_in_flight_returns_to_zero(self):
+        """Test the in flight gauge drops once requests finish."""
+        self.client.get(RECIPES_URL)
+
+        self.assertEqual(sample('http_requests_in_flight'), 0)
+
+    def test_metrics_endpoint(self):
+        """Test metrics are exposed in the Prometheus text format."""
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(reverse('metrics'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'http_request_duration_seconds_bucket', res.content)
+        self.assertIn(b'route="recipe_app:recipe-list"', res.content)
+
+    def test_metrics_restricted(self):
+        """Test other addresses need the bearer token."""
+        url = reverse('metrics')
+
+        res = self.client.get(url, REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(res.status_code, 403)
+
+        with override_settings(METRICS_TOKEN='secret'):
+            res = self.client.get(url, REMOTE_ADDR='203.0.113.9',
+                                  HTTP_AUTHORIZATION='Bearer wrong')
+            self.assertEqual(res.status_code, 403)
+            res = self.client.get(url, REMOTE_ADDR='203.0.113.9',
+                                  HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(res.status_code, 200)
+
+        with override_settings(METRICS_ALLOWED_NETWORKS=['203.0.113.0/24']):
+            res = self.client.get(url, REMOTE_ADDR='203.0.113.9')
+            self.assertEqual(res.status_code, 200)
+
+
+WORKER = '''
+from core.metrics import REQUEST_LATENCY
+REQUEST_LATENCY.labels('recipe_app:recipe-list', 'GET', '200').observe(0.1)
+'''
+
+
+class MultiProcessMetricsTests(SimpleTestCase):
+    """Test aggregating metrics written by several workers."""
+
+    def test_counts_summed_across_processes(self):
+        """Test observations of every worker process are reported."""
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': directory}
+            for _ in range(3):
+                subprocess.run([sys.executable, '-c', WORKER], env=env,
+                               cwd=settings.BASE_DIR, check=True)
+
+            output = render_metrics(directory).decode()
+
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",'
+            'route="recipe_app:recipe-list",status="200"} 3.0',
+            output
+        )
+
+    def test_dead_process_gauges_dropped(self):
+        """Test live gauges of exited workers are no longer summed."""
+        worker = (
+            'import os\n'
+            'from core.metrics import IN_FLIGHT\n'
+            'IN_FLIGHT.inc()\n'
+            'print(os.getpid())\n'
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': directory}
+            pid = subprocess.run(
+                [sys.executable, '-c', worker], env=env,
+                cwd=settings.BASE_DIR, check=True, capture_output=True,
+                text=True
+            ).stdout.strip()
+            self.assertIn('http_requests_in_flight 1.0',
+                          render_metrics(directory).decode())
+
+            mark_process_dead(int(pid), directory)
+
+            self.assertNotIn('http_requests_in_flight 1.0',
+                             render_metrics(directory).decode())
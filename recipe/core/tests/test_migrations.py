@@ -0,0 +1,145 @@
+"""
+Tests for data migrations.
+"""
+from importlib import import_module
+from unittest.mock import patch
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase, override_settings
+
+from core import similarity
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Run migrations back and forth around a test."""
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+
+class MergeDuplicateNamesTests(MigrationTestCase):
+    """Test merging tags and ingredients differing only in case."""
+    migrate_from = [('core', '0007_requestprofile')]
+    migrate_to = [('core', '0008_unique_user_names')]
+
+    def test_duplicates_merged(self):
+        """Test recipes of duplicates move to the oldest object."""
+        apps = self.migrate(self.migrate_from)
+        User = apps.get_model('core', 'User')
+        Recipe = apps.get_model('core', 'Recipe')
+        Tag = apps.get_model('core', 'Tag')
+        user = User.objects.create(email='user@example.com')
+        other = User.objects.create(email='other@example.com')
+        salt = Tag.objects.create(user=user, name='Salt')
+        lower = Tag.objects.create(user=user, name='salt')
+        upper = Tag.objects.create(user=user, name='SALT')
+        other_salt = Tag.objects.create(user=other, name='salt')
+        first = Recipe.objects.create(user=user, title='First',
+                                      time_minutes=1, price=1)
+        second = Recipe.objects.create(user=user, title='Second',
+                                       time_minutes=1, price=1)
+        first.tags.add(salt, lower)
+        second.tags.add(upper)
+
+        apps = self.migrate(self.migrate_to)
+        Recipe = apps.get_model('core', 'Recipe')
+        Tag = apps.get_model('core', 'Tag')
+
+        self.assertEqual(
+            sorted(Tag.objects.values_list('id', flat=True)),
+            [salt.id, other_salt.id]
+        )
+        for recipe in (first, second):
+            self.assertEqual(
+                list(Recipe.objects.get(pk=recipe.pk).tags.values_list(
+                    'id', flat=True)),
+                [salt.id]
+            )
+
+
+class FillRelatedIdsTests(MigrationTestCase):
+    """Test copying the M2M rows into the recipe id arrays."""
+    migrate_from = [('core', '0009_recipe_ordering_indexes')]
+    migrate_to = [('core', '0010_recipe_related_ids')]
+
+    def create_recipes(self, apps):
+        """Create recipes with tags and ingredients in the old schema."""
+        User = apps.get_model('core', 'User')
+        Recipe = apps.get_model('core', 'Recipe')
+        Tag = apps.get_model('core', 'Tag')
+        Ingredient = apps.get_model('core', 'Ingredient')
+        user = User.objects.create(email='user@example.com')
+        tags = [Tag.objects.create(user=user, name=f'Tag {i}')
+                for i in range(3)]
+        ingredients = [Ingredient.objects.create(user=user, name=f'Ing {i}')
+                       for i in range(3)]
+        recipes = []
+        for i in range(5):
+            recipe = Recipe.objects.create(user=user, title=f'Recipe {i}',
+                                           time_minutes=1, price=1)
+            recipe.tags.add(*tags[:i])
+            recipe.ingredients.add(*ingredients[i % 3:])
+            recipes.append(recipe)
+        return recipes
+
+    def test_related_ids_filled_in_batches(self):
+        """Test every recipe gets its ids across several batches."""
+        recipes = self.create_recipes(self.migrate(self.migrate_from))
+
+        module = import_module('core.migrations.0010_recipe_related_ids')
+        with patch.object(module, 'BATCH_SIZE', 2):
+            apps = self.migrate(self.migrate_to)
+        Recipe = apps.get_model('core', 'Recipe')
+
+        for recipe in recipes:
+            migrated = Recipe.objects.get(pk=recipe.pk)
+            self.assertEqual(
+                migrated.tag_ids,
+                sorted(recipe.tags.values_list('id', flat=True))
+            )
+            self.assertEqual(
+                migrated.ingredient_ids,
+                sorted(recipe.ingredients.values_list('id', flat=True))
+            )
+
+
+class FillLshKeysTests(MigrationTestCase):
+    """Test computing the LSH keys of existing recipes."""
+    migrate_from = [('core', '0013_job')]
+    migrate_to = [('core', '0014_recipe_lsh_keys')]
+
+    @override_settings(SIMILARITY_PERMUTATIONS=16, SIMILARITY_BANDS=4)
+    def test_lsh_keys_frozen(self):
+        """Test keys use the parameters of the migration, not settings."""
+        apps = self.migrate(self.migrate_from)
+        User = apps.get_model('core', 'User')
+        Recipe = apps.get_model('core', 'Recipe')
+        user = User.objects.create(email='user@example.com')
+        ids = [([1, 2], [3]), ([], [5, 8]), ([], [])]
+        recipes = [
+            Recipe.objects.create(user=user, title='Recipe', time_minutes=1,
+                                  price=1, tag_ids=tag_ids,
+                                  ingredient_ids=ingredient_ids)
+            for tag_ids, ingredient_ids in ids
+        ]
+
+        module = import_module('core.migrations.0014_recipe_lsh_keys')
+        with patch.object(module, 'BATCH_SIZE', 2):
+            apps = self.migrate(self.migrate_to)
+        Recipe = apps.get_model('core', 'Recipe')
+
+        for recipe, (tag_ids, ingredient_ids) in zip(recipes, ids):
+            self.assertEqual(
+                Recipe.objects.get(pk=recipe.pk).lsh_keys,
+                similarity.band_keys(
+                    similarity.tokens(tag_ids, ingredient_ids),
+                    permutations=64, bands=32
+                )
+            )
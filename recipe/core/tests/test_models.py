@@ -1,7 +1,9 @@
 """
 Tests for Models.
 """
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from decimal import Decimal
 from core import models
@@ -90,6 +92,124 @@ class ModelTest(TestCase):
 
         self.assertEqual(str(ingredient), ingredient.name)
 
+    def test_names_unique_per_user_ignoring_case(self):
+        """Test a user cannot have two tags differing only in case."""
+        user = create_user()
+        other = create_user(email='other@example.com')
+        models.Tag.objects.create(user=user, name='Salt')
+        models.Tag.objects.create(user=other, name='salt')
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            models.Tag.objects.create(user=user, name='salt')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            models.Ingredient.objects.bulk_create([
+                models.Ingredient(user=user, name='Salt'),
+                models.Ingredient(user=user, name='SALT'),
+            ])
+
+    def test_upsert_reuses_names_ignoring_case(self):
+        """Test upsert creates missing names and reuses existing ones."""
+        user = create_user()
+        salt = models.Ingredient.objects.create(user=user, name='Salt')
+
+        ingredients = models.Ingredient.objects.upsert(
+            user, ['salt', 'Pepper', 'pepper']
+        )
+
+        self.assertEqual(len(ingredients), 2)
+        self.assertIn(salt, ingredients)
+        self.assertEqual(
+            sorted(models.Ingredient.objects.values_list('name', flat=True)),
+            ['Pepper', 'Salt']
+        )
+
+    def test_related_ids_follow_m2m_changes(self):
+        """Test recipe id arrays follow changes from either side."""
+        user = create_user()
+        recipe = models.Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=Decimal('1.00')
+        )
+        vegan = models.Tag.objects.create(user=user, name='Vegan')
+        quick = models.Tag.objects.create(user=user, name='Quick')
+        salt = models.Ingredient.objects.create(user=user, name='Salt')
+
+        recipe.tags.add(quick, vegan)
+        salt.recipe_set.add(recipe)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.tag_ids, sorted([quick.id, vegan.id]))
+        self.assertEqual(recipe.ingredient_ids, [salt.id])
+
+        recipe.tags.remove(quick)
+        salt.recipe_set.clear()
+        vegan.delete()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.tag_ids, [])
+        self.assertEqual(recipe.ingredient_ids, [])
+
+    def test_related_ids_from_changed_ids(self):
+        """Test adding to a loaded recipe does not read back its rows."""
+        user = create_user()
+        recipe = models.Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=Decimal('1.00')
+        )
+        vegan = models.Tag.objects.create(user=user, name='Vegan')
+
+        with CaptureQueriesContext(connection) as queries:
+            recipe.tags.add(vegan)
+
+        self.assertEqual(recipe.tag_ids, [vegan.id])
+        self.assertFalse([q for q in queries.captured_queries
+                          if 'FROM "core_recipe"' in q['sql']])
+        self.assertEqual(
+            models.Recipe.objects.get(pk=recipe.pk).tag_ids, [vegan.id]
+        )
+
+        deferred = models.Recipe.objects.defer('tag_ids').get(pk=recipe.pk)
+        deferred.tags.remove(vegan)
+        self.assertEqual(
+            models.Recipe.objects.get(pk=recipe.pk).tag_ids, []
+        )
+
+    def test_lsh_keys_follow_m2m_changes(self):
+        """Test the LSH keys are recomputed with the id arrays."""
+        user = create_user()
+        recipe = models.Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=Decimal('1.00')
+        )
+        self.assertEqual(recipe.lsh_keys, [])
+
+        recipe.ingredients.add(
+            models.Ingredient.objects.create(user=user, name='Salt')
+        )
+        self.assertEqual(len(recipe.lsh_keys), 32)
+        salted = recipe.lsh_keys
+
+        recipe.tags.add(models.Tag.objects.create(user=user, name='Vegan'))
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.lsh_keys, recipe.similarity_keys())
+        self.assertNotEqual(recipe.lsh_keys, salted)
+
+        recipe.tags.clear()
+        recipe.ingredients.clear()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.lsh_keys, [])
+
+    def test_save_keeps_related_ids(self):
+        """Test saving a stale recipe does not overwrite its id arrays."""
+        user = create_user()
+        recipe = models.Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=Decimal('1.00')
+        )
+        stale = models.Recipe.objects.get(pk=recipe.pk)
+        recipe.tags.add(models.Tag.objects.create(user=user, name='Vegan'))
+
+        stale.title = 'Stew'
+        stale.save()
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Stew')
+        self.assertEqual(len(recipe.tag_ids), 1)
+
     @patch('core.models.uuid.uuid4')
     def test_recipe_file_name_uuid(self, mock_uuid):
         """Test generating image path."""
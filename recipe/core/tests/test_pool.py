@@ -0,0 +1,134 @@
+"""
+Tests for the database connection pool.
+"""
+import threading
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from core.pool import ConnectionPool, PoolTimeout, PoolExhausted
+
+
+class FakeConnection:
+    """Stand in for a DB-API connection."""
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def create_pool(**params):
+    """Create and return a pool of fake connections."""
+    defaults = {'connect': FakeConnection, 'max_size': 2, 'timeout': 0.05}
+    defaults.update(params)
+    return ConnectionPool(**defaults)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """Test the connection pool."""
+
+    def test_connection_reused(self):
+        """Test a returned connection is handed out again."""
+        pool = create_pool()
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        self.assertIs(pool.getconn(), conn)
+
+    def test_stats_gauges(self):
+        """Test in use and idle gauges follow checkouts."""
+        pool = create_pool()
+        conn = pool.getconn()
+        other = pool.getconn()
+        pool.putconn(other)
+
+        stats = pool.stats()
+        self.assertEqual(stats['in_use'], 1)
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+        pool.putconn(conn)
+
+    def test_checkout_timeout(self):
+        """Test checkout fails when the pool stays full."""
+        pool = create_pool(max_size=1)
+        pool.getconn()
+
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertEqual(pool.stats()['checkout_failures'], 1)
+
+    def test_wait_queue_limit(self):
+        """Test checkout fails fast when the wait queue is full."""
+        pool = create_pool(max_size=1, timeout=1, max_waiting=1)
+        conn = pool.getconn()
+        thread = threading.Thread(target=pool.getconn)
+        thread.start()
+        while pool.stats()['waiting'] == 0:
+            pass
+
+        with self.assertRaises(PoolExhausted):
+            pool.getconn()
+        pool.putconn(conn)
+        thread.join()
+
+    def test_waiter_gets_returned_connection(self):
+        """Test a waiting caller receives a connection when one is freed."""
+        pool = create_pool(max_size=1, timeout=1)
+        conn = pool.getconn()
+        timer = threading.Timer(0.01, pool.putconn, args=[conn])
+        timer.start()
+
+        self.assertIs(pool.getconn(), conn)
+        timer.join()
+
+    def test_unhealthy_connection_replaced(self):
+        """Test a connection failing the check is closed and replaced."""
+        def check(conn):
+            if conn is bad:
+                raise Exception('gone')
+
+        pool = create_pool(check=check)
+        bad = pool.getconn()
+        pool.putconn(bad)
+
+        conn = pool.getconn()
+        self.assertIsNot(conn, bad)
+        self.assertTrue(bad.closed)
+
+    @patch('core.pool.time.monotonic')
+    def test_idle_connection_expires(self, patched_monotonic):
+        """Test connections idle past the timeout are closed."""
+        patched_monotonic.return_value = 100
+        pool = create_pool(idle_timeout=10)
+        old = pool.getconn()
+        pool.putconn(old)
+
+        patched_monotonic.return_value = 200
+        conn = pool.getconn()
+
+        self.assertIsNot(conn, old)
+        self.assertTrue(old.closed)
+
+    def test_closed_connection_discarded(self):
+        """Test a connection closed by the caller is not pooled."""
+        pool = create_pool()
+        conn = pool.getconn()
+        conn.close()
+        pool.putconn(conn)
+
+        self.assertEqual(pool.stats()['idle'], 0)
+        self.assertEqual(pool.stats()['in_use'], 0)
+
+    def test_failed_reset_discards_connection(self):
+        """Test a connection that cannot be reset is closed."""
+        def reset(conn):
+            raise Exception('broken')
+
+        pool = create_pool(reset=reset)
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['idle'], 0)
@@ -0,0 +1,151 @@
+"""
+Tests for on demand request profiling.
+"""
+import os
+import pstats
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import RequestProfile
+from core.profiling import create_profile_token
+
+RECIPES_URL = reverse('recipe_app:recipe-list')
+
+
+class ProfilingTests(TestCase):
+    """Test profiling requests."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            PROFILING_DIR=self.directory.name,
+            PROFILING_INTERVAL=0.0001
+        )
+        self.settings_override.enable()
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='testpass123'
+        )
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.directory.cleanup()
+
+    def test_unprofiled_by_default(self):
+        """Test requests without a token are not profiled."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('X-Profile-Id', res)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_staff_token_profiles_request(self):
+        """Test a staff token captures pstats and collapsed stacks."""
+        token = create_profile_token(self.staff)
+
+        res = self.client.get(RECIPES_URL, HTTP_X_PROFILE=token)
+
+        profile = RequestProfile.objects.get(id=res['X-Profile-Id'])
+        self.assertEqual(profile.view, 'RecipeViewSet.list')
+        self.assertEqual(profile.user, self.staff)
+        stats = pstats.Stats(profile.pstats_file)
+        self.assertTrue(stats.total_calls)
+        with open(profile.collapsed_file) as collapsed:
+            for line in collapsed:
+                stack, count = line.rsplit(' ', 1)
+                self.assertTrue(int(count))
+
+    def test_non_staff_token_ignored(self):
+        """Test tokens of regular users do not enable profiling."""
+        token = create_profile_token(self.user)
+
+        res = self.client.get(RECIPES_URL, HTTP_X_PROFILE=token)
+
+        self.assertNotIn('X-Profile-Id', res)
+
+    def test_forged_token_ignored(self):
+        """Test tokens with a bad signature do not enable profiling."""
+        token = create_profile_token(self.staff)[:-2] + 'xx'
+
+        res = self.client.get(RECIPES_URL, HTTP_X_PROFILE=token)
+
+        self.assertNotIn('X-Profile-Id', res)
+
+    def test_sampled_request_profiled(self):
+        """Test sampling profiles requests of staff without a token."""
+        token = Token.objects.create(user=self.staff)
+        self.client.force_authenticate(None)
+
+        with self.settings(PROFILING_SAMPLE_RATE=1):
+            res = self.client.get(RECIPES_URL,
+                                  HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        profile = RequestProfile.objects.get(id=res['X-Profile-Id'])
+        self.assertTrue(os.path.exists(profile.collapsed_file))
+        self.assertEqual(profile.user, self.staff)
+
+    def test_sampling_skips_other_users(self):
+        """Test sampling leaves requests of non staff users alone."""
+        token = Token.objects.create(user=self.user)
+        self.client.force_authenticate(None)
+
+        with self.settings(PROFILING_SAMPLE_RATE=1):
+            res = self.client.get(RECIPES_URL,
+                                  HTTP_AUTHORIZATION=f'Token {token.key}')
+            anonymous = self.client.get(RECIPES_URL,
+                                        HTTP_AUTHORIZATION='')
+
+        self.assertNotIn('X-Profile-Id', res)
+        self.assertNotIn('X-Profile-Id', anonymous)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_sampling_all_users(self):
+        """Test sampling every user only when enabled explicitly."""
+        with self.settings(PROFILING_SAMPLE_RATE=1,
+                           PROFILING_SAMPLE_ALL_USERS=True):
+            res = self.client.get(RECIPES_URL)
+
+        profile = RequestProfile.objects.get(id=res['X-Profile-Id'])
+        self.assertIsNone(profile.user)
+
+    def test_long_path_truncated(self):
+        """Test paths longer than the column are stored truncated."""
+        path = RECIPES_URL + 'x' * 3000
+
+        res = self.client.get(path,
+                              HTTP_X_PROFILE=create_profile_token(self.staff))
+
+        profile = RequestProfile.objects.get(id=res['X-Profile-Id'])
+        self.assertEqual(profile.path, path[:2048])
+
+    def test_profile_token_command(self):
+        """Test the command prints a usable token for staff only."""
+        out = StringIO()
+        call_command('profile_token', self.staff.email, stdout=out)
+
+        res = self.client.get(RECIPES_URL,
+                              HTTP_X_PROFILE=out.getvalue().strip())
+        self.assertIn('X-Profile-Id', res)
+
+    def test_admin_lists_profiles(self):
+        """Test captured profiles are listed in the admin."""
+        self.client.get(RECIPES_URL,
+                        HTTP_X_PROFILE=create_profile_token(self.staff))
+        self.client.force_login(self.staff)
+
+        res = self.client.get(reverse('admin:core_requestprofile_changelist'))
+
+        self.assertContains(res, 'RecipeViewSet.list')
@@ -0,0 +1,162 @@
+"""
+Tests for purging users with their recipe data.
+"""
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import MagicMock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db.models.signals import post_delete
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import jobs, purge
+from core.models import (
+    Ingredient,
+    Job,
+    Recipe,
+    RecipeStats,
+    Tag,
+    UserPurge,
+)
+
+ME_URL = reverse('user:me')
+
+
+def create_user(email='user@example.com'):
+    return get_user_model().objects.create_user(email=email,
+                                                password='testpass123')
+
+
+def create_recipes(user, count):
+    tag = Tag.objects.create(user=user, name='Vegan')
+    salt = Ingredient.objects.create(user=user, name='Salt')
+    for i in range(count):
+        recipe = Recipe.objects.create(user=user, title=f'Soup {i}',
+                                       time_minutes=5, price=Decimal('1'))
+        recipe.tags.add(tag)
+        recipe.ingredients.add(salt)
+    return recipe
+
+
+@override_settings(PURGE_BACKGROUND=False, PURGE_BATCH_SIZE=2,
+                   MEDIA_ROOT=tempfile.mkdtemp(),
+                   DUPLICATE_QUERY_DETECTION=False)
+class PurgeTests(TestCase):
+    """Test deleting users and their data in batches."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.other = create_user('other@example.com')
+        last = create_recipes(self.user, 5)
+        last.image.save('soup.jpg', ContentFile(b'jpeg'))
+        self.image = last.image.name
+        create_recipes(self.other, 1)
+
+    def test_purge_deletes_user_data(self):
+        """Test the data of the user goes in batches without signals."""
+        receiver = MagicMock()
+        post_delete.connect(receiver, sender=Recipe)
+        try:
+            progress = []
+            record = purge.start_purge(self.user, progress=progress.append)
+        finally:
+            post_delete.disconnect(receiver, sender=Recipe)
+
+        record.refresh_from_db()
+        self.assertEqual(record.status, UserPurge.DONE)
+        self.assertEqual(record.recipes_deleted, 5)
+        self.assertEqual(record.tags_deleted, 1)
+        self.assertEqual(record.ingredients_deleted, 1)
+        self.assertEqual(record.images_deleted, 1)
+        self.assertEqual(len(progress), 5)
+        receiver.assert_not_called()
+
+        self.assertFalse(get_user_model().objects.filter(
+            pk=self.user.pk).exists())
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+        self.assertFalse(RecipeStats.objects.filter(user=self.user).exists())
+        self.assertFalse(Recipe._meta.get_field('image').storage.exists(
+            self.image))
+        self.assertEqual(Recipe.tags.through.objects.count(), 1)
+        self.assertEqual(Recipe.objects.filter(user=self.other).count(), 1)
+
+    def test_delete_me(self):
+        """Test deleting the own account through the API."""
+        client = APIClient()
+        token = Token.objects.create(user=self.user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        res = client.delete(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['status'], UserPurge.DONE)
+        self.assertEqual(res.data['recipes_deleted'], 5)
+        self.assertFalse(get_user_model().objects.filter(
+            pk=self.user.pk).exists())
+
+    def test_admin_action(self):
+        """Test purging the selected users from the admin."""
+        admin = get_user_model().objects.create_superuser(
+            'admin@example.com', 'testpass123'
+        )
+        self.client.force_login(admin)
+
+        res = self.client.post(reverse('admin:core_user_changelist'), {
+            'action': 'purge_users',
+            '_selected_action': [self.user.pk, admin.pk],
+        })
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(
+            list(get_user_model().objects.order_by('pk').values_list(
+                'email', flat=True)),
+            ['other@example.com', 'admin@example.com']
+        )
+
+    def test_command(self):
+        """Test the command reports the progress of each batch."""
+        out = StringIO()
+
+        call_command('purge_users', '--user', str(self.user.pk), stdout=out)
+
+        self.assertIn('5 recipes, 1 tags, 1 ingredients, 1 images',
+                      out.getvalue())
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_command_batch_size(self):
+        """Test the batch size option sets the rows deleted per batch."""
+        out = StringIO()
+
+        call_command('purge_users', '--user', str(self.user.pk),
+                     '--batch-size', '3', stdout=out)
+
+        self.assertIn('3 recipes, 0 tags', out.getvalue())
+        self.assertIn('5 recipes, 1 tags', out.getvalue())
+
+    @override_settings(PURGE_BACKGROUND=True)
+    def test_background(self):
+        """Test the user is locked out at once and purged by a job."""
+        Token.objects.create(user=self.user)
+
+        record = purge.start_purge(self.user, batch_size=3)
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        self.assertEqual(record.status, UserPurge.PENDING)
+
+        claimed, = jobs.claim('worker', 10, 60)
+        self.assertEqual(claimed.name, 'core.purge.purge_job')
+        self.assertEqual(claimed.kwargs, {'batch_size': 3})
+        self.assertTrue(jobs.run(claimed))
+        record.refresh_from_db()
+        self.assertEqual(record.status, UserPurge.DONE)
+        self.assertFalse(Job.objects.exists())
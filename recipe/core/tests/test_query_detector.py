@@ -0,0 +1,116 @@
+"""
+Tests for the duplicate query detector.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.instrumentation import (
+    DuplicateQueryError,
+    detect_duplicate_queries,
+    fingerprint,
+)
+from core.models import Recipe, Tag
+from recipe_app.views import RecipeViewSet
+
+RECIPES_URL = reverse('recipe_app:recipe-list')
+
+
+class FingerprintTests(TestCase):
+    """Test reducing queries to their structure."""
+
+    def test_in_lists_collapsed(self):
+        """Test IN lists of any length share a fingerprint."""
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s)'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s, %s)')
+        )
+
+    def test_literals_ignored(self):
+        """Test inline literals do not make queries distinct."""
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = 1 AND b = 'x'"),
+            fingerprint("SELECT * FROM t WHERE a = 22 AND b = 'y'")
+        )
+
+
+@override_settings(DUPLICATE_QUERY_DETECTION=True,
+                   DUPLICATE_QUERY_THRESHOLD=3)
+class DuplicateQueryTests(TestCase):
+    """Test detecting repeated queries."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    def test_repeated_queries_raise(self):
+        """Test a query repeated in a loop is reported with its caller."""
+        tags = [Tag.objects.create(user=self.user, name=f'Tag{i}')
+                for i in range(3)]
+
+        with self.assertRaises(DuplicateQueryError) as error:
+            with detect_duplicate_queries():
+                for tag in tags:
+                    Tag.objects.get(id=tag.id)
+
+        self.assertIn('3 x SELECT', str(error.exception))
+
+    def test_distinct_queries_pass(self):
+        """Test queries below the threshold are not reported."""
+        with detect_duplicate_queries() as recorder:
+            Tag.objects.filter(user=self.user).count()
+            list(Tag.objects.filter(user=self.user))
+
+        self.assertEqual(recorder.duplicates(3), [])
+
+    def create_recipes_with_tags(self):
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {i}',
+                time_minutes=5,
+                price='1.00'
+            )
+            recipe.tags.add(Tag.objects.create(user=self.user,
+                                               name=f'Tag{i}'))
+
+    def test_request_reports_repeated_queries(self):
+        """Test a list without prefetching is reported as N+1."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.create_recipes_with_tags()
+
+        with patch.object(RecipeViewSet, '_select_fields',
+                          lambda view, queryset: queryset), \
+                self.assertLogs('core.instrumentation', 'WARNING') as logs:
+            client.get(RECIPES_URL)
+
+        self.assertIn('3 x', logs.output[0])
+        self.assertIn('core_recipe_tags', logs.output[0])
+
+    def test_prefetched_list_passes(self):
+        """Test the recipe list loads relations without repeating."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.create_recipes_with_tags()
+
+        with detect_duplicate_queries():
+            client.get(RECIPES_URL)
+
+    @override_settings(DUPLICATE_QUERY_RAISE=True)
+    def test_request_raises_in_tests(self):
+        """Test requests raise when configured to."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.create_recipes_with_tags()
+
+        with patch.object(RecipeViewSet, '_select_fields',
+                          lambda view, queryset: queryset), \
+                self.assertRaises(DuplicateQueryError):
+            client.get(RECIPES_URL)
@@ -0,0 +1,131 @@
+"""
+Tests for the fast JSON and MessagePack renderers and parsers.
+"""
+import datetime
+import io
+import uuid
+from decimal import Decimal
+
+import msgpack
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.parsers import ORJSONParser, MessagePackParser
+from core.renderers import ORJSONRenderer, MessagePackRenderer
+
+RECIPES_URL = reverse('recipe_app:recipe-list')
+
+PAYLOAD = {
+    'id': 1,
+    'title': 'Crème brûlée \u2028\u2029 "quoted"',
+    'price': Decimal('5.50'),
+    'ratio': 0.1,
+    'created': datetime.datetime(2024, 1, 2, 3, 4, 5, 678901,
+                                 tzinfo=datetime.timezone.utc),
+    'day': datetime.date(2024, 1, 2),
+    'key': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    'label': gettext_lazy('Name'),
+    'nested': [{'id': 2, 'tags': []}, None, True],
+    3: 'integer key',
+}
+
+
+class ORJSONTests(SimpleTestCase):
+    """Test the orjson renderer and parser."""
+
+    def test_render_matches_json_renderer(self):
+        """Test output is byte for byte the same as JSONRenderer."""
+        self.assertEqual(
+            ORJSONRenderer().render(PAYLOAD),
+            JSONRenderer().render(PAYLOAD)
+        )
+
+    def test_indent_falls_back(self):
+        """Test indented output is still supported."""
+        media_type = 'application/json; indent=4'
+        self.assertEqual(
+            ORJSONRenderer().render(PAYLOAD, media_type),
+            JSONRenderer().render(PAYLOAD, media_type)
+        )
+
+    def test_parse(self):
+        """Test parsing JSON and rejecting invalid bodies."""
+        parser = ORJSONParser()
+
+        data = parser.parse(io.BytesIO('{"name": "Crème"}'.encode()))
+
+        self.assertEqual(data, {'name': 'Crème'})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"value": NaN}'))
+
+
+class MessagePackTests(SimpleTestCase):
+    """Test the MessagePack renderer and parser."""
+
+    def test_round_trip_matches_json(self):
+        """Test MessagePack carries the values JSON does."""
+        data = {key: value for key, value in PAYLOAD.items() if key != 3}
+        body = MessagePackRenderer().render(data)
+
+        self.assertEqual(
+            MessagePackParser().parse(io.BytesIO(body)),
+            ORJSONParser().parse(io.BytesIO(ORJSONRenderer().render(data)))
+        )
+
+    def test_parse_invalid(self):
+        """Test invalid bodies raise a parse error."""
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(io.BytesIO(b'\xc1'))
+
+
+class NegotiationTests(TestCase):
+    """Test choosing formats through Accept and Content-Type."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_msgpack_response(self):
+        """Test clients accepting MessagePack receive it."""
+        Recipe.objects.create(user=self.user, title='Soup',
+                              time_minutes=10, price=Decimal('2.50'))
+
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        data = msgpack.unpackb(res.content)
+        self.assertEqual(data[0]['title'], 'Soup')
+        self.assertEqual(data[0]['price'], '2.50')
+
+    def test_json_response_unchanged(self):
+        """Test JSON responses are what JSONRenderer produces."""
+        Recipe.objects.create(user=self.user, title='Soup',
+                              time_minutes=10, price=Decimal('2.50'))
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertEqual(res.content, JSONRenderer().render(res.data))
+
+    def test_msgpack_request(self):
+        """Test creating a recipe from a MessagePack body."""
+        payload = {'title': 'Soup', 'time_minutes': 10, 'price': '2.50',
+                   'tags': [{'name': 'Vegan'}]}
+
+        res = self.client.post(RECIPES_URL, payload, format='msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.tags.get().name, 'Vegan')
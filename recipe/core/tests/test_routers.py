@@ -0,0 +1,190 @@
+"""
+Tests for read replica routing.
+"""
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+from django.db.utils import OperationalError
+from django.http import HttpResponse
+from django.test import (
+    SimpleTestCase,
+    RequestFactory,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import checks
+from core.middleware import ReplicaRoutingMiddleware
+from core.models import Recipe, User
+from core.routers import monitor, read_from_replica
+
+
+def read_alias(request):
+    """Respond with the database alias recipes would be read from."""
+    return HttpResponse(router.db_for_read(Recipe))
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica'],
+    DATABASE_SHARDS=['default'],
+    REPLICA_PIN_SECONDS=60
+)
+@patch('core.routers.replica_lag', return_value=0)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Test routing reads to replicas."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = ReplicaRoutingMiddleware(read_alias)
+        monitor.reset()
+        cache.clear()
+
+    def request(self, method, token='Token abc', addr='10.0.0.1'):
+        request = getattr(self.factory, method)(
+            '/api/recipe/recipes/',
+            HTTP_AUTHORIZATION=token,
+            REMOTE_ADDR=addr
+        )
+        return self.middleware(request).content.decode()
+
+    def test_safe_request_reads_replica(self, patched_lag):
+        """Test GET requests read from the replica."""
+        self.assertEqual(self.request('get'), 'replica')
+
+    def test_write_pins_client_to_primary(self, patched_lag):
+        """Test a GET following a POST reads from the primary."""
+        self.request('post')
+
+        self.assertEqual(self.request('get'), 'default')
+
+    def test_pin_limited_to_client(self, patched_lag):
+        """Test other clients, even at the same address, read replicas."""
+        self.request('post')
+
+        res = self.request('get', token='Token other')
+        self.assertEqual(res, 'replica')
+
+    def test_anonymous_not_pinned(self, patched_lag):
+        """Test requests without credentials are never pinned."""
+        self.request('post', token='')
+
+        self.assertEqual(self.request('get', token=''), 'replica')
+
+    def test_unshared_pin_cache_warned(self, patched_lag):
+        """Test the deploy check warns about a process local pin cache."""
+        self.assertEqual(
+            [e.id for e in checks.check_replica_pin_cache(None)],
+            ['core.W001']
+        )
+        shared = {'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache',
+        }}
+        with override_settings(CACHES=shared):
+            self.assertEqual(checks.check_replica_pin_cache(None), [])
+
+    def test_lagging_replica_skipped(self, patched_lag):
+        """Test reads fall back to the primary when the replica lags."""
+        patched_lag.return_value = 60
+
+        self.assertEqual(self.request('get'), 'default')
+
+    def test_unreachable_replica_skipped(self, patched_lag):
+        """Test reads fall back to the primary when the replica is down."""
+        patched_lag.side_effect = OperationalError
+
+        self.assertEqual(self.request('get'), 'default')
+
+    def test_replica_health_cached(self, patched_lag):
+        """Test the replica is not probed on every request."""
+        self.request('get')
+        self.request('get')
+
+        self.assertEqual(patched_lag.call_count, 1)
+
+    def test_replica_objects_saved_to_primary(self, patched_lag):
+        """Test objects read from a replica are written to the primary."""
+        with read_from_replica():
+            recipe = Recipe()
+            recipe._state.db = router.db_for_read(Recipe)
+
+        self.assertEqual(recipe._state.db, 'replica')
+        self.assertEqual(
+            router.db_for_write(Recipe, instance=recipe),
+            'default'
+        )
+
+
+# Run with recipe.test_settings, which configures the replica.
+@skipUnless('replica' in settings.DATABASES, 'Needs the replica database.')
+@override_settings(
+    DATABASE_REPLICAS=['replica'],
+    DATABASE_SHARDS=['default'],
+    REPLICA_PIN_SECONDS=60
+)
+class ReplicaDatabaseTests(TransactionTestCase):
+    """
+    Test reads and writes against a replica of the test database. The
+    replica is a second connection, so it only sees committed data.
+    """
+    databases = {'default', 'replica'} & set(settings.DATABASES)
+
+    def setUp(self):
+        monitor.reset()
+        cache.clear()
+        user = User.objects.create_user(email='user@example.com',
+                                        password='testpass123')
+        Recipe.objects.create(user=user, title='Soup', time_minutes=5,
+                              price=Decimal('1.00'))
+        self.client = APIClient()
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def get_recipes(self):
+        """
+        Return the number of recipes listed and of the queries run on the
+        primary and the replica.
+        """
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            res = self.client.get(reverse('recipe_app:recipe-list'))
+        return len(res.data), len(primary), len(replica)
+
+    def test_reads_from_replica(self):
+        """Test safe requests query the replica only."""
+        recipes, primary, replica = self.get_recipes()
+
+        self.assertEqual(recipes, 1)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_reads_own_writes_from_primary(self):
+        """Test a client is read from the primary after a write."""
+        res = self.client.post(reverse('recipe_app:recipe-list'), {
+            'title': 'Stew', 'time_minutes': 30, 'price': '4.00',
+        }, format='json')
+        self.assertEqual(res.status_code, 201)
+
+        recipes, primary, replica = self.get_recipes()
+
+        self.assertEqual(recipes, 2)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    @override_settings(REPLICA_MAX_LAG=-1)
+    def test_unhealthy_replica_falls_back(self):
+        """Test reads go to the primary when the replica lags."""
+        recipes, primary, replica = self.get_recipes()
+
+        self.assertEqual(recipes, 1)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
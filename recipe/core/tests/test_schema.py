@@ -0,0 +1,76 @@
+"""
+Tests for serving the cached OpenAPI schema.
+"""
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import schema
+
+SCHEMA_URL = reverse('api-schema')
+
+
+@override_settings(SCHEMA_ARTIFACT='/nonexistent/openapi.json')
+class CachedSchemaTests(SimpleTestCase):
+    """Test the cached schema view."""
+
+    def setUp(self):
+        self.client = APIClient()
+        schema.clear_schema_cache()
+
+    def test_schema_generated_once(self):
+        """Test the schema is generated on first request only."""
+        with patch('core.schema.generate_schema',
+                   wraps=schema.generate_schema) as patched_generate:
+            first = self.client.get(SCHEMA_URL)
+            second = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(patched_generate.call_count, 1)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.content, second.content)
+        self.assertIn(b'/api/recipe/recipes/', first.content)
+
+    def test_etag_revalidation(self):
+        """Test a matching If-None-Match gets a 304 without a body."""
+        res = self.client.get(SCHEMA_URL)
+
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.content, b'')
+
+    def test_formats_cached_separately(self):
+        """Test YAML and JSON are both served with different ETags."""
+        yaml_res = self.client.get(SCHEMA_URL)
+        json_res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        self.assertNotEqual(yaml_res['ETag'], json_res['ETag'])
+        self.assertIn('paths', json.loads(json_res.content))
+
+    def test_artifact_served(self):
+        """Test the built artifact is served without generation."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'openapi.json')
+            call_command('build_schema', '--file', path, stdout=StringIO())
+
+            with override_settings(SCHEMA_ARTIFACT=path), \
+                    patch('core.schema.generate_schema') as patched_generate:
+                res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+            patched_generate.assert_not_called()
+            with open(path, 'rb') as artifact:
+                self.assertEqual(json.loads(res.content), json.load(artifact))
+
+    def test_docs_point_to_schema(self):
+        """Test the Swagger UI loads the cached schema."""
+        res = self.client.get(reverse('api-docs'))
+
+        self.assertContains(res, SCHEMA_URL)
@@ -0,0 +1,233 @@
+"""
+Tests for sharding recipe data by user.
+"""
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import router
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import User, Recipe, Tag
+from core.routers import (
+    ShardRouter,
+    ShardRoutingError,
+    activate_shard,
+    deactivate_shard,
+    monitor,
+    read_from_replica,
+    shard_placement,
+)
+
+
+@override_settings(DATABASE_SHARDS=['default', 'shard1'])
+class ShardRouterTests(SimpleTestCase):
+    """Test routing recipe data to shards."""
+
+    def test_placement_stable(self):
+        """Test users are always placed on the same shard."""
+        emails = [f'user{index}@example.com' for index in range(100)]
+        placements = [shard_placement(email) for email in emails]
+
+        self.assertEqual(placements,
+                         [shard_placement(email) for email in emails])
+        self.assertEqual(set(placements), {'default', 'shard1'})
+
+    def test_new_shard_moves_only_its_users(self):
+        """Test adding a shard only moves users placed on the new shard."""
+        emails = [f'user{index}@example.com' for index in range(100)]
+        before = [shard_placement(email) for email in emails]
+        with self.settings(DATABASE_SHARDS=['default', 'shard1', 'shard2']):
+            after = [shard_placement(email) for email in emails]
+
+        for old, new in zip(before, after):
+            self.assertIn(new, (old, 'shard2'))
+
+    def test_new_object_written_to_user_shard(self):
+        """Test new objects are written to the shard of their user."""
+        recipe = Recipe(user=User(shard='shard1'))
+
+        self.assertEqual(router.db_for_write(Recipe, instance=recipe),
+                         'shard1')
+
+    def test_query_uses_active_shard(self):
+        """Test queries without an instance use the active shard."""
+        token = activate_shard('shard1')
+        try:
+            self.assertEqual(router.db_for_read(Tag), 'shard1')
+        finally:
+            deactivate_shard(token)
+
+    def test_unknown_shard_raises(self):
+        """Test queries without any hint of the shard are refused."""
+        with self.assertRaises(ShardRoutingError):
+            router.db_for_read(Tag)
+        with self.assertRaises(ShardRoutingError):
+            router.db_for_write(Recipe, instance=Recipe())
+
+    def test_user_read_from_default(self):
+        """Test the user of sharded data is read from the default db."""
+        recipe = Recipe()
+        recipe._state.db = 'shard1'
+
+        self.assertEqual(router.db_for_read(User, instance=recipe),
+                         'default')
+
+    def test_related_recipes_read_from_user_shard(self):
+        """Test reverse relations of a user read from its shard."""
+        user = User(shard='shard1')
+        user._state.db = 'default'
+
+        self.assertEqual(router.db_for_read(Recipe, instance=user),
+                         'shard1')
+
+    @override_settings(DATABASE_REPLICAS=['shard1_replica'],
+                       REPLICA_PRIMARIES={'shard1_replica': 'shard1'})
+    @patch('core.routers.replica_lag', return_value=0)
+    def test_replica_of_shard_read(self, patched_lag):
+        """Test replica reads go to a replica of the shard of the data."""
+        monitor.reset()
+        token = activate_shard('shard1')
+        try:
+            with read_from_replica():
+                self.assertEqual(router.db_for_read(Tag), 'shard1_replica')
+                self.assertEqual(router.db_for_read(User), 'default')
+            self.assertEqual(router.db_for_read(Tag), 'shard1')
+        finally:
+            deactivate_shard(token)
+
+        tag = Tag()
+        tag._state.db = 'shard1_replica'
+        self.assertEqual(router.db_for_write(Tag, instance=tag), 'shard1')
+
+    def test_single_database_not_routed(self):
+        """Test the router stays out of the way without shards."""
+        with self.settings(DATABASE_SHARDS=['default']):
+            self.assertIsNone(ShardRouter().db_for_read(Tag))
+
+
+# Run with recipe.test_settings, which configures the second shard.
+needs_second_shard = skipUnless('shard1' in settings.DATABASES,
+                                'Needs the shard1 database.')
+SHARD_DATABASES = {'default', 'shard1'} & set(settings.DATABASES)
+
+
+@needs_second_shard
+class ShardMigrationTests(SimpleTestCase):
+    """Test the schema of recipe data on each shard."""
+    databases = SHARD_DATABASES
+
+    def test_user_constraints_dropped_on_shards_only(self):
+        """Test user foreign keys keep their constraint on default."""
+        schema = {}
+        for alias in self.databases:
+            out = StringIO()
+            call_command('sqlmigrate', 'core', '0006_user_shard',
+                         database=alias, stdout=out)
+            schema[alias] = out.getvalue()
+
+        self.assertNotIn(Recipe._meta.db_table, schema['default'])
+        self.assertIn(Recipe._meta.db_table, schema['shard1'])
+
+
+@needs_second_shard
+@override_settings(DATABASE_SHARDS=['default', 'shard1'])
+class ShardedApiTests(TestCase):
+    """Test the recipe API against two shards."""
+    databases = SHARD_DATABASES
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_user_created_on_placed_shard(self):
+        """Test new users get their shard with a single insert."""
+        with self.assertNumQueries(1, using='default'):
+            user = User.objects.create_user(email='new@example.com')
+
+        self.assertEqual(user.shard, shard_placement('new@example.com'))
+
+    def test_user_id_hint_routes_to_shard(self):
+        """Test querysets with a user_id hint use the shard of the user."""
+        self.user.shard = 'shard1'
+        self.user.save()
+
+        tags = Tag.objects.db_manager(hints={'user_id': self.user.pk})
+
+        self.assertEqual(tags.db, 'shard1')
+
+    def test_shard_reset_after_error(self):
+        """Test a view failing with an exception resets the shard."""
+        with patch('recipe_app.views.RecipeViewSet.list',
+                   side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.get(reverse('recipe_app:recipe-list'))
+
+        with self.assertRaises(ShardRoutingError):
+            router.db_for_read(Tag)
+
+    def test_recipe_created_on_user_shard(self):
+        """Test recipes and tags created through the API land on the shard."""
+        call_command('rebalance_shards', '--to', 'shard1', stdout=StringIO())
+        self.user.refresh_from_db()
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 30,
+            'price': Decimal('5.50'),
+            'tags': [{'name': 'Indian'}],
+        }
+        res = self.client.post(reverse('recipe_app:recipe-list'),
+                               payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.using('shard1').get(id=res.data['id'])
+        self.assertEqual(recipe.tags.get().name, 'Indian')
+        self.assertFalse(Recipe.objects.using('default').exists())
+
+        res = self.client.get(reverse('recipe_app:recipe-list'))
+        self.assertEqual(len(res.data), 1)
+
+    def test_rebalance_moves_user_data(self):
+        """Test the rebalance command moves a user with its relations."""
+        self.user.shard = 'default'
+        self.user.save()
+        tag = Tag.objects.using('default').create(user=self.user, name='Veg')
+        recipe = Recipe.objects.using('default').create(
+            user=self.user,
+            title='Salad',
+            time_minutes=5,
+            price=Decimal('2.00')
+        )
+        recipe.tags.add(tag)
+
+        call_command('rebalance_shards', '--to', 'shard1', stdout=StringIO())
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.shard, 'shard1')
+        self.assertFalse(Recipe.objects.using('default').exists())
+        moved = Recipe.objects.using('shard1').get(user=self.user)
+        self.assertEqual(moved.pk, recipe.pk)
+        self.assertEqual(moved.tags.get().pk, tag.pk)
+        self.assertEqual(moved.tag_ids, [tag.pk])
+
+    def test_shard_ids_in_own_range(self):
+        """Test shards hand out ids that cannot collide."""
+        other = User.objects.create_user(email='other@example.com')
+        on_default = Tag.objects.using('default').create(user=other,
+                                                         name='Veg')
+        on_shard = Tag.objects.using('shard1').create(user=other,
+                                                      name='Veg')
+
+        self.assertLess(on_default.pk, 1 << 48)
+        self.assertGreaterEqual(on_shard.pk, 1 << 48)
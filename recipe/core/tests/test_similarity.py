@@ -0,0 +1,48 @@
+"""
+Tests for the MinHash signatures of similar recipes.
+"""
+from django.test import SimpleTestCase
+
+from core import similarity
+
+
+class SimilarityTests(SimpleTestCase):
+    """Test signatures, band keys and ranking."""
+
+    def test_signature_estimates_jaccard(self):
+        """Test the share of equal signature rows follows the overlap."""
+        first = similarity.signature(set(range(0, 100)))
+        second = similarity.signature(set(range(50, 150)))
+
+        agreement = sum(a == b for a, b in zip(first, second)) / len(first)
+
+        self.assertAlmostEqual(agreement, 1 / 3, delta=0.15)
+
+    def test_band_keys(self):
+        """Test equal sets share every key and disjoint sets none."""
+        keys = similarity.band_keys(similarity.tokens([1, 2], [1, 3]))
+
+        self.assertEqual(len(keys), 32)
+        self.assertEqual(
+            keys, similarity.band_keys(similarity.tokens([2, 1], [3, 1]))
+        )
+        self.assertFalse(set(keys).intersection(
+            similarity.band_keys(similarity.tokens([4], [5]))
+        ))
+        self.assertEqual(similarity.band_keys(set()), [])
+
+    def test_tags_and_ingredients_differ(self):
+        """Test a tag and an ingredient with the same id are not equal."""
+        self.assertFalse(similarity.tokens([1], []) &
+                         similarity.tokens([], [1]))
+
+    def test_most_similar(self):
+        """Test candidates are ranked and those sharing nothing dropped."""
+        candidates = [(1, {1, 2}), (2, {1, 2, 3}), (3, {9}), (4, {1, 2, 3})]
+
+        self.assertEqual(
+            similarity.most_similar({1, 2, 3}, candidates, 3),
+            [(2, 1.0), (4, 1.0), (1, 2 / 3)]
+        )
+        self.assertEqual(similarity.most_similar({1}, candidates, 10),
+                         [(1, 0.5), (2, 1 / 3), (4, 1 / 3)])
@@ -0,0 +1,168 @@
+"""
+Tests for token bucket throttles and the concurrency limiter.
+"""
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import throttling
+from core.middleware import ConcurrencyLimitMiddleware
+
+RECIPES_URL = reverse('recipe_app:recipe-list')
+TOKEN_URL = reverse('user:token')
+
+
+def rates(**scopes):
+    """Return REST_FRAMEWORK settings with the given throttle rates."""
+    return {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': scopes}
+
+
+class BucketStoreTests(SimpleTestCase):
+    """Test the in-process token buckets."""
+
+    def test_burst_then_refill(self):
+        """Test a bucket empties and refills at its rate."""
+        store = throttling.LocalBucketStore()
+        now = [100.0]
+        store.clock = lambda: now[0]
+
+        self.assertEqual(store.consume('key', 2, 1.0), 0)
+        self.assertEqual(store.consume('key', 2, 1.0), 0)
+        self.assertAlmostEqual(store.consume('key', 2, 1.0), 1.0)
+
+        now[0] += 0.5
+        self.assertAlmostEqual(store.consume('key', 2, 1.0), 0.5)
+        now[0] += 0.5
+        self.assertEqual(store.consume('key', 2, 1.0), 0)
+        self.assertEqual(store.consume('other', 2, 1.0), 0)
+
+    def test_evict_least_recently_used(self):
+        """Test past max_entries the bucket used longest ago is dropped."""
+        store = throttling.LocalBucketStore(max_entries=2)
+        now = [0.0]
+        store.clock = lambda: now[0]
+
+        store.consume('old', 1, 0.001)
+        store.consume('login', 1, 1.0)
+        now[0] += 5
+        store.consume('old', 1, 0.001)
+        store.consume('new', 1, 1.0)
+
+        self.assertEqual(list(store._buckets), ['old', 'new'])
+        self.assertGreater(store.consume('old', 1, 0.001), 0)
+
+
+class ThrottleApiTests(TestCase):
+    """Test throttling API requests per token and scope."""
+
+    def setUp(self):
+        throttling.bucket_store().clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def tearDown(self):
+        throttling.bucket_store().clear()
+
+    def test_read_budget_per_token(self):
+        """Test reads past the budget get 429 with Retry-After."""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'password123'
+        )
+        other_client = APIClient()
+        other_client.force_authenticate(other)
+
+        with override_settings(REST_FRAMEWORK=rates(read='2/min')):
+            for _ in range(2):
+                res = self.client.get(RECIPES_URL)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+            res = self.client.get(RECIPES_URL)
+            other_res = other_client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '30')
+        self.assertEqual(other_res.status_code, status.HTTP_200_OK)
+
+    def test_scopes_have_separate_budgets(self):
+        """Test writes are not limited by an exhausted read budget."""
+        payload = {'title': 'Soup', 'time_minutes': 5, 'price': '1.00'}
+        limits = rates(read='1/min', write='1/min')
+
+        with override_settings(REST_FRAMEWORK=limits):
+            self.client.get(RECIPES_URL)
+            res = self.client.post(RECIPES_URL, payload)
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_login_throttled(self):
+        """Test token login has its own budget per client address."""
+        payload = {'email': 'user@example.com', 'password': 'wrong'}
+        client = APIClient()
+
+        with override_settings(REST_FRAMEWORK=rates(login='1/min')):
+            res = client.post(TOKEN_URL, payload)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            res = client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(THROTTLE_ENABLED=False)
+    def test_disabled(self):
+        """Test throttling can be switched off."""
+        with override_settings(REST_FRAMEWORK=rates(read='1/min')):
+            for _ in range(3):
+                res = self.client.get(RECIPES_URL)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class ConcurrencyLimitTests(SimpleTestCase):
+    """Test shedding load past the concurrency limit."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = ConcurrencyLimitMiddleware(
+            lambda request: HttpResponse('ok')
+        )
+
+    @override_settings(CONCURRENCY_LIMIT=2, CONCURRENCY_RETRY_AFTER=3)
+    def test_rejects_past_limit(self):
+        """Test requests past the limit get 503 with Retry-After."""
+        res = self.middleware(self.factory.get('/api/recipe/'))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.middleware.in_flight, 0)
+
+        with patch.object(self.middleware, 'in_flight', 2):
+            res = self.middleware(self.factory.get('/api/recipe/'))
+            exempt = self.middleware(self.factory.get('/metrics'))
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res['Retry-After'], '3')
+        self.assertEqual(exempt.status_code, 200)
+
+    @override_settings(CONCURRENCY_LIMIT=1)
+    def test_released_on_error(self):
+        """Test a failing request still leaves the limiter."""
+        def fail(request):
+            raise ValueError
+
+        middleware = ConcurrencyLimitMiddleware(fail)
+        with self.assertRaises(ValueError):
+            middleware(self.factory.get('/'))
+
+        self.assertEqual(middleware.in_flight, 0)
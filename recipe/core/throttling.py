@@ -0,0 +1,139 @@
+"""
+Token bucket throttles kept in process memory or a local cache.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+def parse_rate(rate):
+    """Parse a DRF rate such as '100/min' into (requests, seconds)."""
+    num, period = rate.split('/')
+    return int(num), {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+
+
+class LocalBucketStore:
+    """
+    Buckets of this process, least recently used first. Past
+    `max_entries`, buckets are dropped from the least recently used end,
+    which at worst lets a client idle the longest through early.
+    """
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate):
+        """
+        Take a token from the bucket, returning 0 if one was available
+        or the seconds until the next token otherwise.
+        """
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / refill_rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore:
+    """
+    Buckets in a Django cache shared by the workers of a host, such as
+    a FileBasedCache under /dev/shm. Concurrent requests may race and
+    let a few extra requests through.
+    """
+    clock = staticmethod(time.time)
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def consume(self, key, capacity, refill_rate):
+        now = self.clock()
+        cache = caches[self.alias]
+        tokens, updated = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_rate)
+        wait = 0.0 if tokens >= 1 else (1 - tokens) / refill_rate
+        if not wait:
+            tokens -= 1
+        cache.set(key, (tokens, now), timeout=int(capacity / refill_rate) + 1)
+        return wait
+
+    def clear(self):
+        caches[self.alias].clear()
+
+
+_local_store = LocalBucketStore()
+
+
+def bucket_store():
+    """Return the store selected by THROTTLE_CACHE."""
+    if settings.THROTTLE_CACHE:
+        return CacheBucketStore(settings.THROTTLE_CACHE)
+    return _local_store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle each API token, user or anonymous client with a bucket per
+    scope. Buckets hold as many tokens as the rate allows per period and
+    refill continuously, so short bursts pass and sustained load does
+    not. The scope is the view's `throttle_scope`, or read and write by
+    request method.
+    """
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return 'read'
+        return 'write'
+
+    def get_ident(self, request):
+        """Identify the token, the user, or else the client address."""
+        key = getattr(request.auth, 'key', None)
+        if key:
+            return 'token:' + hashlib.sha1(key.encode()).hexdigest()
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return 'ip:' + super().get_ident(request)
+
+    def allow_request(self, request, view):
+        self.wait_time = None
+        if not settings.THROTTLE_ENABLED:
+            return True
+
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+
+        capacity, period = parse_rate(rate)
+        self.wait_time = bucket_store().consume(
+            f'throttle:{scope}:{self.get_ident(request)}',
+            capacity,
+            capacity / period
+        )
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
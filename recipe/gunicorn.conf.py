@@ -0,0 +1,10 @@
+"""
+Gunicorn settings, read from the working directory by
+`gunicorn recipe.wsgi`.
+"""
+from core.metrics import mark_process_dead
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of an exited worker from /metrics."""
+    mark_process_dead(worker.pid)
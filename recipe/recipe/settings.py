@@ -49,7 +49,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.HealthCheckMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ConcurrencyLimitMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.RequestTimingMiddleware',
+    'core.middleware.DuplicateQueryMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -84,14 +92,83 @@ WSGI_APPLICATION = 'recipe.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.backends.postgresql_pool',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
-        'PASSWORD': os.environ.get('DB_PASS')
+        'PASSWORD': os.environ.get('DB_PASS'),
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'IDLE_TIMEOUT': int(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300)),
+            'TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'MAX_WAITING': int(os.environ.get('DB_POOL_MAX_WAITING', 0)),
+        }
     }
 }
 
+# Read replicas, given as a comma separated list of hosts. Safe requests
+# are served from them unless the client wrote within REPLICA_PIN_SECONDS.
+# REPLICA_PRIMARIES maps replicas of other databases than default to
+# their primary.
+DATABASE_REPLICAS = []
+REPLICA_PRIMARIES = {}
+for index, host in enumerate(
+    filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))
+):
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+# Extra databases holding recipe data, given as a comma separated list of
+# hosts. Users are placed on a shard by a hash of their email. Replicas
+# of shard N are given by DB_SHARD<N>_REPLICA_HOSTS.
+DATABASE_SHARDS = ['default']
+for index, host in enumerate(
+    filter(None, os.environ.get('DB_SHARD_HOSTS', '').split(',')), start=1
+):
+    shard = f'shard{index}'
+    DATABASES[shard] = {**DATABASES['default'], 'HOST': host}
+    DATABASE_SHARDS.append(shard)
+    for replica_index, replica_host in enumerate(filter(
+        None, os.environ.get(f'DB_SHARD{index}_REPLICA_HOSTS', '').split(',')
+    )):
+        replica = f'{shard}_replica{replica_index}'
+        DATABASES[replica] = {
+            **DATABASES[shard],
+            'HOST': replica_host,
+            'TEST': {'MIRROR': shard},
+        }
+        DATABASE_REPLICAS.append(replica)
+        REPLICA_PRIMARIES[replica] = shard
+
+DATABASE_ROUTERS = [
+    'core.routers.ShardRouter',
+    'core.routers.ReplicaRouter',
+]
+
+# Caches, process local unless CACHE_BACKEND and CACHE_LOCATION name a
+# shared one such as django.core.cache.backends.memcached.PyMemcacheCache
+# or django.core.cache.backends.db.DatabaseCache.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# A client writing is read from the primary for REPLICA_PIN_SECONDS. The
+# pins are kept by credentials in REPLICA_PIN_CACHE, which must be shared
+# by all workers for a read to see the writes made through another one.
+REPLICA_PIN_CACHE = os.environ.get('REPLICA_PIN_CACHE') or 'default'
+REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 10))
+REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 5))
+REPLICA_CHECK_INTERVAL = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -158,8 +235,138 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'core.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'core.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.TokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'read': os.environ.get('THROTTLE_READ_RATE', '1000/min'),
+        'write': os.environ.get('THROTTLE_WRITE_RATE', '200/min'),
+        'upload': os.environ.get('THROTTLE_UPLOAD_RATE', '30/min'),
+        'login': os.environ.get('THROTTLE_LOGIN_RATE', '20/min'),
+    },
+    'TEST_REQUEST_RENDERER_CLASSES': [
+        'rest_framework.renderers.MultiPartRenderer',
+        'rest_framework.renderers.JSONRenderer',
+        'core.renderers.MessagePackRenderer',
+    ],
 }
 
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True
 }
+
+# Share of requests timed by RequestTimingMiddleware, between 0 and 1.
+REQUEST_TIMING_SAMPLE_RATE = float(
+    os.environ.get('REQUEST_TIMING_SAMPLE_RATE', 1)
+)
+
+# Report requests repeating one query DUPLICATE_QUERY_THRESHOLD times.
+# Capturing stacks is costly, so it is only on where enabled explicitly,
+# as in the development compose file and the test settings.
+DUPLICATE_QUERY_DETECTION = bool(
+    int(os.environ.get('DUPLICATE_QUERY_DETECTION', 0))
+)
+DUPLICATE_QUERY_THRESHOLD = 3
+DUPLICATE_QUERY_RAISE = False
+
+# Requests are profiled when sampled or sent with an X-Profile header
+# from `manage.py profile_token`, which only works for staff users.
+# Sampling only picks requests of staff users, unless
+# PROFILING_SAMPLE_ALL_USERS also stores profiles of everyone else.
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_SAMPLE_ALL_USERS = bool(
+    int(os.environ.get('PROFILING_SAMPLE_ALL_USERS', 0))
+)
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+PROFILING_INTERVAL = 0.005
+PROFILING_DIR = os.environ.get('PROFILING_DIR', '/vol/web/profiles')
+
+# Token buckets of TokenBucketThrottle live in process memory, or in
+# THROTTLE_CACHE, a cache alias such as a FileBasedCache under /dev/shm
+# shared by the workers of a host.
+THROTTLE_ENABLED = True
+THROTTLE_CACHE = os.environ.get('THROTTLE_CACHE') or None
+
+# /metrics answers scrapes from METRICS_ALLOWED_NETWORKS, a comma separated
+# list of addresses or networks matched against REMOTE_ADDR, or bearing
+# METRICS_TOKEN in an `Authorization: Bearer` header.
+METRICS_ALLOWED_NETWORKS = list(filter(None, os.environ.get(
+    'METRICS_ALLOWED_NETWORKS', '127.0.0.1,::1'
+).split(',')))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Requests in flight per process before answering 503, 0 to disable.
+CONCURRENCY_LIMIT = int(os.environ.get('CONCURRENCY_LIMIT', 100))
+CONCURRENCY_RETRY_AFTER = 1
+CONCURRENCY_LIMIT_EXEMPT = ['/metrics']
+
+# Responses of these types and at least COMPRESSION_MIN_SIZE bytes are
+# compressed with brotli or gzip at COMPRESSION_LEVEL, from 1 to 11.
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 5))
+COMPRESSION_CONTENT_TYPES = [
+    'application/json',
+    'application/msgpack',
+    'application/vnd.oai.openapi',
+    'application/vnd.oai.openapi+json',
+    'application/javascript',
+    'application/xml',
+    'text/css',
+    'text/html',
+    'text/javascript',
+    'text/plain',
+]
+# Compressed bodies of responses with a strong ETag kept in memory.
+COMPRESSION_CACHE_SIZE = 128
+
+# Users are purged PURGE_BATCH_SIZE rows per statement, by a job of the
+# queue unless PURGE_BACKGROUND is off.
+PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', 1000))
+PURGE_BACKGROUND = bool(int(os.environ.get('PURGE_BACKGROUND', 1)))
+
+# Jobs run by `manage.py run_worker` in JOB_WORKER_CONCURRENCY threads.
+# Failed jobs are retried after JOB_RETRY_BACKOFF seconds, doubling up
+# to JOB_RETRY_BACKOFF_MAX, and a job still running after
+# JOB_VISIBILITY_TIMEOUT seconds is taken for lost and run again.
+JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', 4))
+JOB_POLL_INTERVAL = 1.0
+JOB_VISIBILITY_TIMEOUT = int(os.environ.get('JOB_VISIBILITY_TIMEOUT', 600))
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 10
+JOB_RETRY_BACKOFF_MAX = 60 * 60
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.instrumentation': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_LOG_LEVEL', 'WARNING'),
+        },
+    },
+}
+
+# Written by `manage.py build_schema`, the schema is generated on first
+# request and kept in memory when the file does not exist.
+SCHEMA_ARTIFACT = BASE_DIR / 'openapi.json'
+
+# Similar recipes are found through SIMILARITY_BANDS keys hashed from a
+# MinHash signature of SIMILARITY_PERMUTATIONS values, which the bands
+# divide. Fewer rows per band find less similar recipes at the cost of
+# more candidates. Run `manage.py rebuild_similarity_index` after a change.
+SIMILARITY_PERMUTATIONS = 64
+SIMILARITY_BANDS = 32
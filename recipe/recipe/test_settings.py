@@ -0,0 +1,22 @@
+"""
+Django settings for running the tests, with a second shard database and
+a replica of the default database.
+"""
+from recipe.settings import *  # noqa
+from recipe.settings import DATABASES
+
+# Report requests repeating queries while the tests run.
+DUPLICATE_QUERY_DETECTION = True
+
+# The sharding tests place users on two shards.
+DATABASES['shard1'] = {
+    **DATABASES['default'],
+    'TEST': {'NAME': f"test_{DATABASES['default']['NAME']}_shard1"},
+}
+
+# The replica tests read through a second connection to the default test
+# database.
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'TEST': {'MIRROR': 'default'},
+}
@@ -1,11 +1,44 @@
 """
 Serializer for Recipe APIs.
 """
+from django.db import router, transaction
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
-from core.models import Recipe, Tag, Ingredient
+from core.instrumentation import TimedSerializerMixin
+from core.models import (
+    PRICE_BUCKETS,
+    Recipe,
+    RecipeStats,
+    Tag,
+    Ingredient,
+    price_bucket,
+)
 
 
-class TagSerializer(serializers.ModelSerializer):
+class UniqueNameMixin:
+    """Reject renaming to a name the user already has, ignoring case."""
+
+    def validate_name(self, value):
+        # Nested in a recipe, existing names are reused instead.
+        request = self.context.get('request')
+        if self.root is not self or request is None:
+            return value
+
+        queryset = self.Meta.model.objects.filter(
+            user=request.user,
+            name__iexact=value
+        )
+        if self.instance is not None:
+            queryset = queryset.exclude(pk=self.instance.pk)
+        if queryset.exists():
+            raise serializers.ValidationError(
+                f'You already have "{value}".'
+            )
+        return value
+
+
+class TagSerializer(UniqueNameMixin, TimedSerializerMixin,
+                    serializers.ModelSerializer):
     """Serializer for Tags."""
 
     class Meta:
@@ -14,7 +47,8 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(UniqueNameMixin, TimedSerializerMixin,
+                           serializers.ModelSerializer):
     """Serializer for Ingredient Model."""
 
     class Meta:
@@ -23,7 +57,34 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Render only the fields named in the `fields` context, nesting the
+    relations named in `expand` and rendering other relations as ids.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.context.get('fields')
+        if not selected:
+            return fields
+
+        expand = self.context.get('expand', ())
+        sparse = {}
+        for name, field in fields.items():
+            if name not in selected and name not in expand:
+                continue
+            if name in self.Meta.expandable_fields and name not in expand:
+                field = serializers.PrimaryKeyRelatedField(
+                    many=True,
+                    read_only=True
+                )
+            sparse[name] = field
+        return sparse
+
+
+class RecipeSerializer(SparseFieldsMixin, TimedSerializerMixin,
+                       serializers.ModelSerializer):
     """Serializer for recipe."""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
@@ -33,55 +94,87 @@ class RecipeSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'time_minutes', 'price', 'link',
                   'tags', 'ingredients']
         read_only_fields = ['id']
+        expandable_fields = ['tags', 'ingredients']
+        extra_kwargs = {'price': {'min_value': 0}}
 
     def _get_or_create_tags(self, recipe, tags):
         """Handle getting or creating tags as needed."""
         auth_user = self.context['request'].user
 
         if tags:
-            for tag in tags:
-                tag_obj, created = Tag.objects.get_or_create(
-                    user=auth_user,
-                    **tag
-                )
-                recipe.tags.add(tag_obj)
+            tag_objs = Tag.objects.db_manager(recipe._state.db).upsert(
+                auth_user,
+                [tag['name'] for tag in tags]
+            )
+            recipe.tags.add(*tag_objs)
 
     def _get_or_create_ingredients(self, recipe, ingredients):
         auth_user = self.context['request'].user
         if ingredients:
-            for ingredient in ingredients:
-                ingredient_obj, created = Ingredient.objects.get_or_create(
-                    user=auth_user,
-                    **ingredient
-                )
-                recipe.ingredients.add(ingredient_obj)
+            manager = Ingredient.objects.db_manager(recipe._state.db)
+            ingredient_objs = manager.upsert(
+                auth_user,
+                [ingredient['name'] for ingredient in ingredients]
+            )
+            recipe.ingredients.add(*ingredient_objs)
+
+    def _set_related(self, recipe, field_name, model, items):
+        """Link exactly the named objects, writing only the changes."""
+        related = getattr(recipe, field_name)
+        current = {
+            name.lower(): pk for pk, name in related.values_list('pk', 'name')
+        }
+        wanted = {}
+        for item in items:
+            wanted.setdefault(item['name'].lower(), item['name'])
+
+        removed = [pk for key, pk in current.items() if key not in wanted]
+        if removed:
+            related.remove(*removed)
+
+        added = [name for key, name in wanted.items() if key not in current]
+        if added:
+            related.add(*model.objects.db_manager(recipe._state.db).upsert(
+                self.context['request'].user,
+                added
+            ))
 
     def create(self, validated_data):
-        """Create a  recipe."""
+        """
+        Create a recipe with its relations in one transaction, applying
+        the statistics of the user once.
+        """
         tags = validated_data.pop('tags', [])
         ingredients = validated_data.pop('ingredients', [])
 
-        recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tags(recipe, tags=tags)
-        self._get_or_create_ingredients(recipe, ingredients=ingredients)
+        recipe = Recipe(**validated_data)
+        db = router.db_for_write(Recipe, instance=recipe)
+        with transaction.atomic(using=db), RecipeStats.objects.batched():
+            recipe.save(force_insert=True, using=db)
+            self._get_or_create_tags(recipe, tags=tags)
+            self._get_or_create_ingredients(recipe, ingredients=ingredients)
         return recipe
 
     def update(self, instance, validated_data):
-        """Update recipe."""
+        """
+        Update a recipe with its relations in one transaction, applying
+        the statistics of the user once.
+        """
         tags = validated_data.pop('tags',  None)
         ingredients = validated_data.pop('ingredients', None)
-        if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(instance, tags=tags)
+        with transaction.atomic(using=instance._state.db), \
+                RecipeStats.objects.batched():
+            if tags is not None:
+                self._set_related(instance, 'tags', Tag, tags)
 
-        if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(instance, ingredients=ingredients)
+            if ingredients is not None:
+                self._set_related(instance, 'ingredients', Ingredient,
+                                  ingredients)
 
-        for attr, val in validated_data.items():
-            setattr(instance, attr, val)
+            for attr, val in validated_data.items():
+                setattr(instance, attr, val)
 
-        instance.save()
+            instance.save()
         return instance
 
 
@@ -92,7 +185,22 @@ class RecipeDetailSerializer(RecipeSerializer):
         fields = RecipeSerializer.Meta.fields + ['description']
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class SimilarRecipeSerializer(RecipeSerializer):
+    """Serializer for recipes similar to another one."""
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['similarity']
+        read_only_fields = fields
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    """Serializer for recipes retrieved by id."""
+    results = RecipeDetailSerializer(many=True)
+    missing = serializers.ListField(child=serializers.IntegerField())
+
+
+class RecipeImageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for uploading images to recipe."""
 
     class Meta:
@@ -100,3 +208,65 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         fields = ['id', 'image']
         read_only_fields = ['id']
         extra_kwargs = {'image': {'required': True}}
+
+
+class ShoppingListItemSerializer(serializers.Serializer):
+    """Serializer for an ingredient of a shopping list."""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    recipes = serializers.ListField(child=serializers.IntegerField())
+
+
+class PriceRangeSerializer(serializers.Serializer):
+    """Serializer for the recipes in a price range."""
+    range = serializers.CharField()
+    recipe_count = serializers.IntegerField()
+
+
+class UsageSerializer(serializers.Serializer):
+    """Serializer for the recipes using a tag or ingredient."""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    recipe_count = serializers.IntegerField()
+
+
+class RecipeStatsSerializer(serializers.ModelSerializer):
+    """Serializer for the recipe statistics of a user."""
+    average_time_minutes = serializers.FloatField(allow_null=True)
+    average_price = serializers.DecimalField(max_digits=14, decimal_places=2,
+                                             allow_null=True)
+    price_distribution = serializers.SerializerMethodField()
+    top_tags = serializers.SerializerMethodField()
+    top_ingredients = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RecipeStats
+        fields = ['recipe_count', 'average_time_minutes', 'average_price',
+                  'price_distribution', 'top_tags', 'top_ingredients']
+        read_only_fields = fields
+
+    def _top(self, obj, relation, model):
+        top = obj.top(relation)
+        names = dict(model.objects.filter(
+            pk__in=[pk for pk, _ in top]
+        ).values_list('pk', 'name'))
+        return [
+            {'id': pk, 'name': names[pk], 'recipe_count': count}
+            for pk, count in top if pk in names
+        ]
+
+    @extend_schema_field(PriceRangeSerializer(many=True))
+    def get_price_distribution(self, obj):
+        return [
+            {'range': label,
+             'recipe_count': obj.price_histogram.get(label, 0)}
+            for label in map(price_bucket, PRICE_BUCKETS)
+        ]
+
+    @extend_schema_field(UsageSerializer(many=True))
+    def get_top_tags(self, obj):
+        return self._top(obj, 'tags', Tag)
+
+    @extend_schema_field(UsageSerializer(many=True))
+    def get_top_ingredients(self, obj):
+        return self._top(obj, 'ingredients', Ingredient)
@@ -8,7 +8,9 @@ import os
 from PIL import Image
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
@@ -20,6 +22,8 @@ from recipe_app.serializers import (
 )
 
 RECIPES_URL = reverse('recipe_app:recipe-list')
+SHOPPING_LIST_URL = reverse('recipe_app:recipe-shopping-list')
+BATCH_URL = reverse('recipe_app:recipe-batch')
 
 
 def detail_url(recipe_id):
@@ -32,6 +36,11 @@ def image_upload_url(recipe_id):
     return reverse('recipe_app:recipe-upload-image', args=[recipe_id])
 
 
+def similar_url(recipe_id):
+    """Create and return the similar recipes url."""
+    return reverse('recipe_app:recipe-similar', args=[recipe_id])
+
+
 def create_recipe(user, **params):
     default = {
         'title': 'Sample recipe title',
@@ -256,6 +265,25 @@ class PrivateRecipApiTest(TestCase):
             ).exists()
             self.assertTrue(exist)
 
+    def test_create_recipe_reuses_names_ignoring_case(self):
+        """Test nested names match existing ones regardless of case."""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        payload = {
+            'title': 'Chips',
+            'time_minutes': 20,
+            'price': Decimal('2.5'),
+            'ingredients': [{'name': 'salt'}, {'name': 'SALT'},
+                            {'name': 'Potato'}],
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.ingredients.count(), 2)
+        self.assertIn(salt, recipe.ingredients.all())
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 2)
+
     def test_create_ingredient_on_recipe_update(self):
         """Test create an ingredient when updating a recipe."""
         recipe = create_recipe(user=self.user)
@@ -300,6 +328,44 @@ class PrivateRecipApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.ingredients.count(), 0)
 
+    def test_update_unchanged_relations_writes_nothing(self):
+        """Test patching the same tags does not touch the through rows."""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'),
+                        Tag.objects.create(user=self.user, name='Lunch'))
+        payload = {'tags': [{'name': 'lunch'}, {'name': 'Vegan'}]}
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(detail_url(recipe.id), payload,
+                                    format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        writes = [q['sql'] for q in queries.captured_queries
+                  if 'core_recipe_tags' in q['sql'] and
+                  q['sql'].startswith(('INSERT', 'DELETE'))]
+        self.assertEqual(writes, [])
+
+    def test_update_relations_applies_difference(self):
+        """Test only the removed and added tags are written."""
+        recipe = create_recipe(user=self.user)
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(vegan,
+                        Tag.objects.create(user=self.user, name='Lunch'))
+        payload = {'tags': [{'name': 'Vegan'}, {'name': 'Dinner'}]}
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(detail_url(recipe.id), payload, format='json')
+
+        writes = [q['sql'].split()[0] for q in queries.captured_queries
+                  if 'core_recipe_tags' in q['sql'] and
+                  q['sql'].startswith(('INSERT', 'DELETE'))]
+        self.assertEqual(sorted(writes), ['DELETE', 'INSERT'])
+        self.assertEqual(
+            sorted(recipe.tags.values_list('name', flat=True)),
+            ['Dinner', 'Vegan']
+        )
+        self.assertIn(vegan, recipe.tags.all())
+
     def test_filter_by_tags(self):
         """Test filtering by recipe by tags."""
         r1 = create_recipe(user=self.user, title='Thai vegetable curry.')
@@ -344,6 +410,368 @@ class PrivateRecipApiTest(TestCase):
         self.assertIn(s2.data, res.data)
         self.assertNotIn(s3.data, res.data)
 
+    def test_filter_matching_all_tags(self):
+        """Test filtering recipes having all of the given tags."""
+        r1 = create_recipe(user=self.user, title='Thai vegetable curry.')
+        r2 = create_recipe(user=self.user, title='Laides finger.')
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Vegetarian')
+        r1.tags.add(tag1, tag2)
+        r2.tags.add(tag2)
+
+        params = {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual([r['id'] for r in res.data], [r1.id])
+
+        params['match'] = 'most'
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SparseFieldsTests(TestCase):
+    """Test selecting fields and expanding relations."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe.tags.add(self.tag)
+
+    def test_fields_narrow_response_and_sql(self):
+        """Test only the requested columns are selected and returned."""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(
+                RECIPES_URL, {'fields': 'id,title,time_minutes'}
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [{
+            'id': self.recipe.id,
+            'title': self.recipe.title,
+            'time_minutes': self.recipe.time_minutes,
+        }])
+        recipe_queries = [q['sql'] for q in queries.captured_queries
+                          if 'core_recipe' in q['sql']]
+        self.assertEqual(len(recipe_queries), 1)
+        self.assertNotIn('"price"', recipe_queries[0])
+        self.assertNotIn('"description"', recipe_queries[0])
+
+    def test_unexpanded_relations_render_ids(self):
+        """Test relations in fields without expand are returned as ids."""
+        res = self.client.get(detail_url(self.recipe.id),
+                              {'fields': 'id,tags'})
+
+        self.assertEqual(res.data, {'id': self.recipe.id,
+                                    'tags': [self.tag.id]})
+
+    def test_expand_nests_relations(self):
+        """Test expanded relations are nested."""
+        res = self.client.get(
+            RECIPES_URL, {'fields': 'id', 'expand': 'tags'}
+        )
+
+        self.assertEqual(res.data, [{
+            'id': self.recipe.id,
+            'tags': [{'id': self.tag.id, 'name': 'Vegan'}],
+        }])
+
+    def test_list_defers_description(self):
+        """Test the list view does not load descriptions."""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(any('"description"' in q['sql']
+                             for q in queries.captured_queries))
+
+    def test_unknown_fields_rejected(self):
+        """Test unknown fields and relations return a bad request."""
+        res = self.client.get(RECIPES_URL,
+                              {'fields': 'id,description', 'expand': 'user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', res.data)
+        self.assertIn('expand', res.data)
+
+
+class OrderingPaginationTests(TestCase):
+    """Test range filters, ordering and keyset pagination."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = [
+            create_recipe(user=self.user, title=title, time_minutes=minutes,
+                          price=Decimal(price))
+            for title, minutes, price in [
+                ('Soup', 10, '3.00'),
+                ('Curry', 30, '8.50'),
+                ('Salad', 10, '4.25'),
+                ('Stew', 60, '8.50'),
+                ('Toast', 5, '1.00'),
+            ]
+        ]
+
+    def titles(self, res):
+        return [recipe['title'] for recipe in res.data]
+
+    def test_range_filters(self):
+        """Test filtering by time and price ranges."""
+        res = self.client.get(RECIPES_URL, {
+            'time_minutes_min': 10,
+            'time_minutes_max': 30,
+            'price_max': '5',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.titles(res), ['Soup', 'Salad'])
+
+        res = self.client.get(RECIPES_URL, {'price_min': 'cheap'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('price_min', res.data)
+
+    def test_ordering(self):
+        """Test ordering by a field with ties broken by id."""
+        res = self.client.get(RECIPES_URL, {'ordering': '-price'})
+        self.assertEqual(self.titles(res),
+                         ['Stew', 'Curry', 'Salad', 'Soup', 'Toast'])
+
+        res = self.client.get(RECIPES_URL, {'ordering': 'time_minutes'})
+        self.assertEqual(self.titles(res),
+                         ['Toast', 'Soup', 'Salad', 'Curry', 'Stew'])
+
+        res = self.client.get(RECIPES_URL, {'ordering': 'description'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_keyset_pages(self):
+        """Test pages follow the ordering across ties without overlap."""
+        titles, url = [], RECIPES_URL + '?ordering=-price&page_size=2'
+        pages = 0
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(res.data['results']), 2)
+            titles += [r['title'] for r in res.data['results']]
+            url = res.data['next']
+            pages += 1
+            if pages == 1:
+                create_recipe(user=self.user, title='Feast',
+                              price=Decimal('20.00'))
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(titles, ['Stew', 'Curry', 'Salad', 'Soup', 'Toast'])
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor returns not found."""
+        res = self.client.get(RECIPES_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unpaginated_without_params(self):
+        """Test the list stays a plain array without page parameters."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertIsInstance(res.data, list)
+        self.assertEqual(len(res.data), 5)
+
+
+class SimilarRecipesTests(TestCase):
+    """Test listing the recipes similar to a recipe."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.names = ['Salt', 'Pepper', 'Onion', 'Garlic', 'Leek']
+        self.ingredients = {
+            name: Ingredient.objects.create(user=self.user, name=name)
+            for name in self.names
+        }
+
+    def create(self, user, title, names):
+        recipe = create_recipe(user=user, title=title)
+        recipe.ingredients.add(*[self.ingredients[name] for name in names])
+        return recipe
+
+    def test_most_similar_first(self):
+        """Test recipes are ranked by shared ingredients and tags."""
+        soup = self.create(self.user, 'Soup', self.names)
+        broth = self.create(self.user, 'Broth', self.names)
+        stew = self.create(self.user, 'Stew', self.names[:4])
+        self.create(self.user, 'Toast', [])
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123'
+        )
+        self.create(other, 'Soup', self.names)
+
+        res = self.client.get(similar_url(soup.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(r['id'], r['similarity']) for r in res.data],
+            [(broth.id, 1.0), (stew.id, 0.8)]
+        )
+        self.assertEqual(len(res.data[0]['ingredients']), 5)
+
+        res = self.client.get(similar_url(soup.id), {'limit': 1})
+
+        self.assertEqual([r['id'] for r in res.data], [broth.id])
+
+    def test_invalid_limit(self):
+        """Test the limit is bounded."""
+        soup = self.create(self.user, 'Soup', self.names)
+
+        for limit in ('0', '51', 'ten'):
+            res = self.client.get(similar_url(soup.id), {'limit': limit})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_recipe(self):
+        """Test recipes of other users are not found."""
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123'
+        )
+        soup = self.create(other, 'Soup', self.names)
+
+        res = self.client.get(similar_url(soup.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BatchTests(TestCase):
+    """Test retrieving several recipes by id."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_batch(self):
+        """Test found recipes keep the requested order, the rest missing."""
+        soup = create_recipe(user=self.user, title='Soup')
+        soup.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        soup.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Salt')
+        )
+        curry = create_recipe(user=self.user, title='Curry')
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123'
+        )
+        theirs = create_recipe(user=other, title='Stew')
+        missing = theirs.id + 100
+
+        with self.assertNumQueries(3):
+            res = self.client.get(BATCH_URL, {
+                'ids': f'{curry.id},{missing},{soup.id},{theirs.id}'
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        soup.refresh_from_db()
+        self.assertEqual(res.data['results'], [
+            RecipeDetailSerializer(curry).data,
+            RecipeDetailSerializer(soup).data,
+        ])
+        self.assertEqual(res.data['missing'], [missing, theirs.id])
+
+    def test_batch_sparse_fields(self):
+        """Test the recipes can be limited to some fields."""
+        soup = create_recipe(user=self.user, title='Soup')
+
+        res = self.client.get(BATCH_URL, {'ids': soup.id,
+                                          'fields': 'id,title'})
+
+        self.assertEqual(res.data['results'],
+                         [{'id': soup.id, 'title': 'Soup'}])
+
+    def test_batch_ignores_list_params(self):
+        """Test list filters and ordering do not drop requested recipes."""
+        soup = create_recipe(user=self.user, title='Soup', time_minutes=5)
+        curry = create_recipe(user=self.user, title='Curry', time_minutes=60)
+        curry.tags.add(Tag.objects.create(user=self.user, name='Indian'))
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(BATCH_URL, {
+            'ids': f'{soup.id},{curry.id}',
+            'tags': vegan.id,
+            'time_minutes_max': 10,
+            'ordering': 'unknown',
+            'fields': 'id',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'],
+                         [{'id': soup.id}, {'id': curry.id}])
+        self.assertEqual(res.data['missing'], [])
+
+    def test_invalid_ids(self):
+        """Test the ids are required and bounded."""
+        for value in ('', 'soup', ','.join(map(str, range(1, 302)))):
+            res = self.client.get(BATCH_URL, {'ids': value})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ShoppingListTests(TestCase):
+    """Test merging the ingredients of several recipes."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_merged_ingredients(self):
+        """Test each ingredient is listed once with its recipes."""
+        salt = Ingredient.objects.create(user=self.user, name='salt')
+        leek = Ingredient.objects.create(user=self.user, name='Leek')
+        rice = Ingredient.objects.create(user=self.user, name='Rice')
+        soup = create_recipe(user=self.user, title='Soup')
+        soup.ingredients.add(salt, leek)
+        risotto = create_recipe(user=self.user, title='Risotto')
+        risotto.ingredients.add(salt, rice)
+        create_recipe(user=self.user, title='Toast').ingredients.add(leek)
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123'
+        )
+        theirs = create_recipe(user=other, title='Stew')
+        theirs.ingredients.add(
+            Ingredient.objects.create(user=other, name='Beef')
+        )
+
+        with self.assertNumQueries(1):
+            res = self.client.get(SHOPPING_LIST_URL, {
+                'recipes': f'{risotto.id},{soup.id},{theirs.id},{soup.id}'
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': leek.id, 'name': 'Leek', 'recipes': [soup.id]},
+            {'id': rice.id, 'name': 'Rice', 'recipes': [risotto.id]},
+            {'id': salt.id, 'name': 'salt',
+             'recipes': sorted([soup.id, risotto.id])},
+        ])
+
+    def test_invalid_recipes(self):
+        """Test the recipe ids are required and bounded."""
+        for value in ('', '1,x', ','.join(map(str, range(1, 52)))):
+            res = self.client.get(SHOPPING_LIST_URL, {'recipes': value})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class ImageUploadTests(TestCase):
     """Test for image upload API."""
@@ -0,0 +1,184 @@
+"""
+Tests for the recipe statistics API.
+"""
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, RecipeStats, Tag
+
+STATS_URL = reverse('recipe_app:stats')
+RECIPES_URL = reverse('recipe_app:recipe-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe_app:recipe-detail', args=[recipe_id])
+
+
+def create_user(email='user@example.com', password='testpass111'):
+    return get_user_model().objects.create_user(email=email,
+                                                password=password)
+
+
+class PublicStatsApiTests(TestCase):
+    """Test unauthenticated requests."""
+
+    def test_auth_required(self):
+        """Test auth is required for the statistics."""
+        res = APIClient().get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateStatsApiTests(TestCase):
+    """Test the statistics of authenticated users."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, **payload):
+        payload = {'title': 'Soup', 'time_minutes': 10, 'price': '4.00',
+                   'tags': [], 'ingredients': [], **payload}
+        res = self.client.post(RECIPES_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data['id']
+
+    def test_stats_follow_changes(self):
+        """Test creates, updates and deletes are counted incrementally."""
+        self.create(tags=[{'name': 'Vegan'}],
+                    ingredients=[{'name': 'Salt'}])
+        curry = self.create(title='Curry', time_minutes=30, price='12.00',
+                            tags=[{'name': 'vegan'}, {'name': 'Spicy'}])
+        stew = self.create(title='Stew', time_minutes=50, price='60.00')
+        self.client.patch(detail_url(curry), {'price': '8.00'},
+                          format='json')
+        self.client.delete(detail_url(stew))
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 2)
+        self.assertEqual(res.data['average_time_minutes'], 20)
+        self.assertEqual(res.data['average_price'], '6.00')
+        self.assertEqual(res.data['price_distribution'][:3], [
+            {'range': '0-5', 'recipe_count': 1},
+            {'range': '5-10', 'recipe_count': 1},
+            {'range': '10-20', 'recipe_count': 0},
+        ])
+        self.assertEqual(
+            [(t['name'], t['recipe_count']) for t in res.data['top_tags']],
+            [('Vegan', 2), ('Spicy', 1)]
+        )
+        self.assertEqual(res.data['top_ingredients'][0]['name'], 'Salt')
+
+        stats = RecipeStats.objects.values(
+            *RecipeStats.objects.compute(self.user.pk)
+        ).get(user=self.user)
+        self.assertEqual(stats, RecipeStats.objects.compute(self.user.pk))
+
+    def test_read_from_summary_row(self):
+        """Test reading does not scan the recipes."""
+        self.create(tags=[{'name': 'Vegan'}],
+                    ingredients=[{'name': 'Salt'}])
+
+        with self.assertNumQueries(3):
+            res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['recipe_count'], 1)
+
+    def test_negative_price_rejected(self):
+        """Test recipes with a negative price are rejected."""
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Soup', 'time_minutes': 10, 'price': '-1.00'
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('price', res.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_negative_price_in_first_range(self):
+        """Test prices below the first bound count in the first range."""
+        Recipe.objects.create(user=self.user, title='Refund',
+                              time_minutes=5, price=Decimal('-1.00'))
+
+        stats = RecipeStats.objects.get(user=self.user)
+
+        self.assertEqual(stats.price_histogram, {'0-5': 1})
+        self.assertEqual(
+            stats.price_histogram,
+            RecipeStats.objects.compute(self.user.pk)['price_histogram']
+        )
+
+    def test_failed_write_rolls_back(self):
+        """Test a write failing partway leaves no recipe or statistics."""
+        self.create(ingredients=[{'name': 'Salt'}])
+        before = RecipeStats.objects.values(
+            'recipe_count', 'ingredient_counts'
+        ).get(user=self.user)
+
+        with patch('core.models.NamedByUserManager.upsert',
+                   side_effect=DatabaseError('lost')), \
+                self.assertRaises(DatabaseError):
+            self.client.post(RECIPES_URL, {
+                'title': 'Curry', 'time_minutes': 30, 'price': '12.00',
+                'ingredients': [{'name': 'Rice'}],
+            }, format='json')
+
+        self.assertEqual(Recipe.objects.count(), 1)
+        self.assertEqual(RecipeStats.objects.values(
+            'recipe_count', 'ingredient_counts'
+        ).get(user=self.user), before)
+
+    def test_unchanged_totals_skip_stats(self):
+        """Test saves changing nothing counted leave the statistics be."""
+        recipe_id = self.create(tags=[{'name': 'Vegan'}])
+
+        for payload in ({'title': 'Stew'},
+                        {'tags': [{'name': 'vegan'}], 'price': '4'}):
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.patch(detail_url(recipe_id), payload,
+                                        format='json')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertFalse([q for q in queries.captured_queries
+                              if 'core_recipestats' in q['sql']])
+
+    def test_empty(self):
+        """Test a user without recipes gets empty statistics."""
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 0)
+        self.assertIsNone(res.data['average_price'])
+        self.assertEqual(res.data['top_tags'], [])
+
+
+class RebuildStatsCommandTests(TestCase):
+    """Test recomputing the statistics from scratch."""
+
+    def test_check_then_rebuild(self):
+        """Test drifted statistics are reported and then rebuilt."""
+        user = create_user()
+        recipe = Recipe.objects.create(user=user, title='Soup',
+                                       time_minutes=10, price=Decimal('4'))
+        recipe.tags.add(Tag.objects.create(user=user, name='Vegan'))
+        RecipeStats.objects.filter(user=user).update(recipe_count=5)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_recipe_stats', '--check', stdout=StringIO())
+
+        call_command('rebuild_recipe_stats', stdout=StringIO())
+        call_command('rebuild_recipe_stats', '--check', stdout=StringIO())
+        self.assertEqual(RecipeStats.objects.get(user=user).recipe_count, 1)
@@ -13,5 +13,6 @@ router.register('ingredient', views.IngredientViewSet)
 app_name = 'recipe_app'
 
 urlpatterns = [
+    path('stats/', views.RecipeStatsView.as_view(), name='stats'),
     path('', include(router.urls)),
 ]
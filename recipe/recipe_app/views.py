@@ -1,6 +1,8 @@
 """
 Views for Recipe APIs
 """
+import hashlib
+
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -8,19 +10,96 @@ from drf_spectacular.utils import (
     OpenApiTypes,
 )
 from rest_framework import (
+    generics,
     viewsets,
     mixins,
     status
 )
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import Count, Prefetch
+from django.db.models.functions import Lower
+from django.utils.cache import get_conditional_response, quote_etag
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
-from core.models import Recipe, Tag, Ingredient
+from core.models import Recipe, RecipeStats, Tag, Ingredient
+from core.pagination import KeysetPagination
+from core.routers import activate_shard, deactivate_shard, shard_for_user
 from recipe_app import serializers
 
 
+class UserShardMixin:
+    """Route the queries of a request to the shard of its user."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._shard_token = activate_shard(shard_for_user(request.user))
+
+    def dispatch(self, request, *args, **kwargs):
+        # Unhandled exceptions skip finalize_response, so the shard is
+        # reset here to not leak into the next request of the thread.
+        self._shard_token = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self._shard_token is not None:
+                deactivate_shard(self._shard_token)
+                self._shard_token = None
+
+
+class ConditionalListMixin:
+    """
+    Tag list responses with a strong ETag of their body and answer 304
+    when the client has it already. CompressionMiddleware keeps the
+    compressed bodies of such responses in memory.
+    """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args,
+                                             **kwargs)
+        if (self.action != 'list' or response.status_code != 200 or
+                request.method not in ('GET', 'HEAD')):
+            return response
+        response.render()
+        etag = quote_etag(hashlib.sha256(response.content).hexdigest())
+        response['ETag'] = etag
+        return get_conditional_response(request, etag=etag,
+                                        response=response)
+
+
+ORDERING_FIELDS = ['id', 'title', 'time_minutes', 'price']
+RANGE_FILTERS = [
+    ('time_minutes_min', 'time_minutes__gte'),
+    ('time_minutes_max', 'time_minutes__lte'),
+    ('price_min', 'price__gte'),
+    ('price_max', 'price__lte'),
+]
+
+BATCH_MAX_RECIPES = 300
+SHOPPING_LIST_MAX_RECIPES = 50
+SIMILAR_DEFAULT_LIMIT = 10
+SIMILAR_MAX_LIMIT = 50
+
+SPARSE_FIELDS_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description="Comma separated list of fields to return. "
+                    "Relations not expanded are returned as IDs."
+    ),
+    OpenApiParameter(
+        'expand',
+        OpenApiTypes.STR,
+        description="Comma separated list of relations to nest."
+    ),
+]
+
+
 @extend_schema_view(
     list=extend_schema(
         parameters=[
@@ -34,38 +113,243 @@ from recipe_app import serializers
                 OpenApiTypes.STR,
                 description="Comma separated list of "
                             "ingredient IDs to filter "
-            )
+            ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR,
+                enum=['any', 'all'],
+                description="Whether recipes need any (default) or all "
+                            "of the given tags and ingredients."
+            ),
+            OpenApiParameter(
+                'time_minutes_min',
+                OpenApiTypes.INT,
+                description="Minimum preparation time in minutes."
+            ),
+            OpenApiParameter(
+                'time_minutes_max',
+                OpenApiTypes.INT,
+                description="Maximum preparation time in minutes."
+            ),
+            OpenApiParameter(
+                'price_min',
+                OpenApiTypes.DECIMAL,
+                description="Minimum price."
+            ),
+            OpenApiParameter(
+                'price_max',
+                OpenApiTypes.DECIMAL,
+                description="Maximum price."
+            ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR,
+                enum=[prefix + name for name in ORDERING_FIELDS
+                      for prefix in ('', '-')],
+                description="Field to order by, descending with '-'."
+            ),
+            *SPARSE_FIELDS_PARAMETERS,
         ]
-    )
+    ),
+    retrieve=extend_schema(parameters=SPARSE_FIELDS_PARAMETERS),
+    batch=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'ids',
+                OpenApiTypes.STR,
+                required=True,
+                description="Comma separated list of up to "
+                            f"{BATCH_MAX_RECIPES} recipe IDs."
+            ),
+            *SPARSE_FIELDS_PARAMETERS,
+        ],
+        responses=serializers.RecipeBatchSerializer,
+    ),
+    shopping_list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'recipes',
+                OpenApiTypes.STR,
+                required=True,
+                description="Comma separated list of up to "
+                            f"{SHOPPING_LIST_MAX_RECIPES} recipe IDs."
+            ),
+        ]
+    ),
+    similar=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description="Number of recipes to return, "
+                            f"at most {SIMILAR_MAX_LIMIT}."
+            ),
+        ]
+    ),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalListMixin, UserShardMixin,
+                    viewsets.ModelViewSet):
     """View for managing recipe APIs."""
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    throttle_scope = None
 
     def _params_to_ints(self, qs):
         """Convert list of ids into Integer."""
         return [int(str_id) for str_id in qs.split(',')]
 
-    def get_queryset(self):
-        """Retrieve recipes for authenticated users."""
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset
+    def _id_list(self, param, maximum):
+        """Return the distinct ids of a required list parameter."""
+        value = self.request.query_params.get(param)
+        try:
+            ids = list(dict.fromkeys(self._params_to_ints(value or '')))
+        except ValueError:
+            ids = []
+        if not ids or len(ids) > maximum:
+            raise ValidationError({param: [
+                f'Enter from 1 to {maximum} comma separated ids.'
+            ]})
+        return ids
 
-        if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+    def _related_filters(self, queryset):
+        """
+        Filter by the tags and ingredient parameters. On PostgreSQL this
+        is an index lookup on the id arrays instead of a join per
+        relation.
+        """
+        match = self.request.query_params.get('match') or 'any'
+        if match not in ('any', 'all'):
+            raise ValidationError({'match': ['Match any or all.']})
 
-        if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+        for relation in ('tags', 'ingredients'):
+            value = self.request.query_params.get(relation)
+            if not value:
+                continue
+            ids = self._params_to_ints(value)
+            if connections[queryset.db].vendor == 'postgresql':
+                attname = Recipe.objects.related_id_fields[relation]
+                lookup = 'overlap' if match == 'any' else 'contains'
+                queryset = queryset.filter(**{f'{attname}__{lookup}': ids})
+            elif match == 'any':
+                queryset = queryset.filter(
+                    pk__in=self._recipes_with(queryset.db, relation, ids)
+                )
+            else:
+                queryset = queryset.filter(
+                    pk__in=self._recipes_with(
+                        queryset.db, relation, ids
+                    ).annotate(
+                        matched=Count('pk')
+                    ).filter(matched=len(set(ids))).values('recipe')
+                )
+        return queryset
 
-        return queryset.filter(
-            user=self.request.user,
-        ).order_by('id').distinct()
+    def _recipes_with(self, db, relation, ids):
+        """Return the recipes of M2M rows linking to the given ids."""
+        field = Recipe._meta.get_field(relation)
+        column = field.m2m_reverse_field_name()
+        return field.remote_field.through.objects.using(db).filter(**{
+            f'{column}__in': ids
+        }).values('recipe')
+
+    def _range_filters(self, queryset):
+        """Filter by the time and price range parameters."""
+        errors = {}
+        for param, lookup in RANGE_FILTERS:
+            value = self.request.query_params.get(param)
+            if not value:
+                continue
+            field = Recipe._meta.get_field(lookup.split('__')[0])
+            try:
+                queryset = queryset.filter(**{lookup: field.to_python(value)})
+            except DjangoValidationError as exc:
+                errors[param] = exc.messages
+        if errors:
+            raise ValidationError(errors)
+        return queryset
+
+    def get_ordering(self):
+        """Return the ordering, ending with id so that it is unique."""
+        ordering = self.request.query_params.get('ordering') or 'id'
+        name = ordering.lstrip('-')
+        if name not in ORDERING_FIELDS or ordering.count('-') > 1:
+            raise ValidationError({'ordering': [
+                f'Order by one of {", ".join(ORDERING_FIELDS)}.'
+            ]})
+        if name == 'id':
+            return [ordering]
+        return [ordering, '-id' if ordering.startswith('-') else 'id']
+
+    def _sparse_fields(self):
+        """Return the requested fields, or None for all, and expansions."""
+        if self.action not in ('list', 'retrieve', 'batch'):
+            return None, []
+
+        meta = self.get_serializer_class().Meta
+        fields = self.request.query_params.get('fields')
+        expand = self.request.query_params.get('expand')
+        fields = fields.split(',') if fields else None
+        expand = expand.split(',') if expand else []
+
+        errors = {}
+        unknown = set(fields or []) - set(meta.fields)
+        if unknown:
+            errors['fields'] = [
+                f'Unknown fields: {", ".join(sorted(unknown))}'
+            ]
+        unknown = set(expand) - set(meta.expandable_fields)
+        if unknown:
+            errors['expand'] = [
+                f'Unknown relations: {", ".join(sorted(unknown))}'
+            ]
+        if errors:
+            raise ValidationError(errors)
+        return fields, expand
+
+    def _select_fields(self, queryset):
+        """Load only the columns and relations the response renders."""
+        if self.action not in ('list', 'retrieve', 'batch'):
+            return queryset
+
+        fields, expand = self._sparse_fields()
+        meta = self.get_serializer_class().Meta
+        if fields is not None:
+            # Ordering values are read for pagination cursors.
+            ordering = [] if self.action == 'batch' else self.get_ordering()
+            queryset = queryset.only(*[
+                name for name in fields
+                if name not in meta.expandable_fields
+            ], *[name.lstrip('-') for name in ordering])
+        elif self.action == 'list':
+            queryset = queryset.defer('description', 'tag_ids',
+                                      'ingredient_ids', 'lsh_keys')
+        elif self.action == 'batch':
+            queryset = queryset.defer('tag_ids', 'ingredient_ids',
+                                      'lsh_keys')
+
+        for name in meta.expandable_fields:
+            if fields is None or name in expand:
+                queryset = queryset.prefetch_related(name)
+            elif name in fields:
+                related = Recipe._meta.get_field(name).related_model
+                queryset = queryset.prefetch_related(
+                    Prefetch(name, queryset=related.objects.only('id'))
+                )
+        return queryset
+
+    def get_queryset(self):
+        """Retrieve recipes for authenticated users."""
+        queryset = self.queryset.filter(user=self.request.user)
+        if self.action != 'batch':
+            # Recipes fetched by id ignore the list parameters.
+            queryset = self._related_filters(queryset)
+            queryset = self._range_filters(queryset).order_by(
+                *self.get_ordering()
+            )
+        return self._select_fields(queryset)
 
     def get_serializer_class(self):
         """Returns the serialzer class for the request."""
@@ -73,14 +357,25 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'shopping_list':
+            return serializers.ShoppingListItemSerializer
+        elif self.action == 'similar':
+            return serializers.SimilarRecipeSerializer
 
         return self.serializer_class
 
+    def get_serializer_context(self):
+        """Pass the requested fields on to the serializer."""
+        context = super().get_serializer_context()
+        context['fields'], context['expand'] = self._sparse_fields()
+        return context
+
     def perform_create(self, serializer):
         """Create a new recipe."""
         serializer.save(user=self.request.user)
 
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    @action(methods=['POST'], detail=True, url_path='upload-image',
+            throttle_scope='upload')
     def upload_image(self, request, pk=None):
         """Upload an image to recipe."""
         recipe = self.get_object()
@@ -97,8 +392,100 @@ class RecipeViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @action(methods=['GET'], detail=False)
+    def batch(self, request):
+        """
+        Retrieve several recipes by id in one query, plus one per nested
+        relation, listing the ids not found for the user as missing.
+        """
+        ids = self._id_list('ids', BATCH_MAX_RECIPES)
+        recipes = {recipe.pk: recipe
+                   for recipe in self.get_queryset().filter(pk__in=ids)}
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True
+        )
+        return Response({
+            'results': serializer.data,
+            'missing': [pk for pk in ids if pk not in recipes],
+        })
+
+    @action(methods=['GET'], detail=False, url_path='shopping-list')
+    def shopping_list(self, request):
+        """
+        List the ingredients of the given recipes once each, with the
+        recipes using them, from one grouped query of the M2M rows.
+        """
+        recipe_ids = self._id_list('recipes', SHOPPING_LIST_MAX_RECIPES)
+        rows = Recipe.ingredients.through.objects.filter(
+            recipe_id__in=recipe_ids, recipe__user=request.user
+        )
+        ordering = (Lower('ingredient__name'), 'ingredient_id')
+        if connections[rows.db].vendor == 'postgresql':
+            items = rows.values('ingredient_id', 'ingredient__name').annotate(
+                recipe_ids=ArrayAgg('recipe_id', ordering='recipe_id')
+            ).order_by(*ordering)
+        else:
+            items = []
+            for row in rows.values(
+                'ingredient_id', 'ingredient__name', 'recipe_id'
+            ).order_by(*ordering, 'recipe_id'):
+                ingredient_id = row['ingredient_id']
+                if not items or items[-1]['ingredient_id'] != ingredient_id:
+                    items.append({**row, 'recipe_ids': []})
+                items[-1]['recipe_ids'].append(row['recipe_id'])
+
+        serializer = self.get_serializer([{
+            'id': item['ingredient_id'],
+            'name': item['ingredient__name'],
+            'recipes': item['recipe_ids'],
+        } for item in items], many=True)
+        return Response(serializer.data)
+
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """List the recipes sharing the most tags and ingredients."""
+        limit = request.query_params.get('limit') or SIMILAR_DEFAULT_LIMIT
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= SIMILAR_MAX_LIMIT:
+            raise ValidationError({'limit': [
+                f'Enter a number from 1 to {SIMILAR_MAX_LIMIT}.'
+            ]})
+
+        recipe = self.get_object()
+        scores = dict(Recipe.objects.similar_to(recipe, limit))
+        recipes = sorted(
+            Recipe.objects.filter(pk__in=list(scores)).defer(
+                'description', 'tag_ids', 'ingredient_ids', 'lsh_keys'
+            ).prefetch_related('tags', 'ingredients'),
+            key=lambda similar: (-scores[similar.pk], similar.pk),
+        )
+        for similar in recipes:
+            similar.similarity = round(scores[similar.pk], 4)
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
+
+
+class RecipeStatsView(UserShardMixin, generics.RetrieveAPIView):
+    """Statistics of the recipes of the authenticated user."""
+    serializer_class = serializers.RecipeStatsSerializer
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_object(self):
+        """Read the summary row, building it on first use."""
+        user = self.request.user
+        stats = RecipeStats.objects.filter(user=user).first()
+        if stats is None:
+            stats = RecipeStats.objects.rebuild(user.pk)
+        return stats
+
 
-class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
+class BaseRecipeAttrViewSet(ConditionalListMixin,
+                            UserShardMixin,
+                            mixins.DestroyModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
@@ -8,8 +8,11 @@ from django.contrib.auth import (
 from rest_framework import serializers
 from django.utils.translation import gettext as _
 
+from core.instrumentation import TimedSerializerMixin
+from core.models import UserPurge
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serialzer for User modle object."""
 
     class Meta:
@@ -32,7 +35,7 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class AuthTokenSerializer(serializers.Serializer):
+class AuthTokenSerializer(TimedSerializerMixin, serializers.Serializer):
     """Serializer for user Auth Token."""
     email = serializers.EmailField()
     password = serializers.CharField(
@@ -56,3 +59,13 @@ class AuthTokenSerializer(serializers.Serializer):
 
         attrs['user'] = user
         return attrs
+
+
+class UserPurgeSerializer(serializers.ModelSerializer):
+    """Serializer for the progress of deleting a user."""
+
+    class Meta:
+        model = UserPurge
+        fields = ['id', 'status', 'recipes_deleted', 'tags_deleted',
+                  'ingredients_deleted', 'images_deleted']
+        read_only_fields = fields
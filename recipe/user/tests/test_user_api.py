@@ -8,6 +8,8 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core import throttling
+
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
@@ -22,6 +24,7 @@ class PublicUserApiTests(TestCase):
     """Test the public features of the use of api"""
 
     def setUp(self):
+        throttling.bucket_store().clear()
         self.client = APIClient()
 
     def test_user_create_user_success(self):
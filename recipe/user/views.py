@@ -1,10 +1,18 @@
 """Views for User API"""
 
-from rest_framework import generics, authentication, permissions
-from user.serializers import UserSerializer, AuthTokenSerializer
+from drf_spectacular.utils import extend_schema
+from rest_framework import generics, authentication, permissions, status
+from rest_framework.response import Response
+from user.serializers import (
+    UserSerializer,
+    AuthTokenSerializer,
+    UserPurgeSerializer,
+)
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
+from core.purge import start_purge
+
 
 class CreateUserView(generics.CreateAPIView):
     serializer_class = UserSerializer
@@ -13,12 +21,21 @@ class CreateUserView(generics.CreateAPIView):
 class CreateTokenView(ObtainAuthToken):
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = 'login'
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = UserSerializer
     authentication_classes = [authentication.TokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
         return self.request.user
+
+    @extend_schema(responses={202: UserPurgeSerializer})
+    def delete(self, request, *args, **kwargs):
+        """Deactivate the user and purge their data in the background."""
+        purge = start_purge(self.get_object())
+        return Response(UserPurgeSerializer(purge).data,
+                        status=status.HTTP_202_ACCEPTED)